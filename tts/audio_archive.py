@@ -0,0 +1,231 @@
+import hashlib
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+
+class AudioArchive:
+    """
+    Packed storage for the clips of an output directory (audio_output/archive/), as an
+    alternative to one loose file per clip.
+
+    Clips are appended to large segment files (segment_00000.pack, ...) and an SQLite
+    index (index.db) maps each clip's name, its path relative to the output directory
+    such as book_01/chapter_03/0042_....mp3, to a segment, offset, length and SHA-1.
+    Appends are serialized by the index's write lock, so several threads or worker
+    processes can write to the same archive. Segments are memory-mapped for reading:
+    get() returns a view into the mapping without copying the clip.
+
+    Like the work queue, the index uses SQLite's default rollback journal rather than
+    WAL, so the archive also works on a network filesystem shared by several machines.
+
+    A clip written again is appended again and the index points at the new copy; the old
+    bytes stay in the segment until the archive is exported and packed afresh.
+    """
+
+    SEGMENT_BYTES = 1024 * 1024 * 1024
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS clips (
+            name TEXT PRIMARY KEY,
+            segment INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            sha1 TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_clips_segment ON clips (segment, offset);
+    """
+
+    # Archives opened by this process, by (pid, output directory): a forked worker must not
+    # reuse its parent's SQLite connection
+    _opened = {}
+    _opened_lock = threading.Lock()
+
+    def __init__(self, output_dir, segment_bytes=None):
+        self.output_dir = Path(output_dir)
+        self.archive_dir = self.output_dir / "archive"
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes or self.SEGMENT_BYTES
+        self.lock = threading.Lock()
+        self.maps = {}
+        self.conn = sqlite3.connect(str(self.archive_dir / "index.db"), timeout=60,
+                                    check_same_thread=False, isolation_level=None)
+        self.conn.executescript(self.SCHEMA)
+
+    @classmethod
+    def for_output_dir(cls, output_dir, create=False, segment_bytes=None):
+        """The archive of an output directory, or None if it has none (and create is False)"""
+        key = (os.getpid(), os.path.abspath(output_dir))
+        with cls._opened_lock:
+            archive = cls._opened.get(key)
+            if archive is None and (create or (Path(output_dir) / "archive" / "index.db").exists()):
+                archive = cls(output_dir, segment_bytes)
+                cls._opened[key] = archive
+            return archive
+
+    @classmethod
+    def for_clip(cls, file_path):
+        """The archive that would hold a clip at file_path (<output_dir>/book_NN/chapter_NN/<file>)"""
+        path = Path(file_path)
+        if len(path.parts) < 3:
+            return None
+        return cls.for_output_dir(path.parents[2])
+
+    @staticmethod
+    def clip_name(file_path):
+        """Name of a clip in the archive: its path relative to the output directory"""
+        return "/".join(Path(file_path).parts[-3:])
+
+    def segment_path(self, segment):
+        return self.archive_dir / f"segment_{segment:05d}.pack"
+
+    def put(self, name, data):
+        """Append a clip and point its name at it; returns (segment, offset)"""
+        sha1 = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            # BEGIN IMMEDIATE takes the index's write lock, which other processes wait for
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT segment, MAX(offset + length) FROM clips WHERE segment = (SELECT MAX(segment) FROM clips)"
+                ).fetchone()
+                segment, end = (row[0], row[1]) if row[0] is not None else (0, 0)
+                if end and end + len(data) > self.segment_bytes:
+                    segment, end = segment + 1, 0
+                # Bytes past the indexed end belong to an append that never committed: overwrite them
+                with open(self.segment_path(segment), 'r+b' if self.segment_path(segment).exists() else 'wb') as f:
+                    f.seek(end)
+                    f.write(data)
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.conn.execute("INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?)",
+                                  (name, segment, end, len(data), sha1))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return segment, end
+
+    def locate(self, name):
+        """(segment, offset, length, sha1) of a clip, or None"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT segment, offset, length, sha1 FROM clips WHERE name = ?", (name,)
+            ).fetchone()
+
+    def segment_map(self, segment, needed):
+        """Read-only mapping of a segment covering at least `needed` bytes"""
+        with self.lock:
+            mapping = self.maps.get(segment)
+            if mapping is None or len(mapping) < needed:
+                # The segment has grown since it was mapped; views of the old mapping stay valid
+                with open(self.segment_path(segment), 'rb') as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.maps[segment] = mapping
+            return mapping
+
+    def get(self, name):
+        """A read-only memoryview of a clip's bytes in the mapped segment, or None"""
+        location = self.locate(name)
+        if location is None:
+            return None
+        segment, offset, length, _ = location
+        if length == 0:
+            return memoryview(b"")
+        return memoryview(self.segment_map(segment, offset + length))[offset:offset + length]
+
+    def contains(self, name):
+        return self.locate(name) is not None
+
+    def list_dir(self, prefix):
+        """{file name: length} of the clips whose names start with prefix (e.g. 'book_01/chapter_03/')"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, length FROM clips WHERE name >= ? AND name < ?", (prefix, prefix + "\uffff")
+            ).fetchall()
+        return {name[len(prefix):]: length for name, length in rows if "/" not in name[len(prefix):]}
+
+    def names(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT name FROM clips ORDER BY name")]
+
+    def verify(self):
+        """Names of the clips whose bytes no longer match their SHA-1"""
+        return [name for name in self.names()
+                if hashlib.sha1(self.get(name)).hexdigest() != self.locate(name)[3]]
+
+    def export(self, dest_dir=None):
+        """Write every clip as a loose file under dest_dir (the output directory by default)"""
+        dest_dir = Path(dest_dir) if dest_dir else self.output_dir
+        names = self.names()
+        for name in names:
+            path = dest_dir / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(self.get(name))
+            os.replace(temp_path, path)
+        return len(names)
+
+    def pack(self, remove=False):
+        """Add the loose clips of the output directory to the archive, deleting them with remove=True"""
+        count = 0
+        for path in sorted(self.output_dir.glob("book_*/chapter_*/*.mp3")):
+            self.put(self.clip_name(path), path.read_bytes())
+            if remove:
+                path.unlink()
+            count += 1
+        return count
+
+
+def read_audio_data(file_path):
+    """A clip's bytes: a view into its archive when it is packed, otherwise the file's contents"""
+    archive = AudioArchive.for_clip(file_path)
+    if archive is not None:
+        data = archive.get(archive.clip_name(file_path))
+        if data is not None:
+            return data
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+def clip_exists(file_path):
+    """True if a clip is a loose file or packed in its output directory's archive"""
+    if os.path.exists(file_path):
+        return True
+    archive = AudioArchive.for_clip(file_path)
+    return archive is not None and archive.contains(archive.clip_name(file_path))
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("pack", "export", "verify"):
+        print("Usage: python audio_archive.py pack [--remove]     # move loose clips into audio_output/archive")
+        print("       python audio_archive.py export [DEST_DIR]   # write the loose book_NN/chapter_NN layout")
+        print("       python audio_archive.py verify              # check every clip against its hash")
+        return
+
+    output_dir = "audio_output"
+    if sys.argv[1] == "pack":
+        archive = AudioArchive.for_output_dir(output_dir, create=True)
+        print(f"Packed {archive.pack(remove='--remove' in sys.argv)} clips into {archive.archive_dir}")
+        return
+
+    archive = AudioArchive.for_output_dir(output_dir)
+    if archive is None:
+        print(f"No archive in {output_dir}")
+        return
+    if sys.argv[1] == "export":
+        dest_dir = sys.argv[2] if len(sys.argv) > 2 else None
+        print(f"Exported {archive.export(dest_dir)} clips to {dest_dir or output_dir}")
+    else:
+        damaged = archive.verify()
+        for name in damaged:
+            print(f"Damaged: {name}")
+        print(f"{len(archive.names()) - len(damaged)} clips OK, {len(damaged)} damaged")
+
+
+if __name__ == "__main__":
+    main()
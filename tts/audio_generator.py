@@ -2,26 +2,42 @@ import hashlib
 import os
 import json
 import re
+import threading
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from openai import OpenAI
+
+from character_profiles import CharacterProfileStore
+from config_loader import load_config
+from pipeline_metrics import PipelineMetrics
+from trace_recorder import TraceRecorder
+from voice_allocator import VoiceAllocator
 
 
 class AudioGenerator:
-    def __init__(self, api_key=None, output_dir="audio_output", character_data_file="character_data.json"):
+    def __init__(self, api_key=None, output_dir="audio_output", character_data_file="character_data.json", metrics=None, tracer=None,
+                 series="default", book_numbers=None):
         self.output_dir = output_dir
         self.character_data_file = character_data_file
-        
-        if api_key:
-            self.client = OpenAI(api_key=api_key)
-        else:
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                raise ValueError(
-                    "OpenAI API key not found. Please either:\n"
-                    "1. Set OPENAI_API_KEY environment variable, or\n"
-                    "2. Pass api_key parameter to AudioGenerator(api_key='your-key')"
-                )
-            self.client = OpenAI()
+        self.series = series
+        # The series' books; only their metadata may seed the series' character profiles
+        self.book_numbers = book_numbers
+        self.default_metrics = metrics or PipelineMetrics()
+        self.default_tracer = tracer or TraceRecorder()
+        # Books of a series running at once share this generator; each thread reports to its book (see reporting_to)
+        self.reporting = threading.local()
+        # Shared limit on concurrent API requests; replaced by a semaphore when books run concurrently
+        self.request_budget = nullcontext()
+        
+        if not api_key and not os.getenv('OPENAI_API_KEY'):
+            raise ValueError(
+                "OpenAI API key not found. Please either:\n"
+                "1. Set OPENAI_API_KEY environment variable, or\n"
+                "2. Pass api_key parameter to AudioGenerator(api_key='your-key')"
+            )
+        self.api_key = api_key
+        # The OpenAI SDK is imported and the client created on the first request (see client)
+        self._client = None
+        self.client_lock = threading.Lock()
         
         self.male_voices = ["echo", "fable", "onyx"]
         self.female_voices = ["alloy", "nova", "shimmer", "coral"]
@@ -36,25 +52,91 @@ class AudioGenerator:
         # Load config file for additional settings
         self.config = self.load_config_file()
         
-        os.makedirs(output_dir, exist_ok=True)
+        # Optional packed storage (see audio_archive.py) instead of one file per clip
+        storage = self.config.get("storage", {})
+        self.archive = None
+        if storage.get("backend", "files") == "archive":
+            from audio_archive import AudioArchive
+            self.archive = AudioArchive.for_output_dir(
+                output_dir, create=True, segment_bytes=int(storage.get("segment_mb", 1024)) * 1024 * 1024
+            )
+        elif storage.get("backend", "files") != "files":
+            raise ValueError(f"Unknown storage backend '{storage['backend']}'. Choose 'files' or 'archive'.")
         
-        # Check if we have existing metadata to reuse character computation
-        self.existing_metadata = self.load_existing_metadata()
+        os.makedirs(output_dir, exist_ok=True)
         
-        # If we have existing metadata, load the character data to skip computation
-        if self.existing_metadata:
-            print(f"Found existing metadata with character data for {len(self.existing_metadata.get('character_voices', {}))} characters, skipping computation...")
-            self.character_voices = self.existing_metadata.get('character_voices', {})
-            self.character_descriptions = self.existing_metadata.get('character_descriptions', {})
-            self.character_genders = self.existing_metadata.get('character_genders', {})
+        # Reuse the series' cast so characters are not profiled again
+        self.profile_store = CharacterProfileStore(output_dir, series)
+        profiles = self.profile_store.load()
+        if profiles is None:
+            profiles = self.migrate_character_profiles()
+        if profiles:
+            print(f"Loaded profiles of {len(profiles['character_voices'])} characters from {self.profile_store.path.name}, skipping computation...")
+            for attribute, values in profiles.items():
+                getattr(self, attribute).update(values)
+        
+        self.voice_allocator = VoiceAllocator(self.male_voices, self.female_voices, self.character_voices)
+    
+    @property
+    def metrics(self):
+        metrics = getattr(self.reporting, 'metrics', None)
+        return metrics if metrics is not None else self.default_metrics
+    
+    @property
+    def tracer(self):
+        tracer = getattr(self.reporting, 'tracer', None)
+        return tracer if tracer is not None else self.default_tracer
+    
+    @contextmanager
+    def reporting_to(self, metrics, tracer):
+        """Record the requests made by the calling thread in metrics and tracer"""
+        previous = (getattr(self.reporting, 'metrics', None), getattr(self.reporting, 'tracer', None))
+        self.reporting.metrics, self.reporting.tracer = metrics, tracer
+        try:
+            yield
+        finally:
+            self.reporting.metrics, self.reporting.tracer = previous
+    
+    @property
+    def client(self):
+        if self._client is None:
+            with self.client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key) if self.api_key else OpenAI()
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
 
+    def save_character_profiles(self):
+        self.profile_store.save(self.character_voices, self.character_genders,
+                                self.character_descriptions, self.character_custom_instructions)
+    
+    def migrate_character_profiles(self):
+        """Create the profile store from the newest metadata file of the series' books from an older run, if there is one"""
+        metadata = self.load_existing_metadata()
+        if not metadata:
+            return None
+        profiles = {attribute: dict(metadata.get(attribute, {})) for attribute in CharacterProfileStore.FIELDS.values()}
+        self.profile_store.save(profiles['character_voices'], profiles['character_genders'],
+                                profiles['character_descriptions'], profiles['character_custom_instructions'])
+        print(f"Moved character profiles from the existing metadata to {self.profile_store.path.name}")
+        return profiles
+    
     def load_existing_metadata(self):
-        """Load existing metadata files to check if character computation has already been done"""
-        import glob
+        """
+        Load the existing metadata files of the series' books to check if character computation
+        has already been done. Other series' files are never used: their cast is not this one.
+        """
+        if not self.book_numbers:
+            return None
         
-        # Look for existing metadata files in the output directory
-        pattern = os.path.join(self.output_dir, "*_multi_voice_metadata.json")
-        metadata_files = glob.glob(pattern)
+        # Look for existing metadata files of the series' books in the output directory
+        metadata_files = [path for path in (os.path.join(self.output_dir, f"book_{book_number}_multi_voice_metadata.json")
+                                            for book_number in self.book_numbers)
+                          if os.path.exists(path)]
         
         if metadata_files:
             # Use the most recently modified metadata file
@@ -83,60 +165,51 @@ class AudioGenerator:
         return None
     
     def load_pronunciation_overrides(self):
-        """Load pronunciation overrides from JSON file"""
-        pronunciation_file = os.path.join(os.path.dirname(__file__), "config.json")
-        
-        if not os.path.exists(pronunciation_file):
-            print(f"Pronunciation overrides file {pronunciation_file} not found. Using default text.")
-            return {"pronunciations": {}, "replacements": {}}
-        
-        try:
-            with open(pronunciation_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            print(f"Loaded pronunciation overrides from {pronunciation_file}")
-            
-            if "pronunciations" not in data:
-                data["pronunciations"] = {}
-            if "replacements" not in data:
-                data["replacements"] = {}
-                
-            return data
-        except Exception as e:
-            print(f"Error loading pronunciation overrides: {e}. Using default text.")
-            return {"pronunciations": {}, "replacements": {}}
+        """Pronunciation overrides from config.json: the global entries plus the series' own, which win"""
+        config = load_config()
+        book_config = config.get("books", {}).get(self.series, {})
+        return {
+            "pronunciations": {**config.get("pronunciations", {}), **book_config.get("pronunciations", {})},
+            "replacements": {**config.get("replacements", {}), **book_config.get("replacements", {})}
+        }
     
     def load_config_file(self):
-        """Load the full config file"""
-        config_file = os.path.join(os.path.dirname(__file__), "config.json")
-        
-        if not os.path.exists(config_file):
-            print(f"Config file {config_file} not found. Using default values.")
-            return {}
-        
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            print(f"Loaded config file from {config_file}")
-            return data
-        except Exception as e:
-            print(f"Error loading config file: {e}. Using default values.")
-            return {}
+        """The full config file (shared, see config_loader.py)"""
+        return load_config()
     
-    def apply_pronunciation_overrides(self, text):
-        """Apply pronunciation overrides to text before TTS generation"""
+    def apply_pronunciation_overrides(self, text, applied=None, overrides=None):
+        """
+        Apply pronunciation overrides (the configured ones unless others are given) to text
+        before TTS generation. The entries that changed the text are added to applied
+        ({section: {original: override}}) when it is given.
+        """
+        if overrides is None:
+            overrides = self.pronunciation_overrides
+        
         # First apply replacements (for full phrases/phrases)
-        for original, replacement in self.pronunciation_overrides["replacements"].items():
-            text = text.replace(original, replacement)
+        for original, replacement in overrides.get("replacements", {}).items():
+            if original and original in text:
+                text = text.replace(original, replacement)
+                if applied is not None:
+                    applied.setdefault("replacements", {})[original] = replacement
         
         # Then apply word-by-word pronunciation overrides
-        for original_word, phonetic in self.pronunciation_overrides["pronunciations"].items():
+        for original_word, phonetic in overrides.get("pronunciations", {}).items():
             # Use word boundaries to replace whole words only
             # This prevents partial matches within other words
             pattern = r'\b' + re.escape(original_word) + r'\b'
-            text = re.sub(pattern, phonetic, text, flags=re.IGNORECASE)
+            text, count = re.subn(pattern, phonetic, text, flags=re.IGNORECASE)
+            if count and applied is not None:
+                applied.setdefault("pronunciations", {})[original_word] = phonetic
         
         return text
     
+    def overrides_for(self, text, overrides=None):
+        """The override entries the current config (or overrides) applies to text, as recorded in a clip's 'overrides'"""
+        applied = {}
+        self.apply_pronunciation_overrides(text, applied, overrides)
+        return applied
+    
     def load_character_data(self):
         """Load character data from JSON file"""
         if not os.path.exists(self.character_data_file):
@@ -164,12 +237,13 @@ class AudioGenerator:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=10,
-                temperature=0
-            )
+            with self.request_budget, self.metrics.time_stage("character_profiling"):
+                response = self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=10,
+                    temperature=0
+                )
             gender = response.choices[0].message.content.strip().lower()
             print(f"  -> {char_name}: {gender}")
             return gender if gender in ["male", "female"] else "unknown"
@@ -189,12 +263,13 @@ class AudioGenerator:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=150,
-                temperature=0.7
-            )
+            with self.request_budget, self.metrics.time_stage("character_profiling"):
+                response = self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=150,
+                    temperature=0.7
+                )
             description = response.choices[0].message.content.strip()
             print(f"  -> Description generated for {char_name}")
             return description
@@ -216,8 +291,7 @@ class AudioGenerator:
     
     def assign_voices_from_file(self, characters, character_data):
         print("Using custom character data from file")
-        male_count = 0
-        female_count = 0
+        genders = {}
         
         for i, (char_id, char_name) in enumerate(characters.items(), 1):
             if char_id not in character_data:
@@ -248,30 +322,19 @@ class AudioGenerator:
             self.character_custom_instructions[char_id] = custom_instructions
             
             suggested_voice = char_info.get('suggested_voice', 'auto-assign')
-            if suggested_voice == 'auto-assign':
-                if gender == "male":
-                    voice = self.male_voices[male_count % len(self.male_voices)]
-                    male_count += 1
-                elif gender == "female":
-                    voice = self.female_voices[female_count % len(self.female_voices)]
-                    female_count += 1
-                else:
-                    voice = self.female_voices[female_count % len(self.female_voices)]
-                    female_count += 1
-            else:
-                voice = suggested_voice
-            
-            self.character_voices[char_id] = voice
-            print(f"Assigned {voice} voice to {char_name} ({gender})")
+            if suggested_voice != 'auto-assign':
+                self.voice_allocator.pin(char_id, suggested_voice)
+            genders[char_id] = gender
             
             voice_notes = char_info.get('voice_notes', '')
             if voice_notes and voice_notes != "Add specific voice directions here (e.g., 'authoritative', 'gentle', 'nervous')":
                 print(f"  Voice notes: {voice_notes}")
+        
+        self.allocate_voices(genders, characters)
     
     def assign_voices_automatically(self, characters):
         print("Using automatic character assignment")
-        male_count = 0
-        female_count = 0
+        genders = {}
         
         for i, (char_id, char_name) in enumerate(characters.items(), 1):
             print(f"\n[{i}/{len(characters)}] Processing {char_name} ({char_id})")
@@ -283,19 +346,14 @@ class AudioGenerator:
             self.character_descriptions[char_id] = description
             
             self.character_custom_instructions[char_id] = f"Read as {char_name}, {description}"
-            
-            if gender == "male":
-                voice = self.male_voices[male_count % len(self.male_voices)]
-                male_count += 1
-            elif gender == "female":
-                voice = self.female_voices[female_count % len(self.female_voices)]
-                female_count += 1
-            else:
-                voice = self.female_voices[female_count % len(self.female_voices)]
-                female_count += 1
-            
-            self.character_voices[char_id] = voice
-            print(f"Assigned {voice} voice to {char_name} ({gender})")
+            genders[char_id] = gender
+        
+        self.allocate_voices(genders, characters)
+    
+    def allocate_voices(self, genders, characters):
+        """Assign voices to characters that don't have one yet (see voice_allocator.py)"""
+        for char_id, voice in self.voice_allocator.allocate_all(genders).items():
+            print(f"Assigned {voice} voice to {characters.get(char_id, char_id)} ({genders[char_id]})")
     
     def split_text_at_sentences(self, text, max_length=4096):
         """
@@ -349,16 +407,52 @@ class AudioGenerator:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=50,
-                temperature=0.3
-            )
+            with self.request_budget, self.metrics.time_stage("sentiment"), self.tracer.span("sentiment", "annotation"):
+                response = self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=50,
+                    temperature=0.3
+                )
             return response.choices[0].message.content.strip()
         except Exception as e:
             return "conversational"
     
+    def synthesize_speech(self, voice, text):
+        """Make one TTS request and return the audio bytes"""
+        try:
+            with self.request_budget, self.metrics.time_stage("tts_request"), \
+                    self.tracer.span("tts_request", "synthesis", voice=voice, characters=len(text)):
+                response = self.client.audio.speech.create(
+                    model="tts-1",
+                    voice=voice,
+                    input=text,
+                )
+        except Exception:
+            self.metrics.increment("tts_errors")
+            raise
+        
+        self.metrics.increment("tts_requests")
+        self.metrics.increment("characters_synthesized", len(text))
+        return response.content
+    
+    def write_audio_file(self, file_path, content):
+        """
+        Write through a temp file so other workers and the player never see a partial clip.
+        With the archive backend the clip is appended to the archive under the same name.
+        """
+        file_path = Path(file_path)
+        with self.metrics.time_stage("file_write"), self.tracer.span("file_write", "persistence"):
+            if self.archive is not None:
+                self.archive.put(self.archive.clip_name(file_path), content)
+            else:
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(temp_path, "wb") as f:
+                    f.write(content)
+                os.replace(temp_path, file_path)
+        self.metrics.record_audio_written()
+    
     def generate_speech_for_block(self, content_block, mode="multi_voice"):
         global_index = content_block['global_index']
         book_number = content_block['book_number']
@@ -406,7 +500,6 @@ class AudioGenerator:
                 instructions = f"{char_name} ({sentiment}): {char_description}"
         
         chapter_dir = Path(self.output_dir) / f"book_{book_number:02d}" / f"chapter_{chapter_number:02d}"
-        chapter_dir.mkdir(parents=True, exist_ok=True)
         
         text_hash = hashlib.md5(text.encode()).hexdigest()[:8]
         content_suffix = "narrative" if char_id == 'NARRATOR' else "dialogue"
@@ -426,17 +519,13 @@ class AudioGenerator:
                 filename = f"{global_index:04d}_B{book_number:02d}C{chapter_number:02d}_{char_id}_{content_suffix}_part{chunk_idx+1:02d}_{chunk_hash}.mp3"
                 speech_file_path = chapter_dir / filename
                 
-                processed_chunk_text = self.apply_pronunciation_overrides(chunk_text)
+                overrides = {}
+                processed_chunk_text = self.apply_pronunciation_overrides(chunk_text, overrides)
                 
                 try:
-                    response = self.client.audio.speech.create(
-                        model="tts-1",
-                        voice=voice,
-                        input=processed_chunk_text,
-                    )
-                    
-                    with open(speech_file_path, "wb") as f:
-                        f.write(response.content)
+                    with self.tracer.span("chunk", "synthesis", global_index=global_index, chunk=chunk_idx + 1):
+                        audio_content = self.synthesize_speech(voice, processed_chunk_text)
+                        self.write_audio_file(speech_file_path, audio_content)
                     
                     result = {
                         'global_index': global_index,
@@ -450,11 +539,14 @@ class AudioGenerator:
                         'filename': filename,
                         'text': chunk_text,
                         'instructions': instructions,
+                        'block_hash': text_hash,
                         'is_split': True,
                         'chunk_index': chunk_idx + 1,
                         'total_chunks': len(text_chunks),
                         'original_text_length': len(text)
                     }
+                    if overrides:
+                        result['overrides'] = overrides
                     
                     if content_type == 'narrative_combined':
                         result['original_block_count'] = content_block.get('original_block_count', 1)
@@ -478,17 +570,13 @@ class AudioGenerator:
             speech_file_path = chapter_dir / filename
             
             # Apply pronunciation overrides to the text before TTS
-            processed_text = self.apply_pronunciation_overrides(text)
+            overrides = {}
+            processed_text = self.apply_pronunciation_overrides(text, overrides)
             
             try:
-                response = self.client.audio.speech.create(
-                    model="tts-1",
-                    voice=voice,
-                    input=processed_text,
-                )
-                
-                with open(speech_file_path, "wb") as f:
-                    f.write(response.content)
+                with self.tracer.span("chunk", "synthesis", global_index=global_index, chunk=1):
+                    audio_content = self.synthesize_speech(voice, processed_text)
+                    self.write_audio_file(speech_file_path, audio_content)
                 
                 result = {
                     'global_index': global_index,
@@ -502,8 +590,11 @@ class AudioGenerator:
                     'filename': filename,
                     'text': text,
                     'instructions': instructions,
+                    'block_hash': text_hash,
                     'is_split': False
                 }
+                if overrides:
+                    result['overrides'] = overrides
                 
                 if content_type == 'narrative_combined':
                     result['original_block_count'] = content_block.get('original_block_count', 1)
@@ -1,17 +1,131 @@
 import json
 import os
 import glob
+import re
+from bisect import bisect_left, bisect_right
 from pathlib import Path
-import subprocess
 import sys
 import time
 
+
+def parse_timestamp(text):
+    """'1:02:03', '62:03' or '3723' (seconds) -> milliseconds, or None"""
+    if not re.fullmatch(r'\d+(:\d{1,2}){0,2}(\.\d+)?', text):
+        return None
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60 + float(part)
+    return int(seconds * 1000)
+
+
+def format_timestamp(ms):
+    hours, rest = divmod(ms // 1000, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+class SeekIndex:
+    """
+    Lookup tables over a book's clips in playback order, built once so that seeking by
+    chapter, time, block or speaker is a dictionary lookup or binary search instead of
+    a walk through the clips.
+    """
+    
+    def __init__(self, audio_files):
+        self.global_indices = [audio_info['global_index'] for audio_info in audio_files]
+        self.chapter_starts = {}
+        self.character_positions = {}
+        for position, audio_info in enumerate(audio_files):
+            self.chapter_starts.setdefault(audio_info.get('chapter_number', 1), position)
+            self.character_positions.setdefault(audio_info['character_id'], []).append(position)
+        
+        # Start time of every clip, from the offsets/durations indexed by audio_scanner.py
+        self.offsets = []
+        offset = 0
+        for audio_info in audio_files:
+            if 'duration_ms' not in audio_info:
+                self.offsets = None
+                break
+            self.offsets.append(offset)
+            offset += audio_info['duration_ms']
+        self.total_ms = offset if self.offsets is not None else None
+    
+    def for_chapter(self, chapter_number):
+        return self.chapter_starts.get(chapter_number)
+    
+    def for_block(self, global_index):
+        """Position of the first clip of the block (or of the next block if it has no clip)"""
+        position = bisect_left(self.global_indices, global_index)
+        return position if position < len(self.global_indices) else None
+    
+    def for_time(self, ms):
+        """(position, ms into that clip) of the clip playing at ms"""
+        if self.offsets is None or not self.offsets or ms >= self.total_ms:
+            return None
+        position = bisect_right(self.offsets, ms) - 1
+        return position, ms - self.offsets[position]
+    
+    def next_line(self, char_id, after_position=-1):
+        positions = self.character_positions.get(char_id, [])
+        index = bisect_right(positions, after_position)
+        return positions[index] if index < len(positions) else None
+    
+    def resolve(self, spec, current=-1):
+        """
+        Parse a seek command and return (position, ms into the clip), or None if it matches
+        nothing: 'chapter 5', 'block 120', 'character D' (next line after current) or a
+        timestamp such as '1:02:03'.
+        """
+        parts = spec.strip().split(None, 1)
+        if len(parts) == 2 and parts[0] in ("chapter", "block", "character"):
+            kind, value = parts
+            if kind == "character":
+                position = self.next_line(value.strip(), current)
+            elif value.strip().isdigit():
+                position = self.for_chapter(int(value)) if kind == "chapter" else self.for_block(int(value))
+            else:
+                position = None
+            return (position, 0) if position is not None else None
+        
+        ms = parse_timestamp(spec.strip())
+        if ms is None:
+            return None
+        return self.for_time(ms)
+
+
 class AudioBookPlayer:
-    def __init__(self, audio_dir="audio_output"):
+    def __init__(self, audio_dir="audio_output", sink=None):
         self.audio_dir = audio_dir
+        # Playback goes through one PlaybackEngine (see playback_engine.py); sink defaults to the sound card
+        self.sink = sink
+        self.engine = None
+        # Set once streaming turned out to be unavailable, so it isn't retried for every clip
+        self.engine_unavailable = False
+    
+    def get_engine(self):
+        """The playback engine, or None if there is no way to stream audio on this system"""
+        if self.engine is not None and self.engine.sink_closed:
+            # The player process exited; the next clip starts a new one
+            self.engine.close()
+            self.engine = None
+        if self.engine is None and not self.engine_unavailable:
+            from playback_engine import PlaybackEngine, PipeSink
+            try:
+                self.engine = PlaybackEngine(self.sink or PipeSink())
+            except Exception as e:
+                print(f"Streaming playback unavailable ({e}), using the system player")
+                self.engine_unavailable = True
+        return self.engine
         
     def load_metadata(self, book_number, mode="multi_voice"):
         """Load metadata for a specific book"""
+        # Prefer the SQLite progress store when the pipeline was run with it
+        store_file = Path(self.audio_dir) / "progress.db"
+        if store_file.exists():
+            from metadata_store import MetadataStore
+            store = MetadataStore(store_file, read_only=True)
+            if store.has_book(book_number, mode):
+                return store.load_progress(book_number, mode)
+        
         metadata_file = Path(self.audio_dir) / f"book_{book_number}_{mode}_metadata.json"
         if not os.path.exists(metadata_file):
             print(f"Metadata file not found: {metadata_file}")
@@ -46,7 +160,26 @@ class AudioBookPlayer:
             print("-" * 40)
     
     def play_audio_file(self, file_path):
-        """Play a single audio file using system audio player"""
+        """Play a single audio file through the playback engine, or the system audio player"""
+        engine = self.get_engine()
+        if engine:
+            engine.play([{'file_path': file_path}])
+            return
+        
+        import subprocess
+        
+        if not os.path.exists(file_path):
+            # Packed in the archive: the system players need a file
+            import tempfile
+            from audio_archive import read_audio_data
+            with tempfile.NamedTemporaryFile(suffix=Path(file_path).suffix, delete=False) as f:
+                f.write(read_audio_data(file_path))
+            try:
+                self.play_audio_file(f.name)
+            finally:
+                os.unlink(f.name)
+            return
+        
         if sys.platform.startswith('darwin'):  # macOS
             subprocess.run(['afplay', file_path])
         elif sys.platform.startswith('linux'):  # Linux
@@ -58,17 +191,58 @@ class AudioBookPlayer:
             print(f"Please manually play: {file_path}")
             input("Press Enter when ready to continue...")
     
-    def play_book(self, book_number, mode="multi_voice", interactive=True):
-        """Play all audio files for a book in order"""
+    def print_clip(self, i, total, audio_info):
+        content_type = audio_info.get('content_type', 'dialogue')
+        speaker = audio_info['character_name']
+        
+        # Format display based on content type
+        if content_type == 'narrative':
+            print(f"\n[{i}/{total}] NARRATOR: {speaker}")
+        elif content_type == 'epigraph':
+            print(f"\n[{i}/{total}] EPIGRAPH: {speaker}")
+        elif content_type in ['chapter_title', 'main_title', 'subtitle', 'section_title']:
+            print(f"\n[{i}/{total}] {content_type.upper()}: {speaker}")
+        else:
+            print(f"\n[{i}/{total}] {speaker}:")
+            
+        print(f"Type: {content_type}")
+        print(f"File: {audio_info['filename']}")
+        print(f"Text: {audio_info['text'][:150]}{'...' if len(audio_info['text']) > 150 else ''}")
+    
+    def play_book(self, book_number, mode="multi_voice", interactive=True, chapter=None, seek=None):
+        """
+        Play all audio files for a book (or one chapter) in order, optionally starting at a
+        seek position (see SeekIndex.resolve). Non-interactive playback streams the clips
+        back to back without gaps.
+        """
         print(f"Loading audiobook for Book {book_number} ({mode} mode)...")
         
         metadata = self.load_metadata(book_number, mode)
         if not metadata:
             return
         
-        audio_files = self.get_audio_files_in_order(book_number, mode)
+        audio_files = sorted(metadata['audio_files'], key=lambda x: (x['global_index'], x.get('chunk_index', 0)))
+        seek_index = SeekIndex(audio_files)
         
         print(f"Found {len(audio_files)} audio clips")
+        if seek_index.total_ms is not None:
+            print(f"Total duration: {format_timestamp(seek_index.total_ms)}")
+        
+        start, end, start_ms = 0, len(audio_files), 0
+        if chapter is not None:
+            start = seek_index.for_chapter(chapter)
+            if start is None:
+                print(f"Chapter {chapter} not found")
+                return
+            end = min([position for position in seek_index.chapter_starts.values() if position > start],
+                      default=len(audio_files))
+        if seek:
+            target = seek_index.resolve(seek, start - 1)
+            if target is None:
+                print(f"Nothing to seek to for '{seek}'")
+                return
+            start, start_ms = target
+            end = max(end, start + 1)
         
         # Show character info
         self.print_character_info(metadata)
@@ -76,36 +250,72 @@ class AudioBookPlayer:
         if interactive:
             input("\nPress Enter to start playback...")
         
-        print(f"\nStarting playback of {len(audio_files)} clips...")
+        print(f"\nStarting playback of {end - start} clips...")
         print("="*60)
         
-        for i, audio_info in enumerate(audio_files, 1):
-            content_type = audio_info.get('content_type', 'dialogue')
-            speaker = audio_info['character_name']
-            
-            # Format display based on content type
-            if content_type == 'narrative':
-                print(f"\n[{i}/{len(audio_files)}] NARRATOR: {speaker}")
-            elif content_type == 'epigraph':
-                print(f"\n[{i}/{len(audio_files)}] EPIGRAPH: {speaker}")
-            elif content_type in ['chapter_title', 'main_title', 'subtitle', 'section_title']:
-                print(f"\n[{i}/{len(audio_files)}] {content_type.upper()}: {speaker}")
+        engine = None if interactive else self.get_engine()
+        if engine:
+            self.stream_clips(engine, audio_files, start, end, start_ms)
+        else:
+            self.step_through_clips(audio_files, interactive, seek_index, start, end)
+        
+        if self.engine:
+            self.engine.close()
+            self.engine = None
+        print(f"\nFinished playing Book {book_number}!")
+    
+    def stream_clips(self, engine, audio_files, start=0, end=None, start_ms=0):
+        """Play clips start..end gaplessly, printing each one as it starts"""
+        from audio_archive import clip_exists
+        
+        end = len(audio_files) if end is None else end
+        playable = []
+        for audio_info in audio_files[start:end]:
+            if clip_exists(audio_info['file_path']):
+                playable.append(audio_info)
             else:
-                print(f"\n[{i}/{len(audio_files)}] {speaker}:")
-                
-            print(f"Type: {content_type}")
-            print(f"File: {audio_info['filename']}")
-            print(f"Text: {audio_info['text'][:150]}{'...' if len(audio_info['text']) > 150 else ''}")
+                print(f"Audio file not found: {audio_info['file_path']}")
+        if playable and playable[0] is not audio_files[start]:
+            start_ms = 0
+        
+        numbers = {id(audio_info): i for i, audio_info in enumerate(audio_files, 1)}
+        try:
+            engine.play(playable, on_clip=lambda audio_info: self.print_clip(numbers[id(audio_info)], len(audio_files), audio_info),
+                        start_ms=start_ms)
+        except KeyboardInterrupt:
+            engine.stop()
+            print("\nStopped")
+    
+    def step_through_clips(self, audio_files, interactive, seek_index=None, start=0, end=None):
+        from audio_archive import clip_exists
+        
+        seek_index = seek_index or SeekIndex(audio_files)
+        end = len(audio_files) if end is None else end
+        position = start
+        while position < end:
+            audio_info = audio_files[position]
+            self.print_clip(position + 1, len(audio_files), audio_info)
+            position += 1
             
             if interactive:
-                user_input = input("Press Enter to play, 's' to skip, 'q' to quit: ").strip().lower()
-                if user_input == 'q':
+                user_input = input("Press Enter to play, 's' to skip, 'q' to quit, "
+                                   "'g SPEC' to jump (chapter N, block N, character ID, h:mm:ss): ").strip()
+                if user_input.lower() == 'q':
                     break
-                elif user_input == 's':
+                elif user_input.lower() == 's':
+                    continue
+                elif user_input.lower().startswith('g '):
+                    target = seek_index.resolve(user_input[2:], position - 1)
+                    if target is None:
+                        print("Nothing found there")
+                        position -= 1
+                    else:
+                        position = target[0]
+                        end = max(end, position + 1)
                     continue
             
             # Check if file exists
-            if not os.path.exists(audio_info['file_path']):
+            if not clip_exists(audio_info['file_path']):
                 print(f"Audio file not found: {audio_info['file_path']}")
                 continue
             
@@ -118,11 +328,28 @@ class AudioBookPlayer:
             
             if interactive:
                 print("-" * 40)
+    
+    def find_passage(self, query, mode="multi_voice", character=None, book_number=None, limit=20):
+        """Print the clips containing a phrase across the library; returns the hits"""
+        from search_index import SearchIndex
+        index = SearchIndex(self.audio_dir, mode)
+        try:
+            index.ensure_current()
+            hits = index.search(query, character=character, book=book_number, limit=limit)
+        finally:
+            index.close()
         
-        print(f"\nFinished playing Book {book_number}!")
+        if not hits:
+            print(f"No clips found for '{query}'")
+        for hit in hits:
+            position = f" at {format_timestamp(hit['offset_ms'])}" if hit['offset_ms'] is not None else ""
+            speaker = hit['character_name'] or hit['character_id']
+            print(f"Book {hit['book']}, chapter {hit['chapter_number']}, block {hit['global_index']}{position} ({speaker}):")
+            print(f"  {' '.join(hit['text'].split())[:150]}")
+        return hits
     
     def list_available_books(self):
-        """List all available books and modes"""
+        """List all available books and modes, from the metadata file names alone (nothing is parsed)"""
         metadata_files = glob.glob(os.path.join(self.audio_dir, "book_*_metadata.json"))
         
         books = {}
@@ -146,29 +373,63 @@ class AudioBookPlayer:
             modes = ', '.join(books[book_num])
             print(f"  Book {book_num}: {modes}")
 
+def option_value(name):
+    """Value following a --name option on the command line, or None"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return None
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python audio_player.py <book_number> [mode] [--non-interactive]")
+        print("Usage: python audio_player.py <book_number> [mode] [--non-interactive] [--chapter N] [--seek SPEC] [--output FILE.wav]")
         print("       python audio_player.py list")
+        print("       python audio_player.py find PHRASE [mode] [--character ID] [--book N] [--play]")
         print("\nModes: multi_voice (default), single_narrator")
+        print("--seek starts at 'chapter N', 'block N', 'character ID' (first line) or a time like 1:02:03")
+        print("find searches the text of every generated clip; --play starts playback at the first match")
+        print("--output writes the (non-interactive) stream to a WAV file instead of playing it")
         return
     
-    player = AudioBookPlayer()
-    
     if sys.argv[1] == "list":
-        player.list_available_books()
+        AudioBookPlayer().list_available_books()
+        return
+    
+    output_file = option_value("--output")
+    sink = None
+    if output_file:
+        from playback_engine import WaveFileSink
+        sink = WaveFileSink(output_file)
+    player = AudioBookPlayer(sink=sink)
+    
+    if sys.argv[1] == "find":
+        if len(sys.argv) < 3:
+            print("Usage: python audio_player.py find PHRASE [mode] [--character ID] [--book N] [--play]")
+            return
+        mode = sys.argv[3] if len(sys.argv) > 3 and not sys.argv[3].startswith("--") else "multi_voice"
+        try:
+            book_number = int(option_value("--book")) if option_value("--book") else None
+        except ValueError:
+            print("Error: Book number must be an integer")
+            return
+        hits = player.find_passage(sys.argv[2], mode, option_value("--character"), book_number)
+        if hits and "--play" in sys.argv:
+            interactive = "--non-interactive" not in sys.argv and output_file is None
+            player.play_book(hits[0]['book'], mode, interactive, seek=f"block {hits[0]['global_index']}")
         return
     
     try:
         book_number = int(sys.argv[1])
+        chapter = int(option_value("--chapter")) if option_value("--chapter") else None
     except ValueError:
-        print("Error: Book number must be an integer")
+        print("Error: Book and chapter numbers must be integers")
         return
     
-    mode = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != "--non-interactive" else "multi_voice"
-    interactive = "--non-interactive" not in sys.argv
+    mode = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else "multi_voice"
+    interactive = "--non-interactive" not in sys.argv and output_file is None
     
-    player.play_book(book_number, mode, interactive)
+    player.play_book(book_number, mode, interactive, chapter, option_value("--seek"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,209 @@
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the optional post-processing stage
+    np = None
+
+
+# OpenAI TTS returns 24 kHz mono audio
+SAMPLE_RATE = 24000
+
+
+def decode_to_pcm(file_path, sample_rate=SAMPLE_RATE):
+    """Decode an audio file to mono 16-bit PCM samples using ffmpeg"""
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', str(file_path),
+        '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), '-'
+    ]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return np.frombuffer(proc.stdout, dtype=np.int16)
+
+
+def encode_from_pcm(samples, file_path, sample_rate=SAMPLE_RATE, bitrate="64k"):
+    """Encode mono 16-bit PCM samples back to MP3, replacing file_path atomically"""
+    temp_path = f"{file_path}.tmp.mp3"
+    cmd = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), '-i', '-',
+        '-codec:a', 'libmp3lame', '-b:a', bitrate, temp_path
+    ]
+    subprocess.run(cmd, input=samples.astype(np.int16).tobytes(), stderr=subprocess.PIPE, check=True)
+    os.replace(temp_path, file_path)
+
+
+def find_speech_bounds(samples, sample_rate=SAMPLE_RATE, threshold_db=-45.0, frame_ms=10, padding_ms=40):
+    """
+    Find the (start, end) sample range that contains speech.
+    Energy is measured per frame in one vectorized pass; leading and trailing frames
+    below threshold_db are treated as silence. A little padding is kept on each side
+    so word onsets and releases are not clipped.
+    """
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return 0, len(samples)
+
+    frames = samples[:frame_count * frame_length].astype(np.float32).reshape(frame_count, frame_length) / 32768.0
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    frame_db = 20 * np.log10(np.maximum(rms, 1e-10))
+
+    voiced = np.flatnonzero(frame_db > threshold_db)
+    if voiced.size == 0:
+        # Nothing above the threshold - leave the clip alone rather than emptying it
+        return 0, len(samples)
+
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(0, int(voiced[0]) * frame_length - padding)
+    end = min(len(samples), (int(voiced[-1]) + 1) * frame_length + padding)
+    return start, end
+
+
+def measure_loudness(samples):
+    """Return the RMS level of the samples in dBFS"""
+    if len(samples) == 0:
+        return None
+    rms = np.sqrt(np.mean(np.square(samples.astype(np.float64) / 32768.0)))
+    return float(20 * np.log10(max(rms, 1e-10)))
+
+
+def apply_gain(samples, gain_db, peak_ceiling=0.98):
+    """Apply gain in dB, backing it off if it would push the peak above peak_ceiling"""
+    if len(samples) == 0:
+        return samples.astype(np.int16)
+
+    audio = samples.astype(np.float32) / 32768.0
+    gain = 10 ** (gain_db / 20)
+    peak = float(np.max(np.abs(audio)))
+    if peak > 0 and peak * gain > peak_ceiling:
+        gain = peak_ceiling / peak
+
+    return np.clip(audio * gain * 32768.0, -32768, 32767).astype(np.int16)
+
+
+def analyze_clip(file_path, sample_rate, threshold_db, padding_ms):
+    """Decode one clip and measure its speech bounds and loudness (runs in a worker process)"""
+    samples = decode_to_pcm(file_path, sample_rate)
+    start, end = find_speech_bounds(samples, sample_rate, threshold_db, padding_ms=padding_ms)
+    return {
+        'file_path': file_path,
+        'start': start,
+        'end': end,
+        'total_samples': len(samples),
+        'loudness_dbfs': measure_loudness(samples[start:end])
+    }
+
+
+def render_clip(file_path, start, end, gain_db, sample_rate, bitrate):
+    """Trim and re-level one clip in place (runs in a worker process)"""
+    samples = decode_to_pcm(file_path, sample_rate)
+    processed = apply_gain(samples[start:end], gain_db)
+    encode_from_pcm(processed, file_path, sample_rate, bitrate)
+    return file_path
+
+
+class AudioPostProcessor:
+    """
+    Optional post-synthesis stage: trims leading/trailing silence from each clip and
+    levels every clip in a chapter to the same loudness. Requires numpy and ffmpeg.
+    """
+
+    def __init__(self, target_dbfs=-20.0, silence_threshold_db=-45.0, padding_ms=40,
+                 max_gain_db=12.0, workers=None, sample_rate=SAMPLE_RATE, bitrate="64k"):
+        if np is None:
+            raise ImportError("numpy is required for audio post-processing. Install it with: pip install numpy")
+
+        self.target_dbfs = target_dbfs
+        self.silence_threshold_db = silence_threshold_db
+        self.padding_ms = padding_ms
+        self.max_gain_db = max_gain_db
+        self.workers = workers or os.cpu_count()
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate
+
+    def samples_to_ms(self, sample_count):
+        return int(round(sample_count * 1000 / self.sample_rate))
+
+    def compute_gain(self, loudness_dbfs):
+        """Gain needed to bring a clip to the target level, limited to +/- max_gain_db"""
+        if loudness_dbfs is None:
+            return 0.0
+        gain = self.target_dbfs - loudness_dbfs
+        return max(-self.max_gain_db, min(self.max_gain_db, gain))
+
+    def process_chapter(self, audio_files, executor, on_clip=None):
+        """
+        Trim and normalize all clips of one chapter. Updates the audio_files entries in place;
+        each clip is marked postprocessed (and passed to on_clip, to be saved) as soon as its
+        file is rewritten, so a failure part-way never gets a clip trimmed and leveled twice.
+        """
+        pending = [
+            audio_file for audio_file in audio_files
+            if not audio_file.get('postprocessed') and os.path.exists(audio_file['file_path'])
+        ]
+        if not pending:
+            return []
+
+        analyses = list(executor.map(
+            analyze_clip,
+            [audio_file['file_path'] for audio_file in pending],
+            [self.sample_rate] * len(pending),
+            [self.silence_threshold_db] * len(pending),
+            [self.padding_ms] * len(pending)
+        ))
+
+        futures = {}
+        for audio_file, analysis in zip(pending, analyses):
+            gain = self.compute_gain(analysis['loudness_dbfs'])
+            future = executor.submit(render_clip, analysis['file_path'], analysis['start'], analysis['end'],
+                                     gain, self.sample_rate, self.bitrate)
+            futures[future] = (audio_file, analysis, gain)
+
+        processed = []
+        for future in as_completed(futures):
+            audio_file, analysis, gain = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error post-processing {audio_file['file_path']}: {e}")
+                continue
+
+            audio_file['postprocessed'] = True
+            audio_file['duration_ms'] = self.samples_to_ms(analysis['end'] - analysis['start'])
+            audio_file['trimmed_leading_ms'] = self.samples_to_ms(analysis['start'])
+            audio_file['trimmed_trailing_ms'] = self.samples_to_ms(analysis['total_samples'] - analysis['end'])
+            audio_file['gain_db'] = round(gain, 2)
+            processed.append(audio_file)
+            if on_clip:
+                on_clip(audio_file)
+
+        return processed
+
+    def process_book(self, audio_files, on_clip=None):
+        """Post-process every clip of a book, one chapter at a time (see process_chapter for on_clip)"""
+        chapters = {}
+        for audio_file in audio_files:
+            chapters.setdefault(audio_file.get('chapter_number', 1), []).append(audio_file)
+
+        processed_count = 0
+        trimmed_ms = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for chapter_number in sorted(chapters):
+                try:
+                    processed = self.process_chapter(chapters[chapter_number], executor, on_clip)
+                except Exception as e:
+                    print(f"Error post-processing chapter {chapter_number}: {e}")
+                    continue
+
+                if processed:
+                    print(f"  Chapter {chapter_number}: post-processed {len(processed)} clips")
+                    processed_count += len(processed)
+                    trimmed_ms += sum(
+                        audio_file['trimmed_leading_ms'] + audio_file['trimmed_trailing_ms']
+                        for audio_file in processed
+                    )
+
+        print(f"Post-processed {processed_count} clips, trimmed {trimmed_ms / 1000:.1f}s of silence")
+        return processed_count
@@ -0,0 +1,275 @@
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from audio_archive import read_audio_data
+
+
+# Bitrates in kbit/s by [MPEG-1][layer] / [MPEG-2/2.5][layer], indexed by the header's bitrate field
+BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates by the header's version field (0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1)
+SAMPLE_RATES = {0: [11025, 12000, 8000], 2: [22050, 24000, 16000], 3: [44100, 48000, 32000]}
+
+
+def parse_frame_header(data, offset):
+    """(frame length in bytes, samples in the frame, sample rate) of the MPEG audio frame at offset, or None"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[offset + 1] >> 3) & 0x03
+    layer = 4 - ((data[offset + 1] >> 1) & 0x03)
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        # Reserved values, or free-format bitrate which can't be measured from the header
+        return None
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    if layer == 2 or mpeg1:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate
+
+
+def id3v2_size(data):
+    """Length of a leading ID3v2 tag (header, body and footer), 0 if there is none"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def mp3_frames(data):
+    """
+    Yield (offset, length, samples, sample_rate) for every audio frame of MP3 data, by
+    jumping from header to header. ID3 tags and the Xing/Info frame (the encoder's
+    summary frame, which holds no audio) are skipped, junk between frames is resynced
+    over and a truncated last frame is left out.
+    """
+    offset = id3v2_size(data)
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+    sample_rate = None
+    first = True
+    while offset + 4 <= end:
+        header = parse_frame_header(data, offset)
+        if header is None or (sample_rate is not None and header[2] != sample_rate):
+            # Lost sync: look for the next header, a window at a time as data may be a
+            # memoryview into an archive (no find(), and slices of it are copies)
+            window = bytes(data[offset + 1:min(end, offset + 4097)])
+            found = window.find(b"\xff")
+            offset += 1 + (found if found >= 0 else len(window))
+            continue
+        length, frame_samples, sample_rate = header
+        if offset + length > end and not first:
+            break
+        head = bytes(data[offset:offset + 64]) if first else b""
+        if b"Xing" in head or b"Info" in head:
+            first = False
+            offset += length
+            continue
+        first = False
+        yield offset, length, frame_samples, sample_rate
+        offset += length
+
+
+def scan_mp3(data):
+    """
+    Duration of MP3 data from its frame headers alone, without decoding any audio.
+    Returns (duration in seconds, frame count), or None if no frames are found.
+    """
+    samples = 0
+    frames = 0
+    sample_rate = None
+    for _, _, frame_samples, sample_rate in mp3_frames(data):
+        samples += frame_samples
+        frames += 1
+    if not frames:
+        return None
+    return samples / sample_rate, frames
+
+
+def wav_data_chunk(data):
+    """(byte rate, offset of the samples, declared data size) of RIFF/WAVE data, or None"""
+    offset = 12
+    byte_rate = None
+    while offset + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", data, offset)
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack_from("<I", data, offset + 16)[0]
+        elif chunk_id == b"data" and byte_rate:
+            return byte_rate, offset + 8, chunk_size
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def scan_wav(data):
+    """Duration of RIFF/WAVE data from its fmt and data chunk headers"""
+    chunk = wav_data_chunk(data)
+    if chunk is None:
+        return None
+    byte_rate, data_offset, size = chunk
+    # Streamed WAVs may leave the size at 0xFFFFFFFF: use what is actually there
+    return min(size, len(data) - data_offset) / byte_rate, None
+
+
+def scan_flac(data):
+    """Duration of FLAC data from the total sample count in its STREAMINFO block"""
+    if len(data) < 26:
+        return None
+    info = int.from_bytes(data[18:26], 'big')
+    sample_rate = info >> 44
+    total_samples = info & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate, None
+
+
+def scan_audio_file(file_path):
+    """
+    {'duration_ms', 'frames'} for an MP3, WAV or FLAC file, read from headers only,
+    or None if the file is missing or not recognized
+    """
+    try:
+        data = read_audio_data(file_path)
+    except OSError:
+        return None
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        scanned = scan_wav(data)
+    elif data[:4] == b"fLaC":
+        scanned = scan_flac(data)
+    else:
+        scanned = scan_mp3(data)
+    if scanned is None:
+        return None
+    seconds, frames = scanned
+    return {'duration_ms': int(round(seconds * 1000)), 'frames': frames}
+
+
+# Narration is never faster than this, so a clip shorter than its text allows is cut off
+MAX_CHARS_PER_SECOND = 40
+# Allowed difference between a clip's recorded and scanned duration (encoder padding)
+DURATION_TOLERANCE_MS = 250
+
+
+def check_mp3(data):
+    """
+    Walk every frame of MP3 data; returns (problem, duration in ms). problem is None if
+    the frames run back to back from the start of the audio to the end of the file.
+    """
+    offset = id3v2_size(data)
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+    samples = 0
+    sample_rate = None
+    while offset < end:
+        header = parse_frame_header(data, offset)
+        if header is None or (sample_rate is not None and header[2] != sample_rate):
+            return f"no frame sync at byte {offset}", None
+        length, frame_samples, sample_rate = header
+        if offset + length > end:
+            return f"truncated frame at byte {offset}", None
+        samples += frame_samples
+        offset += length
+    if not samples:
+        return "no audio frames", None
+    return None, int(round(samples * 1000 / sample_rate))
+
+
+def verify_audio_file(file_path, expected_ms=None, text_length=None):
+    """
+    Why a generated clip can't be trusted, or None if it looks complete. MP3s must be an
+    unbroken run of frames; WAVs must hold their whole data chunk. The duration must match
+    expected_ms (when the clip's duration was recorded) or, failing that, be long enough
+    to speak text_length characters. Nothing is decoded.
+    """
+    try:
+        data = read_audio_data(file_path)
+    except OSError as e:
+        return f"unreadable ({e.strerror})"
+    if not data:
+        return "empty file"
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        chunk = wav_data_chunk(data)
+        if chunk is None:
+            return "no WAV data chunk"
+        _, data_offset, size = chunk
+        if size != 0xFFFFFFFF and size > len(data) - data_offset:
+            return "truncated WAV data chunk"
+        duration_ms = int(round(scan_wav(data)[0] * 1000))
+    elif data[:4] == b"fLaC":
+        scanned = scan_flac(data)
+        if scanned is None:
+            return "no FLAC stream info"
+        duration_ms = int(round(scanned[0] * 1000))
+    else:
+        problem, duration_ms = check_mp3(data)
+        if problem:
+            return problem
+
+    if expected_ms is not None:
+        if abs(duration_ms - expected_ms) > DURATION_TOLERANCE_MS + expected_ms // 50:
+            return f"{duration_ms} ms long, {expected_ms} ms expected"
+    elif text_length and duration_ms < text_length * 1000 // MAX_CHARS_PER_SECOND:
+        return f"{duration_ms} ms is too short for {text_length} characters"
+    return None
+
+
+def verify_audio_files(clips, workers=None):
+    """
+    verify_audio_file over the clips (metadata entries) on all CPU cores; returns
+    {file_path: problem} for the clips that failed
+    """
+    args = [(clip['file_path'], clip.get('duration_ms'), len(clip.get('text', ''))) for clip in clips]
+    if len(args) < 64 or workers == 1:
+        problems = [verify_audio_file(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            problems = list(executor.map(verify_audio_file, *zip(*args), chunksize=32))
+    return {arg[0]: problem for arg, problem in zip(args, problems) if problem}
+
+
+def scan_audio_files(file_paths, workers=None):
+    """scan_audio_file over many files on all CPU cores; returns {file_path: result}"""
+    file_paths = list(file_paths)
+    if len(file_paths) < 64 or workers == 1:
+        return {file_path: scan_audio_file(file_path) for file_path in file_paths}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return dict(zip(file_paths, executor.map(scan_audio_file, file_paths, chunksize=32)))
+
+
+def index_durations(audio_files, workers=None):
+    """
+    Store 'duration_ms' and 'offset_ms' (start time within the book) in each audio file
+    entry, in global_index order. Returns the book's total duration in ms, or None if
+    some clip could not be measured (its entry and the ones after it get no offset).
+    """
+    ordered = sorted(audio_files, key=lambda x: (x['global_index'], x.get('chunk_index', 0)))
+    scanned = scan_audio_files([audio_file['file_path'] for audio_file in ordered], workers)
+
+    offset = 0
+    for audio_file in ordered:
+        result = scanned.get(audio_file['file_path'])
+        if result is None:
+            print(f"Could not read the duration of {audio_file['filename']}")
+            offset = None
+            audio_file.pop('offset_ms', None)
+            continue
+        audio_file['duration_ms'] = result['duration_ms']
+        if offset is not None:
+            audio_file['offset_ms'] = offset
+            offset += result['duration_ms']
+        else:
+            audio_file.pop('offset_ms', None)
+    return offset
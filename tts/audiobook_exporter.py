@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+from audio_archive import clip_exists, read_audio_data
+from audio_scanner import mp3_frames, scan_audio_files
+from progress_manager import ProgressManager
+
+
+def synchsafe(value):
+    """ID3v2 28-bit integer with the high bit of every byte cleared"""
+    return bytes([(value >> 21) & 0x7F, (value >> 14) & 0x7F, (value >> 7) & 0x7F, value & 0x7F])
+
+
+def id3_frame(frame_id, body):
+    return frame_id.encode('ascii') + synchsafe(len(body)) + b"\x00\x00" + body
+
+
+def text_frame(frame_id, text):
+    # Encoding 3 = UTF-8
+    return id3_frame(frame_id, b"\x03" + text.encode('utf-8') + b"\x00")
+
+
+def ffmetadata_escape(text):
+    return "".join("\\" + c if c in "=;#\\\n" else c for c in text)
+
+
+def build_id3_tag(title, chapters):
+    """
+    ID3v2.4 tag with the book title, one CHAP frame per chapter and a CTOC listing them.
+    chapters is a list of (title, start_ms, end_ms). Times are fixed-width, so the tag
+    has the same size whatever the times are.
+    """
+    frames = [text_frame("TIT2", title)]
+    element_ids = [f"ch{i}".encode('ascii') for i in range(len(chapters))]
+    # CTOC flags: top-level, ordered; it can only list 255 entries
+    frames.append(id3_frame("CTOC", b"toc\x00" + b"\x03" + bytes([min(len(chapters), 255)])
+                            + b"".join(element_id + b"\x00" for element_id in element_ids[:255])))
+    for element_id, (chapter_title, start_ms, end_ms) in zip(element_ids, chapters):
+        frames.append(id3_frame(
+            "CHAP",
+            element_id + b"\x00"
+            + start_ms.to_bytes(4, 'big') + end_ms.to_bytes(4, 'big')
+            + b"\xff\xff\xff\xff" * 2  # byte offsets unused
+            + text_frame("TIT2", chapter_title)
+        ))
+    body = b"".join(frames)
+    return b"ID3\x04\x00\x00" + synchsafe(len(body)) + body
+
+
+class AudiobookExporter:
+    """
+    Joins a book's clips, in global_index order, into one audio file with a chapter marker
+    per chapter_number.
+
+    MP3 export copies the MPEG audio frames of every clip into one file behind an ID3v2
+    tag with CHAP/CTOC chapter frames; the clips' own tags and Xing/Info frames are left
+    out, nothing is decoded or re-encoded, and only one clip is in memory at a time.
+    Chapter times are counted from the frames while copying and written into the tag at
+    the end. M4B export remuxes the same MP3 stream into an MP4 container with chapters
+    using ffmpeg (-c copy).
+    """
+
+    def __init__(self, output_dir="audio_output", export_dir=None):
+        self.output_dir = output_dir
+        self.export_dir = Path(export_dir) if export_dir else Path(output_dir) / "exports"
+        self.progress_manager = ProgressManager(output_dir=output_dir)
+
+    @staticmethod
+    def chapter_titles(audio_files):
+        """{chapter_number: title}, from the chapter_title clip of each chapter when there is one"""
+        titles = {}
+        for audio_file in audio_files:
+            chapter_number = audio_file.get('chapter_number', 1)
+            if audio_file.get('content_type') == 'chapter_title' and not titles.get(chapter_number):
+                titles[chapter_number] = " ".join(audio_file.get('text', '').split())[:80]
+            elif chapter_number not in titles:
+                titles[chapter_number] = ""
+        return {number: title or f"Chapter {number}" for number, title in titles.items()}
+
+    def load_clips(self, book_number, mode):
+        metadata = self.progress_manager.load_existing_progress(book_number, mode)
+        if not metadata or not metadata.get('audio_files'):
+            print(f"No metadata found for book {book_number} ({mode} mode), nothing to export")
+            return None
+        clips = sorted(metadata['audio_files'], key=lambda x: (x['global_index'], x.get('chunk_index', 0)))
+        playable = [clip for clip in clips if clip_exists(clip['file_path'])]
+        if len(playable) < len(clips):
+            print(f"Warning: {len(clips) - len(playable)} clips of book {book_number} are missing and left out")
+        return playable
+
+    def export_mp3(self, clips, path, title):
+        titles = self.chapter_titles(clips)
+        chapter_numbers = list(dict.fromkeys(clip.get('chapter_number', 1) for clip in clips))
+        placeholder = build_id3_tag(title, [(titles[number], 0, 0) for number in chapter_numbers])
+
+        starts = {}
+        samples = 0
+        sample_rate = None
+        temp_path = path.with_name(path.name + ".tmp")
+
+        def to_ms(sample_count):
+            return int(sample_count * 1000 / sample_rate) if sample_rate else 0
+
+        with open(temp_path, 'wb') as out:
+            out.write(placeholder)
+            for clip in clips:
+                starts.setdefault(clip.get('chapter_number', 1), samples)
+                # Packed clips are read straight from the archive's memory map
+                data = read_audio_data(clip['file_path'])
+                view = memoryview(data)
+                for offset, length, frame_samples, frame_rate in mp3_frames(data):
+                    if sample_rate is None:
+                        sample_rate = frame_rate
+                    elif frame_rate != sample_rate:
+                        raise ValueError(f"{clip['filename']} is {frame_rate} Hz, the book so far is {sample_rate} Hz")
+                    out.write(view[offset:offset + length])
+                    samples += frame_samples
+
+            # Now that the chapter times are known, fill them into the tag (same size)
+            bounds = [starts[number] for number in chapter_numbers] + [samples]
+            tag = build_id3_tag(title, [
+                (titles[number], to_ms(bounds[i]), to_ms(bounds[i + 1])) for i, number in enumerate(chapter_numbers)
+            ])
+            out.seek(0)
+            out.write(tag)
+        os.replace(temp_path, path)
+        return to_ms(samples), len(chapter_numbers)
+
+    def export_m4b(self, clips, path, title):
+        titles = self.chapter_titles(clips)
+        durations = scan_audio_files([clip['file_path'] for clip in clips])
+        if any(durations[clip['file_path']] is None for clip in clips):
+            raise ValueError("some clips could not be measured, run with the mp3 format or check the files")
+
+        chapters = []
+        position = 0
+        for clip in clips:
+            chapter_number = clip.get('chapter_number', 1)
+            if not chapters or chapters[-1][0] != chapter_number:
+                chapters.append([chapter_number, position, position])
+            position += durations[clip['file_path']]['duration_ms']
+            chapters[-1][2] = position
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            metadata_file = Path(work_dir) / "chapters.txt"
+            metadata_file.write_text(";FFMETADATA1\n" + f"title={ffmetadata_escape(title)}\n" + "".join(
+                f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start}\nEND={end}\ntitle={ffmetadata_escape(titles[number])}\n"
+                for number, start, end in chapters
+            ), encoding='utf-8')
+
+            # The clips' audio frames are piped in as one MP3 stream, so packed clips need no
+            # temporary files
+            temp_path = path.with_name(path.name + ".tmp")
+            process = subprocess.Popen([
+                'ffmpeg', '-v', 'error', '-y',
+                '-f', 'mp3', '-i', 'pipe:0',
+                '-i', str(metadata_file),
+                '-map', '0:a', '-map_metadata', '1', '-map_chapters', '1',
+                '-c', 'copy', '-f', 'mp4', str(temp_path)
+            ], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                for clip in clips:
+                    view = memoryview(read_audio_data(clip['file_path']))
+                    for offset, length, _, _ in mp3_frames(view):
+                        process.stdin.write(view[offset:offset + length])
+            except BrokenPipeError:
+                pass
+            finally:
+                process.stdin.close()
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, 'ffmpeg', stderr=stderr)
+        os.replace(temp_path, path)
+        return position, len(chapters)
+
+    def export_book(self, book_number, mode="multi_voice", audio_format="mp3", title=None):
+        """Write <export_dir>/book_<n>_<mode>.<format>; returns its path, or None"""
+        clips = self.load_clips(book_number, mode)
+        if not clips:
+            return None
+
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        path = self.export_dir / f"book_{book_number}_{mode}.{audio_format}"
+        title = title or f"Book {book_number}"
+        try:
+            if audio_format == "m4b":
+                total_ms, chapter_count = self.export_m4b(clips, path, title)
+            else:
+                total_ms, chapter_count = self.export_mp3(clips, path, title)
+        except FileNotFoundError as e:
+            print(f"Error exporting book {book_number}: {e} (M4B export requires ffmpeg on the PATH)")
+            return None
+        except Exception as e:
+            print(f"Error exporting book {book_number}: {e}")
+            return None
+
+        hours, rest = divmod(total_ms // 1000, 3600)
+        print(f"Exported book {book_number}: {len(clips)} clips, {chapter_count} chapters, "
+              f"{hours}:{rest // 60:02d}:{rest % 60:02d} -> {path}")
+        return path
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export books as single audiobook files with chapter markers")
+    parser.add_argument("books", nargs="+", type=int, metavar="BOOK", help="book numbers to export")
+    parser.add_argument("--format", choices=("mp3", "m4b"), default="mp3",
+                        help="mp3 (frames copied, no re-encoding) or m4b (needs ffmpeg)")
+    parser.add_argument("--title", help="album title written into the file's tags")
+    # Malformed arguments end in a usage message (exit status 2), never a traceback
+    args = parser.parse_args(argv)
+
+    exporter = AudiobookExporter()
+    for book_number in args.books:
+        exporter.export_book(book_number, audio_format=args.format, title=args.title)
+
+
+if __name__ == "__main__":
+    main()
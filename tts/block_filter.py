@@ -0,0 +1,67 @@
+class BlockFilter:
+    """
+    Limits a run to some of a book's blocks: by chapter, by speaking character and/or by
+    global_index. Each criterion that is set must match; ranges are written like the
+    command line options, e.g. "3-5,7" or "120-" (open-ended).
+    """
+
+    def __init__(self, chapters=None, character_ids=None, block_ranges=None):
+        self.chapters = chapters or []
+        self.character_ids = set(character_ids or [])
+        self.block_ranges = block_ranges or []
+
+    @staticmethod
+    def parse_ranges(spec):
+        """'3-5,7,10-' -> [(3, 5), (7, 7), (10, None)]"""
+        ranges = []
+        for part in spec.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, end = part.split('-', 1)
+                ranges.append((int(start), int(end) if end.strip() else None))
+            else:
+                ranges.append((int(part), int(part)))
+        return ranges
+
+    @classmethod
+    def from_options(cls, chapters=None, characters=None, blocks=None):
+        """Build a filter from the --chapters/--characters/--blocks strings, or None if none are set"""
+        if not (chapters or characters or blocks):
+            return None
+        return cls(
+            chapters=cls.parse_ranges(chapters) if chapters else None,
+            character_ids=[char_id.strip() for char_id in characters.split(',') if char_id.strip()] if characters else None,
+            block_ranges=cls.parse_ranges(blocks) if blocks else None
+        )
+
+    @staticmethod
+    def in_ranges(value, ranges):
+        return any(start <= value and (end is None or value <= end) for start, end in ranges)
+
+    def matches(self, block):
+        if self.chapters and not self.in_ranges(block.get('chapter_number', 1), self.chapters):
+            return False
+        if self.character_ids and block['character_id'] not in self.character_ids:
+            return False
+        if self.block_ranges and not self.in_ranges(block['global_index'], self.block_ranges):
+            return False
+        return True
+
+    def apply(self, content_blocks):
+        return [block for block in content_blocks if self.matches(block)]
+
+    def describe(self):
+        def format_ranges(ranges):
+            return ",".join(str(start) if start == end else f"{start}-{end if end is not None else ''}"
+                            for start, end in ranges)
+
+        parts = []
+        if self.chapters:
+            parts.append(f"chapters {format_ranges(self.chapters)}")
+        if self.character_ids:
+            parts.append(f"characters {','.join(sorted(self.character_ids))}")
+        if self.block_ranges:
+            parts.append(f"blocks {format_ranges(self.block_ranges)}")
+        return "; ".join(parts)
@@ -0,0 +1,65 @@
+class BlockScheduler:
+    """
+    Decides the order in which content blocks are sent for synthesis.
+
+    - "sequential": strict global_index order (original behaviour)
+    - "chapter_priority": the opening blocks of every chapter (or only of priority_chapters)
+      are synthesized first so each chapter becomes listenable early, then the rest
+      of the book backfills in global_index order.
+
+    Scheduling only changes the order of API requests. File names still carry the
+    global_index and metadata is always saved sorted by global_index, so the on-disk
+    layout is the same whichever strategy is used.
+    """
+
+    STRATEGIES = ("sequential", "chapter_priority")
+
+    def __init__(self, strategy="sequential", lead_blocks=3, priority_chapters=None):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown scheduling strategy '{strategy}'. Choose from: {', '.join(self.STRATEGIES)}")
+        self.strategy = strategy
+        self.lead_blocks = lead_blocks
+        self.priority_chapters = set(priority_chapters) if priority_chapters else None
+
+    @classmethod
+    def from_config(cls, config):
+        settings = config.get("scheduling", {})
+        return cls(
+            strategy=settings.get("strategy", "sequential"),
+            lead_blocks=settings.get("lead_blocks", 3),
+            priority_chapters=settings.get("chapters")
+        )
+
+    def is_priority_chapter(self, chapter_number):
+        return self.priority_chapters is None or chapter_number in self.priority_chapters
+
+    def split_blocks(self, content_blocks):
+        """Split blocks into (chapter openings, backfill), both in global_index order"""
+        lead = []
+        backfill = []
+        taken_per_chapter = {}
+
+        for block in content_blocks:
+            chapter_number = block.get('chapter_number', 1)
+            taken = taken_per_chapter.get(chapter_number, 0)
+            if self.is_priority_chapter(chapter_number) and taken < self.lead_blocks:
+                taken_per_chapter[chapter_number] = taken + 1
+                lead.append(block)
+            else:
+                backfill.append(block)
+
+        return lead, backfill
+
+    def order_blocks(self, content_blocks):
+        """Return the blocks in the order they should be synthesized"""
+        if self.strategy == "sequential":
+            return list(content_blocks)
+
+        lead, backfill = self.split_blocks(content_blocks)
+        return lead + backfill
+
+    @staticmethod
+    def sort_audio_files(audio_files):
+        """Sort results into playback order (global_index, then chunk)"""
+        audio_files.sort(key=lambda x: (x['global_index'], x.get('chunk_index', 0)))
+        return audio_files
@@ -0,0 +1,76 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+
+class CharacterProfileStore:
+    """
+    The cast of a book series (characters_<series>.json in the output directory): every
+    character's voice, gender, description and custom TTS instructions.
+
+    All books of a series share it, and it holds nothing per clip, so loading it costs
+    O(cast size) however much audio already exists. The per-book metadata files keep
+    their copy of the voices for the web player.
+    """
+
+    VERSION = 1
+    # Field in the file -> AudioGenerator attribute
+    FIELDS = {
+        'voice': 'character_voices',
+        'gender': 'character_genders',
+        'description': 'character_descriptions',
+        'custom_instructions': 'character_custom_instructions'
+    }
+
+    def __init__(self, output_dir, series):
+        self.series = series
+        self.path = Path(output_dir) / f"characters_{re.sub(r'[^A-Za-z0-9_-]+', '_', series)}.json"
+        self.lock = threading.Lock()
+
+    def exists(self):
+        return self.path.exists()
+
+    def load(self):
+        """{attribute: {char_id: value}} for every field, or None if there is no usable store"""
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != self.VERSION:
+                print(f"Ignoring {self.path.name}: unsupported version {data.get('version')}")
+                return None
+        except Exception as e:
+            print(f"Error loading character profiles {self.path.name}: {e}")
+            return None
+
+        profiles = {attribute: {} for attribute in self.FIELDS.values()}
+        for char_id, profile in data.get('characters', {}).items():
+            for field, attribute in self.FIELDS.items():
+                if profile.get(field) is not None:
+                    profiles[attribute][char_id] = profile[field]
+        return profiles
+
+    def save(self, character_voices, character_genders, character_descriptions, character_custom_instructions=None):
+        columns = {
+            'voice': dict(character_voices),
+            'gender': dict(character_genders),
+            'description': dict(character_descriptions),
+            'custom_instructions': dict(character_custom_instructions or {})
+        }
+        characters = {}
+        for field, values in columns.items():
+            for char_id, value in values.items():
+                characters.setdefault(char_id, {})[field] = value
+
+        data = {'version': self.VERSION, 'series': self.series, 'characters': dict(sorted(characters.items()))}
+        with self.lock:
+            temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                print(f"Error saving character profiles: {e}")
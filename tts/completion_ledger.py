@@ -0,0 +1,154 @@
+import base64
+import json
+import os
+from pathlib import Path
+
+
+class CompletionLedger:
+    """
+    Compact record of which blocks of a book are done (book_<n>_<mode>_ledger.json).
+
+    Written when a book is extracted: the expected block ids (as ranges of global_index),
+    the chapter each block belongs to, the number of parts of blocks that are split into
+    several files, and a fingerprint of the source XML. A bitmap with one bit per block is
+    updated at every checkpoint, so completion questions are answered from this small file
+    without loading the metadata or parsing the book again.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, book_number, mode, block_ids, chapters, split_chunks, source, done=None):
+        self.path = Path(path)
+        self.book_number = book_number
+        self.mode = mode
+        self.block_ids = block_ids
+        self.chapters = chapters
+        self.split_chunks = split_chunks
+        self.source = source
+        self.done = done if done is not None else bytearray((len(block_ids) + 7) // 8)
+        self.positions = {global_index: position for position, global_index in enumerate(block_ids)}
+
+    @staticmethod
+    def fingerprint(source_file):
+        """Identifies a version of the book's XML without reading it"""
+        stat = os.stat(source_file)
+        return {'file': os.path.basename(source_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    @classmethod
+    def create(cls, path, book_number, mode, content_blocks, split_chunks, source):
+        chapters = []
+        for block in content_blocks:
+            chapter_number = block.get('chapter_number', 1)
+            if chapters and chapters[-1][0] == chapter_number:
+                chapters[-1][1] += 1
+            else:
+                chapters.append([chapter_number, 1])
+        block_ids = [block['global_index'] for block in content_blocks]
+        return cls(path, book_number, mode, block_ids, chapters, split_chunks, source)
+
+    @staticmethod
+    def to_ranges(values):
+        ranges = []
+        for value in values:
+            if ranges and ranges[-1][1] == value - 1:
+                ranges[-1][1] = value
+            else:
+                ranges.append([value, value])
+        return ranges
+
+    @staticmethod
+    def from_ranges(ranges):
+        return [value for start, end in ranges for value in range(start, end + 1)]
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != cls.VERSION:
+                return None
+            return cls(
+                path, data['book'], data['mode'],
+                cls.from_ranges(data['block_ids']),
+                data['chapters'],
+                {int(global_index): chunks for global_index, chunks in data['split_chunks'].items()},
+                data['source'],
+                bytearray(base64.b64decode(data['done']))
+            )
+        except Exception as e:
+            print(f"Error loading completion ledger {path.name}: {e}")
+            return None
+
+    def save(self):
+        data = {
+            'version': self.VERSION,
+            'book': self.book_number,
+            'mode': self.mode,
+            'source': self.source,
+            'block_ids': self.to_ranges(self.block_ids),
+            'chapters': self.chapters,
+            'split_chunks': {str(global_index): chunks for global_index, chunks in self.split_chunks.items()},
+            'done': base64.b64encode(bytes(self.done)).decode('ascii')
+        }
+        # Every process writes its own temp file, so concurrent saves can't clobber each other's
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Error saving completion ledger: {e}")
+
+    def is_done(self, position):
+        return bool(self.done[position >> 3] & (1 << (position & 7)))
+
+    def mark_done(self, global_indices):
+        for global_index in global_indices:
+            position = self.positions.get(global_index)
+            if position is not None:
+                self.done[position >> 3] |= 1 << (position & 7)
+
+    def mark_results(self, results):
+        """Mark the blocks whose every part is among results"""
+        part_counts = {}
+        for result in results:
+            part_counts[result['global_index']] = part_counts.get(result['global_index'], 0) + 1
+        self.mark_done(
+            global_index for global_index, count in part_counts.items()
+            if count >= self.split_chunks.get(global_index, 1)
+        )
+
+    def reset_from_results(self, results):
+        self.done = bytearray(len(self.done))
+        self.mark_results(results)
+
+    def matches_source(self, fingerprint):
+        return self.source == fingerprint
+
+    @property
+    def total_blocks(self):
+        return len(self.block_ids)
+
+    @property
+    def done_blocks(self):
+        return sum(bin(byte).count("1") for byte in self.done)
+
+    @property
+    def expected_files(self):
+        return self.total_blocks + sum(chunks - 1 for chunks in self.split_chunks.values())
+
+    def is_complete(self):
+        return self.done_blocks == self.total_blocks
+
+    def chapter_progress(self):
+        """(chapter_number, done blocks, total blocks) per chapter, in book order"""
+        progress = []
+        position = 0
+        for chapter_number, count in self.chapters:
+            done = sum(1 for p in range(position, position + count) if self.is_done(p))
+            progress.append((chapter_number, done, count))
+            position += count
+        return progress
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+# Expected type of each top-level setting; anything else is ignored with a warning so the
+# defaults of the code reading it apply
+SETTING_TYPES = {
+    "default_books_path": str,
+    "active_book": str,
+    "books": dict,
+    "pronunciations": dict,
+    "replacements": dict,
+    "progress": dict,
+    "metrics": dict,
+    "tracing": dict,
+    "library": dict,
+    "queue": dict,
+    "scheduling": dict,
+    "postprocessing": dict,
+    "storage": dict,
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def validate_config(data):
+    """Drop settings of the wrong type (and books that aren't objects) or that conflict, printing why"""
+    if not isinstance(data, dict):
+        print("Config file must contain a JSON object. Using default values.")
+        return {}
+
+    config = {}
+    for key, value in data.items():
+        expected = SETTING_TYPES.get(key)
+        if expected is not None and not isinstance(value, expected):
+            print(f"Ignoring config setting '{key}': expected {'an object' if expected is dict else 'a string'}")
+            continue
+        config[key] = value
+
+    if "books" in config:
+        books = {}
+        for book_name, book_config in config["books"].items():
+            if isinstance(book_config, dict):
+                books[book_name] = book_config
+            else:
+                print(f"Ignoring config for book '{book_name}': expected an object")
+        config["books"] = books
+
+    # Post-processing rewrites loose clip files in place; packed clips can't be rewritten
+    if config.get("postprocessing", {}).get("enabled") and config.get("storage", {}).get("backend") == "archive":
+        print("Ignoring config setting 'postprocessing': post-processing cannot be enabled "
+              "with the archive storage backend (export the archive to loose files first)")
+        del config["postprocessing"]
+    return config
+
+
+def load_config(config_file=CONFIG_FILE):
+    """
+    Parsed and validated config.json. The file is read once and cached until it changes
+    on disk, so every component can call this instead of parsing the file itself.
+    The returned dict is shared: treat it as read-only.
+    """
+    try:
+        stat = os.stat(config_file)
+    except OSError:
+        print(f"Config file {config_file} not found. Using default values.")
+        return {}
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(config_file)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        try:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                config = validate_config(json.load(f))
+            print(f"Loaded config from {config_file}")
+        except Exception as e:
+            print(f"Error loading config file: {e}. Using default values.")
+            config = {}
+        _cache[config_file] = (version, config)
+        return config
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config_loader import load_config
+from tts_pipeline import TTSPipeline
+
+
+class LibraryScheduler:
+    """
+    Synthesizes several books at once under one shared API request budget.
+
+    Every book in the library (by default every entry of the config's "books" map, and
+    every book file of a multi-file entry) gets its own driver thread, so character setup,
+    extraction and checkpointing of one book overlap with synthesis of the others. Blocks
+    of all books are generated on one shared pool of max_concurrent_requests workers; each
+    book keeps at most that many blocks queued, so the pool interleaves the running books
+    and a finished book's share flows to those still running. Progress, journals and
+    metadata stay per book, exactly as in a sequential run.
+
+    Each book has a pipeline of its own, so character assignments are journaled by the
+    book that made them and metrics and traces are kept per book. The books of one series
+    share the first book's audio generator, and with it the series' character voices.
+    """
+
+    def __init__(self, api_key=None, output_dir="audio_output", book_names=None,
+                 max_concurrent_requests=None, mode="multi_voice", work_queue=None):
+        config = self.load_config()
+        library_config = config.get("library", {})
+
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.mode = mode
+        self.book_names = book_names or library_config.get("books") or list(config.get("books", {}))
+        self.max_concurrent_requests = max_concurrent_requests or library_config.get("max_concurrent_requests", 4)
+        self.postprocess = config.get("postprocessing", {}).get("enabled", False) and work_queue is None
+        self.work_queue = work_queue
+
+        self.request_budget = threading.BoundedSemaphore(self.max_concurrent_requests)
+        self.executor = None
+        # (book_name, book_identifier) -> the book's TTSPipeline
+        self.pipelines = {}
+        # (book_name, book_identifier) -> {'state': ..., 'audio_files': ..., 'seconds': ...}
+        self.status = {}
+        self.status_lock = threading.Lock()
+
+    def load_config(self):
+        return load_config()
+
+    def create_pipeline(self, book_name, characters_from=None):
+        pipeline = TTSPipeline(api_key=self.api_key, output_dir=self.output_dir, book_name=book_name)
+        if characters_from is not None:
+            pipeline.share_characters(characters_from)
+        pipeline.use_shared_executor(self.executor, self.request_budget, self.max_concurrent_requests)
+        if self.work_queue is not None:
+            pipeline.use_work_queue(self.work_queue)
+        return pipeline
+
+    @staticmethod
+    def book_output_path(path, book_name, book_identifier):
+        """pipeline_metrics.prom -> pipeline_metrics_Romola_2411.prom, so books don't overwrite each other's exports"""
+        if not path:
+            return path
+        root, extension = os.path.splitext(path)
+        return f"{root}_{book_name.replace(' ', '_')}_{book_identifier}{extension}"
+
+    def set_status(self, job, **fields):
+        with self.status_lock:
+            self.status.setdefault(job, {}).update(fields)
+
+    def run_book(self, book_name, book_identifier):
+        job = (book_name, book_identifier)
+        pipeline = self.pipelines[job]
+        pipeline.tracer.name_thread(f"{book_name} {book_identifier}")
+
+        if pipeline.is_book_fully_processed(book_identifier, mode=self.mode):
+            print(f"{book_name} book {book_identifier} is already fully processed. Skipping...")
+            self.set_status(job, state="skipped")
+            return
+
+        self.set_status(job, state="running")
+        start = time.time()
+        try:
+            if pipeline.block_scheduler.strategy == "chapter_priority":
+                pipeline.process_book(book_identifier, mode=self.mode, resume=True, priority_only=True)
+            result = pipeline.process_book(book_identifier, mode=self.mode, resume=True)
+            if result and self.postprocess:
+                pipeline.postprocess_book(book_identifier, mode=self.mode)
+            if result and self.work_queue is None:
+                pipeline.index_durations(book_identifier, mode=self.mode)
+        except Exception as e:
+            print(f"Error processing {book_name} book {book_identifier}: {e}")
+            result = None
+
+        self.set_status(
+            job,
+            state="done" if result else "failed",
+            audio_files=len(result['audio_files']) if result else 0,
+            seconds=round(time.time() - start, 1)
+        )
+        print(f"\nFinished {book_name} book {book_identifier}: {self.status[job]['state']}")
+
+    def run(self):
+        print(f"Processing {len(self.book_names)} books with up to {self.max_concurrent_requests} concurrent requests")
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_requests, thread_name_prefix="tts")
+
+        jobs = []
+        for book_name in self.book_names:
+            series_pipeline = self.create_pipeline(book_name)
+            for i, book_identifier in enumerate(series_pipeline.get_book_identifiers()):
+                job = (book_name, book_identifier)
+                pipeline = series_pipeline if i == 0 else self.create_pipeline(book_name, characters_from=series_pipeline)
+                pipeline.metrics_file = self.book_output_path(pipeline.metrics_file, book_name, book_identifier)
+                pipeline.trace_file = self.book_output_path(pipeline.trace_file, book_name, book_identifier)
+                self.pipelines[job] = pipeline
+                jobs.append(job)
+                self.set_status(job, state="pending")
+
+        # Driver threads mostly wait on the block pool, so every book gets one
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(jobs), 1), thread_name_prefix="book") as drivers:
+                for future in [drivers.submit(self.run_book, *job) for job in jobs]:
+                    future.result()
+        finally:
+            self.executor.shutdown(wait=True)
+
+        self.show_status()
+        return self.status
+
+    def show_status(self):
+        print(f"\n{'='*50}")
+        print("Library summary")
+        print(f"{'='*50}")
+        for (book_name, book_identifier), status in self.status.items():
+            line = f"  {book_name} book {book_identifier}: {status['state']}"
+            if status['state'] in ("done", "failed"):
+                line += f" ({status['audio_files']} audio files, {status['seconds']}s)"
+            print(line)
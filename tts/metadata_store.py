@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class MetadataStore:
+    """
+    Optional SQLite backend for progress and metadata (enable with
+    "progress": {"backend": "sqlite"} in config.json).
+
+    Blocks, audio files and character assignments live in indexed tables, so resume
+    checks and status queries are lookups instead of parsing a whole metadata file.
+    The database runs in WAL mode with a busy timeout, so several processes can write
+    to it at once. export_legacy_json() writes the book_<n>_<mode>_metadata.json file
+    the web player reads.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blocks (
+            book INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            global_index INTEGER NOT NULL,
+            chapter_number INTEGER,
+            character_id TEXT,
+            content_type TEXT,
+            content_hash TEXT,
+            PRIMARY KEY (book, mode, global_index)
+        );
+        CREATE INDEX IF NOT EXISTS idx_blocks_chapter ON blocks (book, mode, chapter_number);
+        CREATE INDEX IF NOT EXISTS idx_blocks_hash ON blocks (content_hash);
+
+        CREATE TABLE IF NOT EXISTS audio_files (
+            book INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            global_index INTEGER NOT NULL,
+            chunk_index INTEGER NOT NULL DEFAULT 0,
+            chapter_number INTEGER,
+            character_id TEXT,
+            content_type TEXT,
+            content_hash TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (book, mode, filename)
+        );
+        CREATE INDEX IF NOT EXISTS idx_audio_order ON audio_files (book, mode, global_index, chunk_index);
+        CREATE INDEX IF NOT EXISTS idx_audio_chapter ON audio_files (book, mode, chapter_number);
+        CREATE INDEX IF NOT EXISTS idx_audio_hash ON audio_files (content_hash);
+
+        CREATE TABLE IF NOT EXISTS characters (
+            book INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            character_id TEXT NOT NULL,
+            voice TEXT,
+            gender TEXT,
+            description TEXT,
+            PRIMARY KEY (book, mode, character_id)
+        );
+
+        -- Incremented on every change to a book's audio files, so readers such as the search
+        -- index can tell what changed (file mtimes can't: in WAL mode writes go to progress.db-wal)
+        CREATE TABLE IF NOT EXISTS versions (
+            book INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (book, mode)
+        );
+    """
+
+    def __init__(self, db_path, read_only=False):
+        """read_only=True opens an existing database without creating or changing anything (for readers like the player)"""
+        self.db_path = str(db_path)
+        self.read_only = read_only
+        self._local = threading.local()
+        if not read_only:
+            with self.connection() as conn:
+                conn.executescript(self.SCHEMA)
+                # Books written before versions were tracked
+                conn.execute("INSERT OR IGNORE INTO versions SELECT DISTINCT book, mode, 1 FROM audio_files")
+
+    def connection(self):
+        """One connection per thread; WAL lets readers and writers from other processes proceed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+            else:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.md5(text.encode()).hexdigest()
+
+    def record_blocks(self, book_number, mode, content_blocks):
+        """Store the extracted content blocks of a book (the work that is expected)"""
+        rows = [
+            (book_number, mode, block['global_index'], block.get('chapter_number', 1),
+             block['character_id'], block.get('content_type'), self.content_hash(block['text']))
+            for block in content_blocks
+        ]
+        with self.connection() as conn:
+            conn.execute("DELETE FROM blocks WHERE book = ? AND mode = ?", (book_number, mode))
+            conn.executemany("INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def audio_file_rows(self, book_number, mode, audio_files):
+        return [
+            (book_number, mode, audio_file['filename'], audio_file['global_index'],
+             audio_file.get('chunk_index', 0), audio_file.get('chapter_number', 1),
+             audio_file.get('character_id'), audio_file.get('content_type'),
+             self.content_hash(audio_file.get('text', '')), json.dumps(audio_file))
+            for audio_file in audio_files
+        ]
+
+    @staticmethod
+    def bump_version(conn, book_number, mode):
+        conn.execute(
+            "INSERT INTO versions VALUES (?, ?, 1) ON CONFLICT (book, mode) DO UPDATE SET version = version + 1",
+            (book_number, mode)
+        )
+
+    def add_audio_files(self, book_number, mode, audio_files):
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO audio_files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.audio_file_rows(book_number, mode, audio_files)
+            )
+            self.bump_version(conn, book_number, mode)
+
+    def replace_block_results(self, book_number, mode, audio_files, dropped=()):
+        """
+        Make audio_files the results of their blocks (global_index), replacing whatever
+        those blocks had, and delete the results of the dropped blocks. Results of other
+        blocks are left alone: another writer may have checkpointed them.
+        """
+        global_indices = {audio_file['global_index'] for audio_file in audio_files} | set(dropped)
+        with self.connection() as conn:
+            conn.executemany(
+                "DELETE FROM audio_files WHERE book = ? AND mode = ? AND global_index = ?",
+                [(book_number, mode, global_index) for global_index in global_indices]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO audio_files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self.audio_file_rows(book_number, mode, audio_files)
+            )
+            self.bump_version(conn, book_number, mode)
+
+    def save_characters(self, book_number, mode, character_voices, character_descriptions, character_genders):
+        character_ids = set(character_voices) | set(character_descriptions) | set(character_genders)
+        rows = [
+            (book_number, mode, char_id, character_voices.get(char_id),
+             character_genders.get(char_id), character_descriptions.get(char_id))
+            for char_id in character_ids
+        ]
+        with self.connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO characters VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def book_versions(self, mode):
+        """{book: version} of every book with audio files; the version changes whenever they do"""
+        try:
+            return dict(self.connection().execute("SELECT book, version FROM versions WHERE mode = ?", (mode,)))
+        except sqlite3.OperationalError:
+            # A read-only store created before versions were tracked
+            return {book: 0 for (book,) in self.connection().execute(
+                "SELECT DISTINCT book FROM audio_files WHERE mode = ?", (mode,)
+            )}
+
+    def has_book(self, book_number, mode):
+        row = self.connection().execute(
+            "SELECT 1 FROM audio_files WHERE book = ? AND mode = ? LIMIT 1", (book_number, mode)
+        ).fetchone()
+        return row is not None
+
+    def count_audio_files(self, book_number, mode):
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM audio_files WHERE book = ? AND mode = ?", (book_number, mode)
+        ).fetchone()[0]
+
+    def count_blocks(self, book_number, mode):
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM blocks WHERE book = ? AND mode = ?", (book_number, mode)
+        ).fetchone()[0]
+
+    def count_completed_blocks(self, book_number, mode):
+        return self.connection().execute(
+            "SELECT COUNT(DISTINCT global_index) FROM audio_files WHERE book = ? AND mode = ?", (book_number, mode)
+        ).fetchone()[0]
+
+    def counts_by(self, book_number, mode, column):
+        """Number of audio files per content_type / chapter_number / character_id"""
+        if column not in ('content_type', 'chapter_number', 'character_id'):
+            raise ValueError(f"Cannot group audio files by {column}")
+        rows = self.connection().execute(
+            f"SELECT {column}, COUNT(*) FROM audio_files WHERE book = ? AND mode = ? GROUP BY {column}",
+            (book_number, mode)
+        ).fetchall()
+        return dict(rows)
+
+    def load_characters(self, book_number, mode):
+        rows = self.connection().execute(
+            "SELECT character_id, voice, gender, description FROM characters WHERE book = ? AND mode = ?",
+            (book_number, mode)
+        ).fetchall()
+        return {
+            'character_voices': {char_id: voice for char_id, voice, _, _ in rows if voice is not None},
+            'character_descriptions': {char_id: desc for char_id, _, _, desc in rows if desc is not None},
+            'character_genders': {char_id: gender for char_id, _, gender, _ in rows if gender is not None}
+        }
+
+    def load_audio_files(self, book_number, mode, chapter_number=None):
+        query = "SELECT data FROM audio_files WHERE book = ? AND mode = ?"
+        params = [book_number, mode]
+        if chapter_number is not None:
+            query += " AND chapter_number = ?"
+            params.append(chapter_number)
+        query += " ORDER BY global_index, chunk_index"
+        return [json.loads(data) for (data,) in self.connection().execute(query, params)]
+
+    def resume_rows(self, book_number, mode):
+        """
+        The fields ResumeIndex needs of every audio file of a book, read from the indexed
+        columns and json_extract instead of decoding each row's full JSON
+        """
+        fields = ('block_hash', 'total_chunks', 'is_split', 'original_text_length', 'file_path', 'duration_ms', 'text')
+        rows = self.connection().execute(
+            "SELECT global_index, filename, chapter_number, "
+            + ", ".join(f"json_extract(data, '$.{field}')" for field in fields)
+            + " FROM audio_files WHERE book = ? AND mode = ?",
+            (book_number, mode)
+        )
+        audio_files = []
+        for global_index, filename, chapter_number, *values in rows:
+            audio_file = {'global_index': global_index, 'filename': filename, 'chapter_number': chapter_number}
+            audio_file.update((field, value) for field, value in zip(fields, values) if value is not None)
+            audio_files.append(audio_file)
+        return audio_files
+
+    def load_progress(self, book_number, mode):
+        """Assemble progress in the legacy metadata layout"""
+        audio_files = self.load_audio_files(book_number, mode)
+        metadata = {'book': book_number, 'mode': mode}
+        metadata.update(self.load_characters(book_number, mode))
+        metadata['total_blocks_processed'] = len(audio_files)
+        metadata['audio_files'] = audio_files
+        return metadata
+
+    def export_legacy_json(self, book_number, mode, metadata_file):
+        """Write the book_<n>_<mode>_metadata.json file consumed by the web player; returns the exported progress"""
+        metadata = self.load_progress(book_number, mode)
+        metadata['last_updated'] = str(Path().cwd())
+        metadata_file = Path(metadata_file)
+        temp_file = metadata_file.with_name(f"{metadata_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_file, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        temp_file.replace(metadata_file)
+        return metadata
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class PipelineMetrics:
+    """
+    Counters and latency histograms for a pipeline run.
+
+    Stages are timed with time_stage(), e.g. extraction, character_profiling, sentiment,
+    tts_request, file_write and checkpoint. A snapshot can be exported at any point as
+    JSON or in the Prometheus text format (for the node_exporter textfile collector).
+    """
+
+    # Histogram bucket upper bounds in seconds
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.first_audio_seconds = None
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = {'buckets': [0] * len(self.BUCKETS), 'count': 0, 'sum': 0.0}
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+
+    @contextmanager
+    def time_stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_audio_written(self):
+        """Remember how long the run took to produce its first audio file"""
+        if self.first_audio_seconds is None:
+            with self.lock:
+                if self.first_audio_seconds is None:
+                    self.first_audio_seconds = time.time() - self.started_at
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started_at, 3),
+                'time_to_first_audio_seconds': self.first_audio_seconds,
+                'counters': dict(self.counters),
+                'stages': {
+                    stage: {
+                        'count': histogram['count'],
+                        'sum_seconds': round(histogram['sum'], 6),
+                        'mean_seconds': round(histogram['sum'] / histogram['count'], 6) if histogram['count'] else 0,
+                        'buckets': dict(zip([str(bound) for bound in self.BUCKETS], histogram['buckets']))
+                    }
+                    for stage, histogram in self.histograms.items()
+                }
+            }
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = [
+            "# TYPE tts_pipeline_uptime_seconds gauge",
+            f"tts_pipeline_uptime_seconds {snapshot['uptime_seconds']}"
+        ]
+        if snapshot['time_to_first_audio_seconds'] is not None:
+            lines.append("# TYPE tts_pipeline_time_to_first_audio_seconds gauge")
+            lines.append(f"tts_pipeline_time_to_first_audio_seconds {snapshot['time_to_first_audio_seconds']:.3f}")
+
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE tts_pipeline_{name}_total counter")
+            lines.append(f"tts_pipeline_{name}_total {value}")
+
+        if snapshot['stages']:
+            lines.append("# TYPE tts_pipeline_stage_seconds histogram")
+        for stage, histogram in sorted(snapshot['stages'].items()):
+            for bound, count in histogram['buckets'].items():
+                lines.append(f'tts_pipeline_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'tts_pipeline_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'tts_pipeline_stage_seconds_sum{{stage="{stage}"}} {histogram["sum_seconds"]}')
+            lines.append(f'tts_pipeline_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write a snapshot; .prom/.txt files get the Prometheus text format, anything else JSON"""
+        path = Path(path)
+        if path.suffix in ('.prom', '.txt'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+
+        # Books of a library export from their own threads, so every writer gets its own temp file
+        temp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error exporting metrics: {e}")
+
+    def summary(self):
+        """One line per stage, slowest total first"""
+        snapshot = self.snapshot()
+        lines = []
+        for stage, histogram in sorted(snapshot['stages'].items(), key=lambda x: x[1]['sum_seconds'], reverse=True):
+            lines.append(f"  {stage}: {histogram['count']} calls, {histogram['sum_seconds']:.1f}s total, "
+                         f"{histogram['mean_seconds'] * 1000:.0f}ms mean")
+        return "\n".join(lines)
@@ -0,0 +1,238 @@
+import shutil
+import subprocess
+import sys
+import threading
+import wave
+
+
+# OpenAI TTS returns 24 kHz mono audio; clips are decoded to 16-bit PCM at this rate
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+
+
+def decode_clip(file_path, sample_rate=SAMPLE_RATE):
+    """Decode an audio file (loose or packed in an archive) to mono 16-bit PCM bytes using ffmpeg"""
+    from audio_archive import AudioArchive
+    archive = AudioArchive.for_clip(file_path)
+    data = archive.get(archive.clip_name(file_path)) if archive is not None else None
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', 'pipe:0' if data is not None else str(file_path),
+        '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), '-'
+    ]
+    return subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+
+
+class RingBuffer:
+    """
+    Fixed-size byte ring shared by one writer (the prefetch thread) and one reader (the
+    sink loop). write() blocks while the ring is full and read() while it is empty, so
+    decoding stays at most `capacity` bytes ahead of playback.
+    """
+
+    def __init__(self, capacity):
+        self.buffer = bytearray(capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def write(self, data):
+        """Append all of data, waiting for room; returns False if the ring was closed"""
+        view = memoryview(data)
+        while view:
+            with self.condition:
+                while self.size == self.capacity and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return False
+                end = (self.start + self.size) % self.capacity
+                count = min(len(view), self.capacity - self.size, self.capacity - end)
+                self.buffer[end:end + count] = view[:count]
+                self.size += count
+                view = view[count:]
+                self.condition.notify_all()
+        return True
+
+    def read(self, max_bytes):
+        """Up to max_bytes of buffered data, waiting for some; b'' once closed and drained"""
+        with self.condition:
+            while self.size == 0 and not self.closed:
+                self.condition.wait()
+            count = min(max_bytes, self.size, self.capacity - self.start)
+            data = bytes(self.buffer[self.start:self.start + count])
+            self.start = (self.start + count) % self.capacity
+            self.size -= count
+            self.condition.notify_all()
+            return data
+
+    def close(self, discard=False):
+        """No more writes; with discard=True buffered data is dropped as well"""
+        with self.condition:
+            self.closed = True
+            if discard:
+                self.size = 0
+            self.condition.notify_all()
+
+
+class SinkClosed(Exception):
+    """The sink can take no more audio (e.g. its player process exited)"""
+
+
+class PipeSink:
+    """Streams raw PCM into one long-lived player process (aplay on Linux, ffplay elsewhere)"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        if sys.platform.startswith('linux') and shutil.which('aplay'):
+            cmd = ['aplay', '-q', '-t', 'raw', '-f', 'S16_LE', '-c', '1', '-r', str(sample_rate)]
+        elif shutil.which('ffplay'):
+            cmd = ['ffplay', '-v', 'error', '-nodisp', '-autoexit',
+                   '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), '-i', '-']
+        else:
+            raise RuntimeError("No audio output found: install aplay (alsa-utils) or ffplay (ffmpeg)")
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, data):
+        try:
+            self.process.stdin.write(data)
+        except BrokenPipeError:
+            raise SinkClosed(f"the audio player exited with code {self.process.poll()}")
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            # The player already exited; the data still buffered for it is lost anyway
+            pass
+        self.process.wait()
+
+
+class WaveFileSink:
+    """Writes the stream to a WAV file instead of a sound card"""
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE):
+        self.file = wave.open(str(path), 'wb')
+        self.file.setnchannels(1)
+        self.file.setsampwidth(SAMPLE_WIDTH)
+        self.file.setframerate(sample_rate)
+
+    def write(self, data):
+        self.file.writeframes(data)
+
+    def close(self):
+        self.file.close()
+
+
+class NullSink:
+    """Discards the stream, counting the bytes written"""
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+
+    def close(self):
+        pass
+
+
+class PlaybackEngine:
+    """
+    Plays a sequence of clips as one continuous stream.
+
+    A prefetch thread decodes clips ahead into a ring buffer of `buffer_seconds` of audio,
+    and the calling thread copies the buffer into a single long-lived sink, so there is no
+    process start-up or device reopening between clips. on_clip(clip) is called when a
+    clip's first sample reaches the sink.
+    """
+
+    def __init__(self, sink, decode=decode_clip, sample_rate=SAMPLE_RATE, buffer_seconds=10, chunk_ms=100):
+        self.sink = sink
+        self.decode = decode
+        self.sample_rate = sample_rate
+        self.buffer_bytes = int(sample_rate * buffer_seconds) * SAMPLE_WIDTH
+        self.chunk_bytes = int(sample_rate * chunk_ms / 1000) * SAMPLE_WIDTH
+        self.ring = None
+        self.stopped = threading.Event()
+        # Set when the sink stopped taking audio; the engine can't play any more
+        self.sink_closed = False
+
+    def prefetch(self, clips, ring, boundaries, boundaries_lock, start_ms=0):
+        position = 0
+        skip_bytes = int(self.sample_rate * start_ms / 1000) * SAMPLE_WIDTH
+        try:
+            for clip in clips:
+                if self.stopped.is_set():
+                    break
+                try:
+                    pcm = self.decode(clip['file_path'], self.sample_rate)
+                except FileNotFoundError as e:
+                    if e.filename == 'ffmpeg':
+                        print("ffmpeg is required for playback")
+                        break
+                    print(f"Skipping {clip['file_path']}: {e}")
+                    continue
+                except Exception as e:
+                    print(f"Skipping {clip['file_path']}: {e}")
+                    continue
+                # Keep whole samples so a skipped clip never shifts the stream by one byte
+                pcm = pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH]
+                if skip_bytes:
+                    # Playback starts part-way into the first clip
+                    pcm, skip_bytes = pcm[skip_bytes:], 0
+                with boundaries_lock:
+                    boundaries.append((position, clip))
+                if not ring.write(pcm):
+                    break
+                position += len(pcm)
+        finally:
+            ring.close()
+
+    def play(self, clips, on_clip=None, start_ms=0):
+        """
+        Play clips (dicts with a 'file_path') back to back, starting start_ms into the first
+        one; returns the number of bytes played
+        """
+        self.stopped.clear()
+        self.ring = RingBuffer(self.buffer_bytes)
+        boundaries = []
+        boundaries_lock = threading.Lock()
+        prefetcher = threading.Thread(target=self.prefetch, args=(clips, self.ring, boundaries, boundaries_lock, start_ms),
+                                      name="prefetch", daemon=True)
+        prefetcher.start()
+
+        played = 0
+        while True:
+            data = self.ring.read(self.chunk_bytes)
+            if not data:
+                break
+            if on_clip:
+                with boundaries_lock:
+                    started = [clip for position, clip in boundaries if position < played + len(data)]
+                    del boundaries[:len(started)]
+                for clip in started:
+                    on_clip(clip)
+            try:
+                self.sink.write(data)
+            except SinkClosed as e:
+                print(f"Playback stopped: {e}")
+                self.sink_closed = True
+                self.stop()
+                break
+            played += len(data)
+
+        prefetcher.join()
+        if on_clip and not self.stopped.is_set():
+            # Clips that decoded to nothing at the very end
+            for _, clip in boundaries:
+                on_clip(clip)
+        return played
+
+    def stop(self):
+        """Stop playback from another thread (e.g. on Ctrl+C)"""
+        self.stopped.set()
+        if self.ring:
+            self.ring.close(discard=True)
+
+    def close(self):
+        self.sink.close()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+import gzip
+import json
+import os
+import sys
+from pathlib import Path
+
+from progress_manager import ProgressManager
+
+try:
+    import brotli
+except ImportError:  # brotli variants are only written when the package is installed
+    brotli = None
+
+
+class PlayerPublisher:
+    """
+    Derives a compact player index for each book from the generated metadata.
+
+    The full book_<n>_<mode>_metadata.json holds every block's text, instructions and
+    local file paths, and the web player has to download all of it before it can play.
+    The published layout is:
+
+        <publish_dir>/book_<n>/index.json        table of contents, one entry per chapter
+        <publish_dir>/book_<n>/chapter_<cc>.json  only the fields the player displays
+
+    Every file is also written as .gz (and .br when brotli is available) so it can be
+    uploaded precompressed with the matching Content-Encoding.
+    """
+
+    TITLE_LENGTH = 60
+
+    def __init__(self, output_dir="audio_output", publish_dir=None):
+        self.output_dir = output_dir
+        self.publish_dir = Path(publish_dir) if publish_dir else Path(output_dir) / "player"
+        self.progress_manager = ProgressManager(output_dir=output_dir)
+
+    def audio_path(self, audio_file):
+        """Path of a clip relative to the storage root, e.g. audio_output/book_01/chapter_01/x.mp3"""
+        return "/".join([
+            Path(self.output_dir).name,
+            f"book_{audio_file['book_number']:02d}",
+            f"chapter_{audio_file.get('chapter_number', 1):02d}",
+            audio_file['filename']
+        ])
+
+    def build_track(self, audio_file):
+        text = audio_file.get('text', '')
+        title = text[:self.TITLE_LENGTH] + ('...' if len(text) > self.TITLE_LENGTH else '')
+        track = {
+            'file': self.audio_path(audio_file),
+            'speaker': audio_file['character_name'],
+            'speaker_id': audio_file['character_id'],
+            'type': audio_file.get('content_type', 'dialogue'),
+            'title': title
+        }
+        if 'duration_ms' in audio_file:
+            track['duration_ms'] = audio_file['duration_ms']
+        return track
+
+    def write_json(self, path, data):
+        """Write minified JSON plus precompressed variants"""
+        payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        path.write_bytes(payload)
+        path.with_name(path.name + ".gz").write_bytes(gzip.compress(payload, compresslevel=9))
+        if brotli is not None:
+            path.with_name(path.name + ".br").write_bytes(brotli.compress(payload, quality=11))
+        return len(payload)
+
+    def publish_book(self, book_number, mode="multi_voice"):
+        metadata = self.progress_manager.load_existing_progress(book_number, mode)
+        if not metadata or not metadata.get('audio_files'):
+            print(f"No metadata found for book {book_number} ({mode} mode), nothing to publish")
+            return None
+
+        chapters = {}
+        for audio_file in sorted(metadata['audio_files'], key=lambda x: (x['global_index'], x.get('chunk_index', 0))):
+            chapters.setdefault(audio_file.get('chapter_number', 1), []).append(audio_file)
+
+        book_dir = self.publish_dir / f"book_{book_number}"
+        book_dir.mkdir(parents=True, exist_ok=True)
+
+        toc = []
+        published_bytes = 0
+        for chapter_number in sorted(chapters):
+            shard_name = f"chapter_{chapter_number:02d}.json"
+            tracks = [self.build_track(audio_file) for audio_file in chapters[chapter_number]]
+            published_bytes += self.write_json(book_dir / shard_name, {
+                'book': book_number,
+                'chapter': chapter_number,
+                'tracks': tracks
+            })
+
+            entry = {'chapter': chapter_number, 'tracks': len(tracks), 'shard': shard_name}
+            if 'offset_ms' in chapters[chapter_number][0]:
+                entry['offset_ms'] = chapters[chapter_number][0]['offset_ms']
+            if all('duration_ms' in track for track in tracks):
+                entry['duration_ms'] = sum(track['duration_ms'] for track in tracks)
+            toc.append(entry)
+
+        index = {
+            'book': book_number,
+            'mode': mode,
+            'total_tracks': len(metadata['audio_files']),
+            'chapters': toc
+        }
+        if all('duration_ms' in entry for entry in toc):
+            index['total_duration_ms'] = sum(entry['duration_ms'] for entry in toc)
+        published_bytes += self.write_json(book_dir / "index.json", index)
+
+        metadata_size = self.progress_manager.metadata_path(book_number, mode)
+        metadata_size = metadata_size.stat().st_size if metadata_size.exists() else 0
+        print(f"Published book {book_number}: {len(toc)} chapter shards, "
+              f"{published_bytes / 1024:.0f} KB (metadata file: {metadata_size / 1024:.0f} KB)")
+        return book_dir / "index.json"
+
+    def update_manifest(self, manifest_file, book_numbers, mode="multi_voice"):
+        """
+        Point the manifest entries of the published books at their player index.
+        The publish directory is expected to be uploaded next to the metadata files,
+        so the index URL is derived from the existing metadata URL. The player falls
+        back to 'path' if the index is missing.
+        """
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        updated = 0
+        for story in manifest.get('stories', {}).values():
+            for book in story.get('books', []):
+                for book_number in book_numbers:
+                    metadata_name = f"book_{book_number}_{mode}_metadata.json"
+                    if book.get('path', '').endswith("/" + metadata_name):
+                        base_url = book['path'][:-len(metadata_name)]
+                        book['index'] = f"{base_url}{self.publish_dir.name}/book_{book_number}/index.json"
+                        updated += 1
+
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+        print(f"Updated {updated} manifest entries in {manifest_file}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python player_publisher.py <book_number>... [--manifest path/to/manifest.json]")
+        print("       python player_publisher.py all [--manifest path/to/manifest.json]")
+        return
+
+    args = sys.argv[1:]
+    manifest_file = None
+    if "--manifest" in args:
+        position = args.index("--manifest")
+        manifest_file = args[position + 1]
+        del args[position:position + 2]
+
+    publisher = PlayerPublisher()
+    if args == ["all"]:
+        book_numbers = sorted(
+            int(name.split('_')[1]) for name in os.listdir(publisher.output_dir)
+            if name.startswith('book_') and name.endswith('_multi_voice_metadata.json')
+        )
+    else:
+        book_numbers = [int(arg) for arg in args]
+
+    published = [book_number for book_number in book_numbers if publisher.publish_book(book_number)]
+
+    if manifest_file and published:
+        publisher.update_manifest(manifest_file, published)
+
+
+if __name__ == "__main__":
+    main()
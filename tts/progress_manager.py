@@ -1,25 +1,255 @@
 import json
+import os
+import threading
 from pathlib import Path
 
+from block_scheduler import BlockScheduler
+from completion_ledger import CompletionLedger
+
 
 class ProgressManager:
-    def __init__(self, output_dir="audio_output"):
+    """
+    Progress is stored as a snapshot (the book_<n>_<mode>_metadata.json file the web player
+    reads) plus an append-only journal (book_<n>_<mode>_journal.jsonl). Checkpoints only append
+    the newly generated results to the journal; the snapshot is rewritten when the journal is
+    compacted. Loading replays the journal on top of the snapshot.
+    
+    With backend="sqlite" progress is kept in an indexed SQLite database instead
+    (see metadata_store.py) and the metadata file is exported from it on save.
+    
+    Either way a completion ledger (book_<n>_<mode>_ledger.json) tracks which blocks are done.
+    """
+    
+    def __init__(self, output_dir="audio_output", backend="json"):
         self.output_dir = output_dir
+        self.backend = backend
+        self.store = None
+        self.ledgers = {}
+        
+        if backend == "sqlite":
+            from metadata_store import MetadataStore
+            os.makedirs(output_dir, exist_ok=True)
+            self.store = MetadataStore(Path(output_dir) / "progress.db")
+        elif backend != "json":
+            raise ValueError(f"Unknown progress backend '{backend}'. Choose 'json' or 'sqlite'.")
+    
+    def metadata_path(self, book_number, mode):
+        return Path(self.output_dir) / f"book_{book_number}_{mode}_metadata.json"
+    
+    def journal_path(self, book_number, mode):
+        return Path(self.output_dir) / f"book_{book_number}_{mode}_journal.jsonl"
     
-    def load_existing_progress(self, book_number, mode):
-        metadata_file = Path(self.output_dir) / f"book_{book_number}_{mode}_metadata.json"
+    def ledger_path(self, book_number, mode):
+        return Path(self.output_dir) / f"book_{book_number}_{mode}_ledger.json"
+    
+    def overrides_path(self, book_number, mode):
+        return Path(self.output_dir) / f"book_{book_number}_{mode}_overrides.json"
+    
+    def load_override_baseline(self, book_number, mode):
+        """The pronunciation overrides in effect when the book's clips were last checked, or None"""
+        overrides_file = self.overrides_path(book_number, mode)
+        if not overrides_file.exists():
+            return None
+        try:
+            with open(overrides_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading pronunciation override baseline: {e}")
+            return None
+    
+    def save_override_baseline(self, book_number, mode, overrides):
+        overrides_file = self.overrides_path(book_number, mode)
+        temp_file = overrides_file.with_name(overrides_file.name + ".tmp")
+        try:
+            with open(temp_file, 'w') as f:
+                json.dump(overrides, f, indent=2)
+            os.replace(temp_file, overrides_file)
+        except Exception as e:
+            print(f"Error saving pronunciation override baseline: {e}")
+    
+    def load_ledger(self, book_number, mode):
+        ledger = self.ledgers.get((book_number, mode))
+        if ledger is None:
+            ledger = CompletionLedger.load(self.ledger_path(book_number, mode))
+            if ledger is not None:
+                self.ledgers[(book_number, mode)] = ledger
+        return ledger
+    
+    def start_ledger(self, book_number, mode, content_blocks, split_chunks, source_file, complete_indices):
+        """Write a fresh completion ledger for the blocks just extracted from source_file"""
+        ledger = CompletionLedger.create(
+            self.ledger_path(book_number, mode), book_number, mode,
+            content_blocks, split_chunks, CompletionLedger.fingerprint(source_file)
+        )
+        ledger.mark_done(complete_indices)
+        ledger.save()
+        self.ledgers[(book_number, mode)] = ledger
+        return ledger
+    
+    def load_existing_progress(self, book_number, mode, repair=False):
+        """
+        The book's progress (snapshot plus journal), or None. Only the writer resuming the
+        book passes repair=True (see read_journal); every other caller only reads.
+        """
+        if self.store and self.store.has_book(book_number, mode):
+            existing_data = self.store.load_progress(book_number, mode)
+            print(f"Found existing progress: {len(existing_data['audio_files'])} files already processed")
+            return existing_data
+        
+        metadata_file = self.metadata_path(book_number, mode)
+        existing_data = None
         if metadata_file.exists():
             try:
                 with open(metadata_file, 'r') as f:
                     existing_data = json.load(f)
-                print(f"Found existing progress: {len(existing_data.get('audio_files', []))} files already processed")
-                return existing_data
             except Exception as e:
                 print(f"Error loading existing progress: {e}")
-        return None
+        
+        journal_entries = self.read_journal(book_number, mode, repair)
+        if journal_entries:
+            if existing_data is None:
+                existing_data = {'book': book_number, 'mode': mode, 'audio_files': []}
+            self.replay_journal(existing_data, journal_entries)
+        
+        if existing_data is not None:
+            print(f"Found existing progress: {len(existing_data.get('audio_files', []))} files already processed")
+            if self.store:
+                # First run with the SQLite backend: import the existing JSON progress
+                self.store.replace_block_results(book_number, mode, existing_data.get('audio_files', []))
+                self.store.save_characters(
+                    book_number, mode,
+                    existing_data.get('character_voices', {}),
+                    existing_data.get('character_descriptions', {}),
+                    existing_data.get('character_genders', {})
+                )
+        return existing_data
+    
+    def read_journal(self, book_number, mode, repair=False):
+        """
+        Read journal entries. An incomplete final line is skipped: a writer may be appending
+        it right now, or a crash tore it. Readers leave the file alone, since the writer may
+        still finish the line; only the writer resuming the book passes repair=True, which
+        truncates a torn line away so its appends start on a clean line.
+        """
+        journal_file = self.journal_path(book_number, mode)
+        if not journal_file.exists():
+            return []
+        
+        entries = []
+        valid_length = 0
+        with open(journal_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    if line.strip():
+                        entries.append(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    print(f"Ignoring incomplete journal entry in {journal_file.name}")
+                    break
+                valid_length += len(line)
+        
+        if repair and valid_length < journal_file.stat().st_size:
+            print(f"Dropping incomplete journal entry in {journal_file.name}")
+            with open(journal_file, 'r+b') as f:
+                f.truncate(valid_length)
+        return entries
+    
+    def replay_journal(self, existing_data, journal_entries):
+        """Apply journal entries to a loaded snapshot. Results are keyed by filename, last write wins."""
+        audio_files = existing_data.setdefault('audio_files', [])
+        positions = {audio_file['filename']: i for i, audio_file in enumerate(audio_files)}
+        
+        for entry in journal_entries:
+            if entry.get('type') == 'audio_file':
+                result = entry['data']
+                if result['filename'] in positions:
+                    audio_files[positions[result['filename']]] = result
+                else:
+                    positions[result['filename']] = len(audio_files)
+                    audio_files.append(result)
+            elif entry.get('type') == 'characters':
+                for key in ('character_voices', 'character_descriptions', 'character_genders'):
+                    existing_data.setdefault(key, {}).update(entry['data'].get(key, {}))
+        
+        BlockScheduler.sort_audio_files(audio_files)
+        existing_data['total_blocks_processed'] = len(audio_files)
+    
+    def record_blocks(self, book_number, mode, content_blocks):
+        """Remember the full list of blocks a book is expected to produce"""
+        if self.store:
+            self.store.record_blocks(book_number, mode, content_blocks)
     
-    def save_progress(self, book_number, mode, character_voices, character_descriptions, character_genders, completed_blocks):
-        metadata_file = Path(self.output_dir) / f"book_{book_number}_{mode}_metadata.json"
+    def append_results(self, book_number, mode, new_results, characters=None):
+        """
+        Checkpoint a batch of new results by appending them to the journal.
+        Cost depends only on the size of the batch, not on how much of the book is done.
+        """
+        if not new_results and not characters:
+            return
+        
+        if self.store:
+            self.store.add_audio_files(book_number, mode, new_results)
+            if characters:
+                self.store.save_characters(
+                    book_number, mode,
+                    characters.get('character_voices', {}),
+                    characters.get('character_descriptions', {}),
+                    characters.get('character_genders', {})
+                )
+            self.update_ledger(book_number, mode, new_results)
+            return
+        
+        lines = []
+        if characters:
+            lines.append(json.dumps({'type': 'characters', 'data': characters}))
+        for result in new_results:
+            lines.append(json.dumps({'type': 'audio_file', 'data': result}))
+        
+        try:
+            with open(self.journal_path(book_number, mode), 'a') as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"Error appending to progress journal: {e}")
+            return
+        self.update_ledger(book_number, mode, new_results)
+    
+    def update_ledger(self, book_number, mode, new_results, replace=False):
+        """Mark blocks done in the completion ledger, once their results are safely on disk"""
+        ledger = self.load_ledger(book_number, mode)
+        if ledger is None:
+            return
+        if replace:
+            ledger.reset_from_results(new_results)
+        else:
+            # Every checkpoint batch holds all parts of the blocks it contains
+            ledger.mark_results(new_results)
+        ledger.save()
+    
+    def save_progress(self, book_number, mode, character_voices, character_descriptions, character_genders, completed_blocks,
+                      dropped=()):
+        """
+        Write a full snapshot and compact the journal into it. dropped lists the global_index
+        of blocks whose results the caller discarded; the SQLite store deletes only those and
+        keeps results other writers added, while the JSON snapshot is completed_blocks itself.
+        """
+        metadata_file = self.metadata_path(book_number, mode)
+        
+        # Blocks may be synthesized out of order (see BlockScheduler); always store them in playback order
+        BlockScheduler.sort_audio_files(completed_blocks)
+        
+        if self.store:
+            try:
+                self.store.replace_block_results(book_number, mode, completed_blocks, dropped)
+                self.store.save_characters(book_number, mode, character_voices, character_descriptions, character_genders)
+                metadata = self.store.export_legacy_json(book_number, mode, metadata_file)
+            except Exception as e:
+                print(f"Error saving progress: {e}")
+                return
+            self.update_ledger(book_number, mode, metadata['audio_files'], replace=True)
+            return
         
         updated_metadata = {
             'book': book_number,
@@ -32,20 +262,58 @@ class ProgressManager:
             'last_updated': str(Path().cwd())
         }
         
+        # Write to a temporary file and swap it in, so a crash never leaves a half-written snapshot;
+        # the name is unique per process and thread so concurrent writers never share one
+        temp_file = metadata_file.with_name(f"{metadata_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
         try:
-            with open(metadata_file, 'w') as f:
+            with open(temp_file, 'w') as f:
                 json.dump(updated_metadata, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, metadata_file)
         except Exception as e:
             print(f"Error saving progress: {e}")
+            return
+        self.update_ledger(book_number, mode, completed_blocks, replace=True)
+        
+        # Everything in the journal is now part of the snapshot
+        journal_file = self.journal_path(book_number, mode)
+        journal_file.unlink(missing_ok=True)
     
     def show_progress(self, book_number, mode="multi_voice"):
-        existing_data = self.load_existing_progress(book_number, mode)
-        if existing_data:
-            total_files = len(existing_data.get('audio_files', []))
+        ledger = self.load_ledger(book_number, mode)
+        if ledger is not None:
+            # Exact block counts straight from the ledger
+            done_blocks = ledger.done_blocks
             print(f"Progress for Book {book_number} ({mode} mode):")
-            print(f"   • {total_files} audio files generated")
-            print(f"   • Last block processed: {existing_data.get('total_blocks_processed', 0)}")
+            print(f"   • {done_blocks}/{ledger.total_blocks} blocks complete "
+                  f"({done_blocks / max(ledger.total_blocks, 1) * 100:.1f}%), "
+                  f"{ledger.expected_files} audio files expected")
+            chapters = ledger.chapter_progress()
+            print("   • Chapters:")
+            for chapter, done, total in chapters[:5]:
+                print(f"     - Chapter {chapter}: {done}/{total} blocks")
+            if len(chapters) > 5:
+                finished = sum(1 for _, done, total in chapters[5:] if done == total)
+                print(f"     - ... and {len(chapters) - 5} more chapters ({finished} of them complete)")
+            return
+        
+        if self.store and self.store.has_book(book_number, mode):
+            # Answered from indexes, without loading the audio file list
+            total_files = self.store.count_audio_files(book_number, mode)
+            blocks_processed = self.store.count_completed_blocks(book_number, mode)
+            total_blocks = self.store.count_blocks(book_number, mode)
+            content_types = self.store.counts_by(book_number, mode, 'content_type')
+            chapter_counts = self.store.counts_by(book_number, mode, 'chapter_number')
+        else:
+            existing_data = self.load_existing_progress(book_number, mode)
+            if not existing_data:
+                print(f"No existing progress found for Book {book_number} ({mode} mode)")
+                return
             
+            total_files = len(existing_data.get('audio_files', []))
+            blocks_processed = existing_data.get('total_blocks_processed', 0)
+            total_blocks = None
             content_types = {}
             chapter_counts = {}
             for audio_file in existing_data.get('audio_files', []):
@@ -54,20 +322,24 @@ class ProgressManager:
                 
                 chapter_num = audio_file.get('chapter_number', 1)
                 chapter_counts[chapter_num] = chapter_counts.get(chapter_num, 0) + 1
-            
-            if content_types:
-                print("   • Content types processed:")
-                for ctype, count in sorted(content_types.items(), key=lambda x: x[1], reverse=True):
-                    print(f"     - {ctype}: {count}")
-            
-            if chapter_counts:
-                print("   • Chapters processed:")
-                for chapter, count in sorted(chapter_counts.items())[:5]:
-                    print(f"     - Chapter {chapter}: {count} blocks")
-                if len(chapter_counts) > 5:
-                    print(f"     - ... and {len(chapter_counts) - 5} more chapters")
-        else:
-            print(f"No existing progress found for Book {book_number} ({mode} mode)")
+        
+        print(f"Progress for Book {book_number} ({mode} mode):")
+        print(f"   • {total_files} audio files generated")
+        print(f"   • Last block processed: {blocks_processed}")
+        if total_blocks:
+            print(f"   • {blocks_processed}/{total_blocks} blocks have audio")
+        
+        if content_types:
+            print("   • Content types processed:")
+            for ctype, count in sorted(content_types.items(), key=lambda x: x[1], reverse=True):
+                print(f"     - {ctype}: {count}")
+        
+        if chapter_counts:
+            print("   • Chapters processed:")
+            for chapter, count in sorted(chapter_counts.items())[:5]:
+                print(f"     - Chapter {chapter}: {count} blocks")
+            if len(chapter_counts) > 5:
+                print(f"     - ... and {len(chapter_counts) - 5} more chapters")
     
     def display_content_statistics(self, content_blocks):
         type_counts = {}
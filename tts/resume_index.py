@@ -0,0 +1,104 @@
+import hashlib
+import os
+from pathlib import Path
+
+from audio_archive import AudioArchive
+
+
+class ResumeIndex:
+    """
+    Tells the pipeline which content blocks already have complete audio on disk.
+
+    Existing results are grouped by block (global_index + hash of the block text) once,
+    and each chapter directory is listed with a single os.scandir instead of stat-ing
+    every expected file. A block counts as complete only if every one of its parts
+    (split blocks produce several files) is present.
+    """
+
+    def __init__(self, output_dir, book_identifier):
+        self.book_dir = Path(output_dir) / f"book_{book_identifier:02d}"
+        self.blocks = {}
+        self.global_indices = set()
+        self.files_on_disk = {}
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.md5(text.encode()).hexdigest()[:8]
+
+    @staticmethod
+    def result_key(audio_file):
+        block_hash = audio_file.get('block_hash')
+        if block_hash is None:
+            if audio_file.get('is_split'):
+                # Older split results don't record the block hash; match on length instead
+                return (audio_file['global_index'], 'length', audio_file.get('original_text_length'))
+            # For unsplit blocks the file name ends with the block text hash
+            block_hash = audio_file['filename'].rsplit('_', 1)[-1].split('.')[0]
+        return (audio_file['global_index'], block_hash)
+
+    def build(self, audio_files):
+        """Group existing results by block and list the chapter directories they live in"""
+        for audio_file in audio_files:
+            entry = self.blocks.setdefault(self.result_key(audio_file), {
+                'chapter_number': audio_file.get('chapter_number', 1),
+                'total_chunks': audio_file.get('total_chunks', 1),
+                'filenames': set()
+            })
+            entry['filenames'].add(audio_file['filename'])
+            self.global_indices.add(audio_file['global_index'])
+
+        for chapter_number in {entry['chapter_number'] for entry in self.blocks.values()}:
+            self.files_on_disk[chapter_number] = self.scan_chapter(chapter_number)
+        return self
+
+    def chapter_dir(self, chapter_number):
+        return self.book_dir / f"chapter_{chapter_number:02d}"
+
+    def scan_chapter(self, chapter_number):
+        """
+        Names of all files in a chapter directory, from one directory listing (no per-file
+        stat), plus the chapter's clips in the output directory's archive if it has one
+        """
+        files = set()
+        archive = AudioArchive.for_output_dir(self.book_dir.parent)
+        if archive is not None:
+            files.update(archive.list_dir(f"{self.book_dir.name}/{self.chapter_dir(chapter_number).name}/"))
+        try:
+            with os.scandir(self.chapter_dir(chapter_number)) as entries:
+                files.update(entry.name for entry in entries)
+        except FileNotFoundError:
+            pass
+        return files
+
+    def verify(self, audio_files, workers=None):
+        """
+        Check the existing files of these results for damage (see audio_scanner.verify_audio_files)
+        and forget the damaged ones, so their blocks are no longer complete. Returns
+        {filename: problem}.
+        """
+        from audio_scanner import verify_audio_files
+        present = [audio_file for audio_file in audio_files
+                   if audio_file['filename'] in self.files_on_disk.get(audio_file.get('chapter_number', 1), set())]
+        problems = verify_audio_files(present, workers)
+        damaged = {}
+        for audio_file in present:
+            problem = problems.get(audio_file['file_path'])
+            if problem:
+                self.files_on_disk[audio_file.get('chapter_number', 1)].discard(audio_file['filename'])
+                damaged[audio_file['filename']] = problem
+        return damaged
+
+    def lookup(self, block, text_hash=None):
+        text_hash = text_hash or self.text_hash(block['text'])
+        entry = self.blocks.get((block['global_index'], text_hash))
+        if entry is None:
+            entry = self.blocks.get((block['global_index'], 'length', len(block['text'])))
+        return entry
+
+    def is_complete(self, block, text_hash=None):
+        entry = self.lookup(block, text_hash)
+        if entry is None or len(entry['filenames']) < entry['total_chunks']:
+            return False
+
+        on_disk = self.files_on_disk.get(entry['chapter_number'], set())
+        return all(filename in on_disk for filename in entry['filenames'])
@@ -0,0 +1,362 @@
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from progress_manager import ProgressManager
+
+
+# Runs of letters and digits, so word boundaries match the \b of the pronunciation overrides
+# ("Dorothea's" is dorothea, s and is found by a search for Dorothea)
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Lowercase words of text"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def encode_varints(values):
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data):
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    return values
+
+
+def encode_postings(postings):
+    """{doc_id: [positions]} -> varints of (doc_id delta, position count, position deltas...)"""
+    values = []
+    previous_doc = 0
+    for doc_id in sorted(postings):
+        positions = postings[doc_id]
+        values.extend((doc_id - previous_doc, len(positions)))
+        previous_position = 0
+        for position in positions:
+            values.append(position - previous_position)
+            previous_position = position
+        previous_doc = doc_id
+    return encode_varints(values)
+
+
+def decode_postings(data):
+    postings = {}
+    values = decode_varints(data)
+    i = 0
+    doc_id = 0
+    while i < len(values):
+        doc_id += values[i]
+        count = values[i + 1]
+        positions = []
+        position = 0
+        for delta in values[i + 2:i + 2 + count]:
+            position += delta
+            positions.append(position)
+        postings[doc_id] = positions
+        i += 2 + count
+    return postings
+
+
+class SearchIndex:
+    """
+    Positional inverted index over the text of every generated clip of a library
+    (audio_output/search_index.db).
+
+    Each clip is a document with its book, global_index, chapter, speaker and start
+    time. Each term maps to one row per book holding its postings (documents and word
+    positions) as delta-encoded varints, so a query reads only the rows of its own
+    terms, and a book whose progress changed is re-indexed without touching the others.
+    Phrases match when their words appear at consecutive positions of the same clip.
+    """
+
+    # Only the start of each clip's text is stored, for showing hits; the postings cover all of it
+    PREVIEW_CHARS = 160
+    # Indexes built with an older layout are dropped and rebuilt
+    SCHEMA_VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS docs (
+            doc_id INTEGER PRIMARY KEY,
+            book INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            global_index INTEGER NOT NULL,
+            chunk_index INTEGER NOT NULL DEFAULT 0,
+            chapter_number INTEGER,
+            character_id TEXT,
+            character_name TEXT,
+            offset_ms INTEGER,
+            file_path TEXT,
+            text TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_docs_book ON docs (book);
+        CREATE INDEX IF NOT EXISTS idx_docs_character ON docs (character_id);
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            book INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (term, book)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_postings_book ON postings (book);
+        -- The version of each book's progress that is indexed (see book_versions)
+        CREATE TABLE IF NOT EXISTS books (
+            book INTEGER PRIMARY KEY,
+            version TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, output_dir="audio_output", mode="multi_voice"):
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.db_path = self.output_dir / "search_index.db"
+        self.progress_manager = ProgressManager(output_dir=output_dir)
+        # Processes of a library run share the index; a rebuild by one makes the others wait
+        self.conn = sqlite3.connect(str(self.db_path), timeout=60)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            self.conn.executescript(
+                "BEGIN IMMEDIATE;"
+                "DROP TABLE IF EXISTS docs; DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS sources;"
+                "DROP TABLE IF EXISTS books;"
+                + self.SCHEMA +
+                f"PRAGMA user_version = {self.SCHEMA_VERSION}; COMMIT;"
+            )
+
+    def book_versions(self):
+        """
+        {book: version} of every book with progress. A book kept in the SQLite progress
+        store is versioned by the store's per-book change counter; file modification times
+        can't be used there, as in WAL mode new rows land in progress.db-wal. Other books
+        are versioned by the modification time and size of their metadata and journal files.
+        """
+        versions = {}
+        for path in sorted(self.output_dir.glob(f"book_*_{self.mode}_*")):
+            match = re.match(rf"book_(\d+)_{self.mode}_(metadata\.json|journal\.jsonl)$", path.name)
+            if match:
+                stat = path.stat()
+                book_number = int(match.group(1))
+                versions[book_number] = f"{versions.get(book_number, '')}{match.group(2)}:{stat.st_mtime_ns}:{stat.st_size} "
+        store_file = self.output_dir / "progress.db"
+        if store_file.exists():
+            from metadata_store import MetadataStore
+            for book_number, version in MetadataStore(store_file, read_only=True).book_versions(self.mode).items():
+                versions[book_number] = f"store:{version}"
+        return versions
+
+    def stale_books(self, versions=None):
+        """Books whose indexed version differs from their progress, including removed ones"""
+        if versions is None:
+            versions = self.book_versions()
+        indexed = dict(self.conn.execute("SELECT book, version FROM books"))
+        return sorted(book for book in set(indexed) | set(versions) if indexed.get(book) != versions.get(book))
+
+    def is_current(self):
+        return not self.stale_books()
+
+    def book_numbers(self):
+        return sorted(self.book_versions())
+
+    def load_progress(self, book_number):
+        # Prefer the SQLite progress store when the pipeline was run with it
+        store_file = self.output_dir / "progress.db"
+        if store_file.exists():
+            from metadata_store import MetadataStore
+            store = MetadataStore(store_file, read_only=True)
+            if store.has_book(book_number, self.mode):
+                return store.load_progress(book_number, self.mode)
+        return self.progress_manager.load_existing_progress(book_number, self.mode)
+
+    def index_books(self, book_numbers, versions):
+        """
+        Replace the documents and postings of book_numbers (inside the caller's
+        transaction); books without a version are removed. Returns (clips, terms) indexed.
+        """
+        doc_id = self.conn.execute("SELECT COALESCE(MAX(doc_id), 0) FROM docs").fetchone()[0]
+        doc_count = 0
+        term_count = 0
+        for book_number in book_numbers:
+            self.conn.execute("DELETE FROM docs WHERE book = ?", (book_number,))
+            self.conn.execute("DELETE FROM postings WHERE book = ?", (book_number,))
+            if book_number not in versions:
+                self.conn.execute("DELETE FROM books WHERE book = ?", (book_number,))
+                continue
+            progress = self.load_progress(book_number) or {}
+            docs = []
+            terms = {}
+            for audio_file in sorted(progress.get('audio_files', []), key=lambda x: (x['global_index'], x.get('chunk_index', 0))):
+                doc_id += 1
+                text = audio_file.get('text', '')
+                docs.append((
+                    doc_id, book_number, self.mode, audio_file['global_index'], audio_file.get('chunk_index', 0),
+                    audio_file.get('chapter_number', 1), audio_file.get('character_id'), audio_file.get('character_name'),
+                    audio_file.get('offset_ms'), audio_file.get('file_path'), " ".join(text.split())[:self.PREVIEW_CHARS]
+                ))
+                for position, term in enumerate(tokenize(text)):
+                    terms.setdefault(term, {}).setdefault(doc_id, []).append(position)
+            self.conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", docs)
+            self.conn.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?)",
+                ((term, book_number, encode_postings(postings)) for term, postings in terms.items())
+            )
+            self.conn.execute("INSERT OR REPLACE INTO books VALUES (?, ?)", (book_number, versions[book_number]))
+            doc_count += len(docs)
+            term_count += len(terms)
+        return doc_count, term_count
+
+    def build(self, if_stale=False):
+        """
+        Rebuild the whole index from every book's progress; returns the number of indexed
+        clips. The rebuild holds the index's write lock, so processes sharing the index
+        rebuild it one at a time. With if_stale=True a process that waited for the lock
+        returns None instead of rebuilding when another one has just made the index current.
+        """
+        start = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            versions = self.book_versions()
+            if if_stale and not self.stale_books(versions):
+                self.conn.rollback()
+                return None
+            self.conn.execute("DELETE FROM docs")
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM books")
+            doc_count, term_count = self.index_books(sorted(versions), versions)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        try:
+            self.conn.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            # VACUUM only reclaims space; it cannot run while another process reads the index
+            print(f"Skipped compacting the search index: {e}")
+        print(f"Indexed {doc_count} clips, {term_count} terms in {time.time() - start:.1f}s")
+        return doc_count
+
+    def ensure_current(self, book=None):
+        """
+        Re-index the books (only book, if given) whose progress changed since they were
+        indexed; returns the list of re-indexed books
+        """
+        versions = self.book_versions()
+        stale = [book_number for book_number in self.stale_books(versions) if book is None or book_number == book]
+        if not stale:
+            return []
+        start = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have re-indexed them while this one waited for the lock
+            versions = self.book_versions()
+            stale = [book_number for book_number in self.stale_books(versions) if book is None or book_number == book]
+            doc_count, term_count = self.index_books(stale, versions)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if stale:
+            print(f"Indexed {doc_count} clips, {term_count} terms of books "
+                  f"{', '.join(map(str, stale))} in {time.time() - start:.1f}s")
+        return stale
+
+    def postings(self, term, book=None):
+        """{doc_id: [positions]} of a term, across the library or in one book"""
+        if book is None:
+            rows = self.conn.execute("SELECT data FROM postings WHERE term = ?", (term,))
+        else:
+            rows = self.conn.execute("SELECT data FROM postings WHERE term = ? AND book = ?", (term, book))
+        postings = {}
+        for (data,) in rows:
+            postings.update(decode_postings(data))
+        return postings
+
+    def matching_docs(self, terms, book=None):
+        """Documents containing the terms as a phrase (consecutive words)"""
+        if not terms:
+            return []
+        # Start from the rarest term so the candidate set is small from the beginning
+        lists = [self.postings(term, book) for term in terms]
+        rarest = min(range(len(terms)), key=lambda i: len(lists[i]))
+        matches = []
+        for doc_id, positions in lists[rarest].items():
+            if not all(doc_id in postings for postings in lists):
+                continue
+            starts = {position - rarest for position in positions}
+            for i, postings in enumerate(lists):
+                starts &= {position - i for position in postings[doc_id]}
+                if not starts:
+                    break
+            if starts:
+                matches.append(doc_id)
+        return sorted(matches)
+
+    def search(self, query, character=None, book=None, limit=20):
+        """
+        Clips containing query as a phrase, in library order, optionally only those spoken
+        by a character (id or name) or in one book, at most limit of them (None for all).
+        Each hit is a dict with the clip's book, global_index, chapter_number, character,
+        offset_ms, file_path and text.
+        """
+        doc_ids = self.matching_docs(tokenize(query), book)
+        if not doc_ids:
+            return []
+
+        condition = ""
+        params = []
+        if character:
+            condition = " AND (character_id = ? OR lower(character_name) = lower(?))"
+            params.extend([character, character])
+
+        hits = []
+        columns = ("doc_id", "book", "mode", "global_index", "chunk_index", "chapter_number",
+                   "character_id", "character_name", "offset_ms", "file_path", "text")
+        # SQLite limits the number of host parameters, so look documents up in batches
+        for batch_start in range(0, len(doc_ids), 500):
+            batch = doc_ids[batch_start:batch_start + 500]
+            sql = f"SELECT {', '.join(columns)} FROM docs WHERE doc_id IN ({','.join('?' * len(batch))})"
+            for row in self.conn.execute(sql + condition, batch + params):
+                hits.append(dict(zip(columns, row)))
+        # Re-indexed books get new doc_ids, so library order comes from the clips themselves
+        hits.sort(key=lambda hit: (hit['book'], hit['global_index'], hit['chunk_index']))
+        return hits[:limit] if limit else hits
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python search_index.py build")
+        print("       python search_index.py <phrase> [--character ID] [--book N]")
+        sys.exit(0)
+
+    index = SearchIndex()
+    if sys.argv[1] == "build":
+        index.build()
+    else:
+        args = sys.argv[1:]
+        options = {}
+        for option in ("--character", "--book"):
+            if option in args:
+                position = args.index(option)
+                options[option] = args[position + 1]
+                del args[position:position + 2]
+        index.ensure_current()
+        for hit in index.search(" ".join(args), character=options.get("--character"),
+                                book=int(options["--book"]) if "--book" in options else None):
+            print(f"Book {hit['book']} ch.{hit['chapter_number']} block {hit['global_index']} "
+                  f"({hit['character_name']}): {hit['text'][:100]}")
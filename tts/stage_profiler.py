@@ -0,0 +1,123 @@
+import cProfile
+import functools
+import io
+import pstats
+import time
+import tracemalloc
+from pathlib import Path
+
+
+class StageProfiler:
+    """
+    Profiles the pipeline's hot paths with cProfile and tracemalloc, one stage per method.
+
+    Methods are wrapped on the live objects, so nothing changes when profiling is off.
+    When a profiled stage calls another one (extract_all_content_blocks calls
+    group_continuous_blocks), the outer profile is paused so each stage's report only
+    contains its own work.
+    """
+
+    STAGES = {
+        'content_extractor': ['extract_all_content_blocks', 'group_continuous_blocks'],
+        'audio_generator': ['split_text_at_sentences', 'apply_pronunciation_overrides'],
+        'progress_manager': ['save_progress']
+    }
+
+    def __init__(self, output_dir="audio_output", top_functions=25):
+        self.report_dir = Path(output_dir) / "profiles"
+        self.top_functions = top_functions
+        self.active = []
+        self.reset()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        self.stats = {}
+
+    def instrument(self, pipeline):
+        """Wrap the profiled methods of a TTSPipeline's components"""
+        for attribute, method_names in self.STAGES.items():
+            component = getattr(pipeline, attribute)
+            for method_name in method_names:
+                self.wrap(component, method_name)
+
+    def wrap(self, obj, method_name):
+        original = getattr(obj, method_name)
+
+        @functools.wraps(original)
+        def profiled(*args, **kwargs):
+            return self.run(method_name, original, *args, **kwargs)
+
+        setattr(obj, method_name, profiled)
+
+    def stage_stats(self, stage):
+        stats = self.stats.get(stage)
+        if stats is None:
+            stats = self.stats[stage] = {
+                'profile': cProfile.Profile(),
+                'calls': 0,
+                'seconds': 0.0,
+                'peak_bytes': 0,
+                'retained_bytes': 0
+            }
+        return stats
+
+    def run(self, stage, func, *args, **kwargs):
+        stats = self.stage_stats(stage)
+
+        # Pause the enclosing stage and fold its peak so far into its record
+        if self.active:
+            outer = self.active[-1]
+            outer['profile'].disable()
+            outer['peak_bytes'] = max(outer['peak_bytes'], tracemalloc.get_traced_memory()[1] - outer['_base'])
+
+        self.active.append(stats)
+        tracemalloc.reset_peak()
+        stats['_base'] = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        stats['profile'].enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats['profile'].disable()
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            stats['calls'] += 1
+            stats['seconds'] += elapsed
+            stats['peak_bytes'] = max(stats['peak_bytes'], peak - stats['_base'])
+            stats['retained_bytes'] += current - stats['_base']
+            self.active.pop()
+
+            if self.active:
+                outer = self.active[-1]
+                tracemalloc.reset_peak()
+                outer['profile'].enable()
+
+    def format_report(self, title):
+        lines = [f"Profile: {title}", "=" * 60, "", "Stage summary (slowest first):"]
+        lines.append(f"  {'stage':<32}{'calls':>8}{'total s':>10}{'peak KB':>12}{'retained KB':>14}")
+        ordered = sorted(self.stats.items(), key=lambda x: x[1]['seconds'], reverse=True)
+        for stage, stats in ordered:
+            lines.append(
+                f"  {stage:<32}{stats['calls']:>8}{stats['seconds']:>10.3f}"
+                f"{stats['peak_bytes'] / 1024:>12.1f}{stats['retained_bytes'] / 1024:>14.1f}"
+            )
+
+        for stage, stats in ordered:
+            stream = io.StringIO()
+            pstats.Stats(stats['profile'], stream=stream).sort_stats('cumulative').print_stats(self.top_functions)
+            lines.extend(["", "-" * 60, f"Hotspots in {stage}", "-" * 60, stream.getvalue()])
+
+        return "\n".join(lines)
+
+    def write_report(self, book_identifier, mode="multi_voice"):
+        """Write the report for one book and start fresh for the next"""
+        if not self.stats:
+            return None
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        report_file = self.report_dir / f"book_{book_identifier}_{mode}_profile.txt"
+        with open(report_file, 'w') as f:
+            f.write(self.format_report(f"book {book_identifier} ({mode})"))
+        print(f"Profile report written to: {report_file}")
+        self.reset()
+        return report_file
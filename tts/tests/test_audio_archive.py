@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_archive import AudioArchive, read_audio_data, clip_exists
+from resume_index import ResumeIndex
+
+def test_audio_archive():
+    """Clips are appended to segments, read back through the index and exported as loose files."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        archive = AudioArchive.for_output_dir(output_dir, create=True, segment_bytes=1000)
+        assert AudioArchive.for_output_dir(output_dir) is archive
+
+        names = [f"book_01/chapter_0{chapter}/000{i}_clip.mp3" for chapter, i in [(1, 1), (1, 2), (2, 3)]]
+        assert archive.put(names[0], b"a" * 600) == (0, 0)
+        assert archive.put(names[1], b"b" * 300) == (0, 600)
+        # Doesn't fit in the 1000-byte segment any more
+        assert archive.put(names[2], b"c" * 300) == (1, 0)
+
+        # An append that crashed before its index entry was committed is overwritten
+        with open(archive.segment_path(1), 'ab') as f:
+            f.write(b"orphan")
+        assert archive.put(names[1], b"B" * 100) == (1, 300)
+        assert os.path.getsize(archive.segment_path(1)) == 400
+
+        assert bytes(archive.get(names[1])) == b"B" * 100
+        assert archive.get("book_01/chapter_01/missing.mp3") is None
+        assert archive.list_dir("book_01/chapter_01/") == {"0001_clip.mp3": 600, "0002_clip.mp3": 100}
+
+        file_path = os.path.join(output_dir, names[2])
+        assert clip_exists(file_path)
+        assert bytes(read_audio_data(file_path)) == b"c" * 300
+        assert not clip_exists(os.path.join(output_dir, "book_01/chapter_09/0009_clip.mp3"))
+
+        index = ResumeIndex(output_dir, 1).build([
+            {'global_index': 3, 'chapter_number': 2, 'block_hash': 'h', 'filename': "0003_clip.mp3"}
+        ])
+        assert index.is_complete({'global_index': 3, 'text': ""}, text_hash='h')
+
+        loose_dir = Path(output_dir) / "loose"
+        assert archive.export(loose_dir) == 3
+        assert (loose_dir / names[0]).read_bytes() == b"a" * 600
+        assert archive.verify() == []
+        with open(archive.segment_path(0), 'r+b') as f:
+            f.write(b"x")
+        archive.maps.clear()
+        assert archive.verify() == [names[0]]
+        print("Audio archive test passed")
+
+if __name__ == "__main__":
+    test_audio_archive()
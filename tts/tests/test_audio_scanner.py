@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_scanner import scan_audio_file, index_durations
+
+# MPEG-2 Layer III, 64 kbit/s, 24 kHz, mono: 192-byte frames of 576 samples (24 ms)
+FRAME = b"\xff\xf3\x84\xc4" + b"\x00" * 188
+
+def write_mp3(path, frame_count):
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+    xing = b"\xff\xf3\x84\xc4" + b"\x00" * 32 + b"Info" + b"\x00" * 152
+    with open(path, 'wb') as f:
+        f.write(id3 + xing + FRAME * frame_count + b"TAG" + b"\x00" * 125)
+
+def test_audio_scanner():
+    """Durations come from frame headers; offsets accumulate in playback order."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        paths = []
+        for i, frame_count in enumerate([250, 100, 40]):
+            paths.append(os.path.join(output_dir, f"{i}.mp3"))
+            write_mp3(paths[-1], frame_count)
+
+        assert scan_audio_file(paths[0]) == {'duration_ms': 6000, 'frames': 250}
+
+        # A truncated file only counts its complete frames
+        with open(paths[2], 'r+b') as f:
+            f.truncate(20 + 192 + 192 * 10 + 50)
+        assert scan_audio_file(paths[2])['frames'] == 10
+        assert scan_audio_file(os.path.join(output_dir, "missing.mp3")) is None
+
+        audio_files = [
+            {'global_index': 2, 'filename': "1.mp3", 'file_path': paths[1]},
+            {'global_index': 1, 'filename': "0.mp3", 'file_path': paths[0]},
+            {'global_index': 3, 'filename': "2.mp3", 'file_path': paths[2]},
+        ]
+        total_ms = index_durations(audio_files, workers=1)
+        assert total_ms == 6000 + 2400 + 240
+        assert [audio_file['offset_ms'] for audio_file in audio_files] == [6000, 0, 8400]
+    print("Audio scanner test passed")
+
+if __name__ == "__main__":
+    test_audio_scanner()
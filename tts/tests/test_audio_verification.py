@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_scanner import verify_audio_file
+from resume_index import ResumeIndex
+
+# MPEG-2 Layer III, 64 kbit/s, 24 kHz, mono: 192-byte frames of 576 samples (24 ms)
+FRAME = b"\xff\xf3\x84\xc4" + b"\x00" * 188
+
+def test_audio_verification():
+    """Truncated, empty, desynced or too-short clips are detected and their blocks resumed."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        chapter_dir = Path(output_dir) / "book_01" / "chapter_01"
+        chapter_dir.mkdir(parents=True)
+
+        contents = {
+            'good': FRAME * 250,
+            'truncated': FRAME * 250 + FRAME[:100],
+            'empty': b"",
+            'junk': FRAME * 100 + b"junk" + FRAME * 150,
+            'short': FRAME * 10,
+        }
+        results = []
+        for global_index, (name, data) in enumerate(contents.items(), start=1):
+            filename = f"{global_index:04d}_B01C01_NARRATOR_narrative_{name}.mp3"
+            (chapter_dir / filename).write_bytes(data)
+            results.append({'global_index': global_index, 'chapter_number': 1, 'block_hash': name,
+                            'filename': filename, 'file_path': str(chapter_dir / filename), 'text': "x" * 200})
+
+        path = results[0]['file_path']
+        assert verify_audio_file(path, text_length=200) is None
+        assert verify_audio_file(path, expected_ms=6000) is None
+        assert verify_audio_file(path, expected_ms=9000) == "6000 ms long, 9000 ms expected"
+        assert verify_audio_file(results[1]['file_path']) == "truncated frame at byte 48000"
+        assert verify_audio_file(results[2]['file_path']) == "empty file"
+        assert verify_audio_file(results[3]['file_path']) == "no frame sync at byte 19200"
+        assert verify_audio_file(results[4]['file_path'], text_length=200).startswith("240 ms is too short")
+        assert verify_audio_file(os.path.join(output_dir, "missing.mp3")).startswith("unreadable")
+
+        index = ResumeIndex(output_dir, 1).build(results)
+        damaged = index.verify(results)
+        assert sorted(damaged) == sorted(result['filename'] for result in results[1:])
+        assert index.is_complete({'global_index': 1, 'text': ""}, text_hash='good')
+        assert not index.is_complete({'global_index': 2, 'text': ""}, text_hash='truncated')
+        print("Audio verification test passed")
+
+if __name__ == "__main__":
+    test_audio_verification()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_scanner import id3v2_size, scan_audio_file
+from audiobook_exporter import AudiobookExporter, main
+
+# MPEG-2 Layer III, 64 kbit/s, 24 kHz, mono: 192-byte frames of 576 samples (24 ms)
+FRAME = b"\xff\xf3\x84\xc4" + b"\x00" * 188
+INFO_FRAME = b"\xff\xf3\x84\xc4" + b"\x00" * 32 + b"Info" + b"\x00" * 152
+
+def test_audiobook_exporter():
+    """Clips are joined frame by frame behind a tag with one chapter marker per chapter."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        audio_files = []
+        for global_index, (chapter_number, frame_count) in enumerate([(1, 50), (1, 25), (2, 100)], 1):
+            file_path = os.path.join(output_dir, f"{global_index}.mp3")
+            with open(file_path, 'wb') as f:
+                f.write(b"ID3\x04\x00\x00\x00\x00\x00\x00" + INFO_FRAME + FRAME * frame_count)
+            audio_files.append({
+                'global_index': global_index, 'chapter_number': chapter_number, 'filename': f"{global_index}.mp3",
+                'file_path': file_path, 'content_type': 'chapter_title' if global_index == 3 else 'narrative',
+                'text': "CHAPTER II." if global_index == 3 else "..."
+            })
+        with open(os.path.join(output_dir, "book_1_multi_voice_metadata.json"), 'w') as f:
+            json.dump({'book': 1, 'audio_files': audio_files}, f)
+
+        path = AudiobookExporter(output_dir=output_dir).export_book(1, title="Middlemarch")
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        assert scan_audio_file(path) == {'duration_ms': 175 * 24, 'frames': 175}
+        assert data[id3v2_size(data):] == FRAME * 175
+        tag = data[:id3v2_size(data)]
+        assert tag.count(b"CHAP\x00") == 2 and b"CTOC" in tag
+        chapter_two = tag.rindex(b"ch1\x00") + 4
+        assert int.from_bytes(tag[chapter_two:chapter_two + 4], 'big') == 75 * 24
+        assert int.from_bytes(tag[chapter_two + 4:chapter_two + 8], 'big') == 175 * 24
+        assert "CHAPTER II.".encode() in tag and b"Chapter 1" in tag
+    print("Audiobook exporter test passed")
+
+def test_exporter_arguments():
+    """Malformed command lines end in a usage error, not a traceback."""
+    for argv in (["1", "--format"], ["one"], ["1", "--format", "wav"], []):
+        try:
+            main(argv)
+            assert False, f"{argv} was accepted"
+        except SystemExit as e:
+            assert e.code == 2
+    print("Exporter arguments test passed")
+
+if __name__ == "__main__":
+    test_audiobook_exporter()
+    test_exporter_arguments()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_filter import BlockFilter
+
+def test_block_filter():
+    """Chapter, character and block-range criteria are combined."""
+    assert BlockFilter.parse_ranges("3-5,7,10-") == [(3, 5), (7, 7), (10, None)]
+    assert BlockFilter.from_options() is None
+
+    blocks = [
+        {'global_index': i, 'chapter_number': 1 + i // 10, 'character_id': 'D' if i % 3 == 0 else 'NARRATOR'}
+        for i in range(40)
+    ]
+
+    chapters = BlockFilter.from_options(chapters="2-3")
+    assert [block['global_index'] for block in chapters.apply(blocks)] == list(range(10, 30))
+
+    combined = BlockFilter.from_options(chapters="2-", characters="D", blocks="15-33")
+    assert [block['global_index'] for block in combined.apply(blocks)] == [15, 18, 21, 24, 27, 30, 33]
+    assert combined.describe() == "chapters 2-; characters D; blocks 15-33"
+    print("Block filter test passed")
+
+if __name__ == "__main__":
+    test_block_filter()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from character_profiles import CharacterProfileStore
+from audio_generator import AudioGenerator
+
+def test_character_profiles():
+    """Profiles round-trip through the store, and older metadata is migrated once."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        store = CharacterProfileStore(output_dir, "Middle March")
+        assert store.path.name == "characters_Middle_March.json"
+        assert store.load() is None
+
+        store.save({'D': "nova"}, {'D': "female"}, {'D': "Earnest"}, {'D': "Read as Dorothea"})
+        profiles = store.load()
+        assert profiles['character_voices'] == {'D': "nova"}
+        assert profiles['character_custom_instructions'] == {'D': "Read as Dorothea"}
+
+        # No store yet for this series: the cast comes from the newest metadata file of its own books
+        with open(os.path.join(output_dir, "book_1_multi_voice_metadata.json"), 'w') as f:
+            json.dump({'character_voices': {'C': "alloy"}, 'character_genders': {'C': "female"},
+                       'character_descriptions': {'C': "Sensible"}, 'audio_files': []}, f)
+        with open(os.path.join(output_dir, "book_2411_multi_voice_metadata.json"), 'w') as f:
+            json.dump({'character_voices': {'T': "echo"}, 'character_genders': {'T': "male"},
+                       'character_descriptions': {'T': "Charming"}, 'audio_files': []}, f)
+        os.utime(os.path.join(output_dir, "book_1_multi_voice_metadata.json"))
+        generator = AudioGenerator(api_key="test", output_dir=output_dir, series="Romola", book_numbers=[2411])
+        assert generator.character_voices == {'T': "echo"}
+        assert CharacterProfileStore(output_dir, "Romola").exists()
+
+        # Another series' metadata is never used, however recent
+        generator = AudioGenerator(api_key="test", output_dir=output_dir, series="Daniel Deronda", book_numbers=[5])
+        assert generator.character_voices == {}
+        assert not CharacterProfileStore(output_dir, "Daniel Deronda").exists()
+
+        generator = AudioGenerator(api_key="test", output_dir=output_dir, series="Middle March")
+        assert generator.character_voices == {'D': "nova"}
+        assert generator.character_descriptions == {'D': "Earnest"}
+    print("Character profiles test passed")
+
+if __name__ == "__main__":
+    test_character_profiles()
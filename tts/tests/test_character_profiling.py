@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_pipeline import TTSPipeline
+
+def test_character_profiling():
+    """Only characters who speak in scheduled blocks are profiled, once each."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = TTSPipeline(api_key="test", output_dir=output_dir)
+        generator = pipeline.audio_generator
+        profiled = []
+
+        def determine_character_gender(char_name, char_id):
+            profiled.append(char_id)
+            return "female"
+
+        generator.determine_character_gender = determine_character_gender
+        generator.generate_character_description = lambda char_name, char_id: f"{char_name}, briefly"
+        generator.character_voices.clear()
+        pipeline.all_characters = {'D': "Dorothea", 'C': "Celia", 'L': "Lydgate"}
+
+        blocks = [
+            {'global_index': 1, 'character_id': 'NARRATOR', 'character_name': "Narrator"},
+            {'global_index': 2, 'character_id': 'D', 'character_name': "Dorothea"},
+            {'global_index': 3, 'character_id': 'C', 'character_name': "Celia"},
+            {'global_index': 4, 'character_id': 'D', 'character_name': "Dorothea"},
+        ]
+        pipeline.start_character_profiling(blocks)
+        for block in blocks:
+            pipeline.ensure_character_voice(block)
+
+        assert sorted(profiled) == ['C', 'D']
+        assert set(generator.character_voices) == {'C', 'D'}
+        assert generator.character_voices['D'] in generator.female_voices
+        assert generator.character_descriptions['C'] == "Celia, briefly"
+
+        new_characters = pipeline.take_new_characters()
+        assert set(new_characters['character_voices']) == {'C', 'D'}
+        assert pipeline.take_new_characters() is None
+        print("Character profiling test passed")
+
+if __name__ == "__main__":
+    test_character_profiling()
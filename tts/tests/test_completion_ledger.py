@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from completion_ledger import CompletionLedger
+
+def test_completion_ledger():
+    """Split blocks are done only once every part exists; the ledger survives a reload."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        source_file = os.path.join(output_dir, "book1.xml")
+        with open(source_file, 'w') as f:
+            f.write("<book/>")
+
+        blocks = [{'global_index': i, 'chapter_number': 1 if i < 3 else 2} for i in (1, 2, 3, 5, 6)]
+        path = os.path.join(output_dir, "book_1_multi_voice_ledger.json")
+        ledger = CompletionLedger.create(path, 1, "multi_voice", blocks, {5: 2}, CompletionLedger.fingerprint(source_file))
+        assert ledger.expected_files == 6
+
+        ledger.mark_results([{'global_index': 1}, {'global_index': 2}, {'global_index': 5, 'chunk_index': 1}])
+        assert ledger.done_blocks == 2
+        ledger.mark_results([{'global_index': 5, 'chunk_index': 1}, {'global_index': 5, 'chunk_index': 2}])
+        assert ledger.done_blocks == 3
+        ledger.save()
+
+        reloaded = CompletionLedger.load(path)
+        assert reloaded.block_ids == [1, 2, 3, 5, 6]
+        assert reloaded.chapter_progress() == [(1, 2, 2), (2, 1, 3)]
+        assert reloaded.matches_source(CompletionLedger.fingerprint(source_file))
+        assert not reloaded.is_complete()
+
+        reloaded.mark_done([3, 6])
+        assert reloaded.is_complete()
+
+        # Results from a snapshot replace the bitmap
+        reloaded.reset_from_results([{'global_index': 1}])
+        assert reloaded.done_blocks == 1
+
+        with open(source_file, 'a') as f:
+            f.write("<!-- edited -->")
+        assert not reloaded.matches_source(CompletionLedger.fingerprint(source_file))
+        print("Completion ledger test passed")
+
+if __name__ == "__main__":
+    test_completion_ledger()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_loader import load_config
+
+def test_config_loader():
+    """The config is parsed once, reloaded when it changes, and invalid settings are dropped."""
+    with tempfile.TemporaryDirectory() as config_dir:
+        config_file = os.path.join(config_dir, "config.json")
+        with open(config_file, 'w') as f:
+            json.dump({"active_book": "Romola", "queue": 5, "books": {"Romola": {"path": "r.xml"}, "Bad": "x"}}, f)
+
+        config = load_config(config_file)
+        assert load_config(config_file) is config
+        assert config["active_book"] == "Romola"
+        assert "queue" not in config
+        assert list(config["books"]) == ["Romola"]
+
+        with open(config_file, 'w') as f:
+            json.dump({"active_book": "Middlemarch", "queue": {"batch_size": 2}}, f)
+        os.utime(config_file, ns=(0, os.stat(config_file).st_mtime_ns + 1))
+        config = load_config(config_file)
+        assert config["active_book"] == "Middlemarch"
+        assert config["queue"]["batch_size"] == 2
+
+        # Post-processing can't rewrite packed clips, so it is refused with the archive backend
+        with open(config_file, 'w') as f:
+            json.dump({"postprocessing": {"enabled": True}, "storage": {"backend": "archive"}}, f)
+        os.utime(config_file, ns=(0, os.stat(config_file).st_mtime_ns + 2))
+        config = load_config(config_file)
+        assert "postprocessing" not in config
+        assert config["storage"]["backend"] == "archive"
+
+        assert load_config(os.path.join(config_dir, "missing.json")) == {}
+    print("Config loader test passed")
+
+if __name__ == "__main__":
+    test_config_loader()
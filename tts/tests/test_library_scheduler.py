@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_pipeline import TTSPipeline
+from library_scheduler import LibraryScheduler
+
+def test_shared_executor():
+    """Blocks run concurrently on the shared pool without exceeding the request budget."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = TTSPipeline(api_key="test", output_dir=output_dir)
+        budget = threading.BoundedSemaphore(2)
+        state = {'active': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def generate_speech_for_block(block, mode):
+            with pipeline.audio_generator.request_budget:
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                time.sleep(0.01)
+                with lock:
+                    state['active'] -= 1
+            return {'global_index': block['global_index']}
+
+        pipeline.audio_generator.generate_speech_for_block = generate_speech_for_block
+        blocks = [{'global_index': i, 'chapter_number': 1, 'character_id': 'NARRATOR'} for i in range(20)]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            pipeline.use_shared_executor(executor, budget, max_in_flight=4)
+            generated = list(pipeline.generate_blocks(blocks, "multi_voice"))
+
+        assert sorted(result['global_index'] for _, result in generated) == list(range(20))
+        assert all(block['global_index'] == result['global_index'] for block, result in generated)
+        assert state['peak'] == 2
+        print("Shared executor test passed")
+
+def test_books_of_one_series():
+    """Two books of a series run at once: shared voices, but each journals its own characters and keeps its own metrics."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        first = TTSPipeline(api_key="test", output_dir=output_dir, book_name="Middlemarch")
+        second = TTSPipeline(api_key="test", output_dir=output_dir, book_name="Middlemarch")
+        second.share_characters(first)
+        generator = first.audio_generator
+        assert second.audio_generator is generator
+        generator.character_voices.clear()
+        generator.determine_character_gender = lambda char_name, char_id: "female"
+        generator.generate_character_description = lambda char_name, char_id: f"{char_name}, briefly"
+        # Both books' first speakers have voices before either book checkpoints
+        both_started = threading.Barrier(2)
+
+        def generate_speech_for_block(block, mode):
+            if block['global_index'] == 1:
+                both_started.wait(timeout=5)
+            generator.metrics.increment("tts_requests")
+            return {'global_index': block['global_index'], 'chapter_number': 1, 'character_id': block['character_id'],
+                    'filename': f"{block['global_index']:04d}_{block['character_id']}_{block['book_number']}.mp3",
+                    'text': block['text']}
+
+        generator.generate_speech_for_block = generate_speech_for_block
+        speakers = {1: ('D', "Dorothea"), 2: ('L', "Lydgate")}
+        errors = []
+
+        def run_book(pipeline, book_number):
+            char_id, char_name = speakers[book_number]
+            blocks = [{'global_index': i, 'book_number': book_number, 'chapter_number': 1, 'content_type': 'dialogue',
+                       'character_id': char_id, 'character_name': char_name, 'text': f"Line {i}"} for i in range(1, 4)]
+            try:
+                pipeline.synthesize_blocks(book_number, "multi_voice", blocks, [])
+            except Exception as e:
+                errors.append(e)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            budget = threading.BoundedSemaphore(4)
+            first.use_shared_executor(executor, budget, max_in_flight=2)
+            second.use_shared_executor(executor, budget, max_in_flight=2)
+            threads = [threading.Thread(target=run_book, args=(first, 1)), threading.Thread(target=run_book, args=(second, 2))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert not errors
+
+        assert set(generator.character_voices) == {'D', 'L'}
+        for pipeline, book_number in ((first, 1), (second, 2)):
+            journaled = set()
+            for entry in pipeline.progress_manager.read_journal(book_number, "multi_voice"):
+                if entry['type'] == 'characters':
+                    journaled.update(entry['data']['character_voices'])
+            assert journaled == {speakers[book_number][0]}
+            counters = pipeline.metrics.snapshot()['counters']
+            assert counters['blocks_synthesized'] == 3 and counters['tts_requests'] == 3
+
+        assert LibraryScheduler.book_output_path("out/pipeline_metrics.prom", "Middle March", 2) == "out/pipeline_metrics_Middle_March_2.prom"
+        assert LibraryScheduler.book_output_path(None, "Romola", 2411) is None
+        print("Books of one series test passed")
+
+if __name__ == "__main__":
+    test_shared_executor()
+    test_books_of_one_series()
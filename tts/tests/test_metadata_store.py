@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metadata_store import MetadataStore
+from progress_manager import ProgressManager
+from resume_index import ResumeIndex
+
+def test_metadata_store():
+    """Blocks, audio files and characters round-trip; resume rows match the decoded results."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        db_path = os.path.join(output_dir, "progress.db")
+        store = MetadataStore(db_path)
+
+        blocks = [
+            {'global_index': 1, 'chapter_number': 1, 'character_id': 'narrator', 'content_type': 'narration', 'text': 'It was evening.'},
+            {'global_index': 2, 'chapter_number': 1, 'character_id': 'A', 'content_type': 'dialogue', 'text': '"Come in," she said.'},
+            {'global_index': 3, 'chapter_number': 2, 'character_id': 'narrator', 'content_type': 'narration', 'text': 'Morning came.'},
+        ]
+        store.record_blocks(1, "multi_voice", blocks)
+        assert store.count_blocks(1, "multi_voice") == 3
+        assert not store.has_book(1, "multi_voice")
+
+        audio_files = [
+            {'global_index': 1, 'chunk_index': 0, 'chapter_number': 1, 'filename': '0001_narrator_aaaa.mp3',
+             'file_path': os.path.join(output_dir, 'book_01', 'chapter_01', '0001_narrator_aaaa.mp3'),
+             'block_hash': 'aaaa', 'character_id': 'narrator', 'content_type': 'narration',
+             'text': 'It was evening.', 'duration_ms': 1200},
+            {'global_index': 3, 'chunk_index': 1, 'chapter_number': 2, 'filename': '0003_narrator_part01_bbbb.mp3',
+             'file_path': os.path.join(output_dir, 'book_01', 'chapter_02', '0003_narrator_part01_bbbb.mp3'),
+             'is_split': True, 'total_chunks': 2, 'original_text_length': 5000,
+             'character_id': 'narrator', 'content_type': 'narration', 'text': 'Morning came.'},
+        ]
+        store.add_audio_files(1, "multi_voice", audio_files)
+        store.save_characters(1, "multi_voice", {'A': 'nova'}, {'A': 'A widow'}, {'A': 'female'})
+
+        assert store.has_book(1, "multi_voice")
+        assert store.count_audio_files(1, "multi_voice") == 2
+        assert store.count_completed_blocks(1, "multi_voice") == 2
+        assert store.counts_by(1, "multi_voice", 'chapter_number') == {1: 1, 2: 1}
+
+        progress = store.load_progress(1, "multi_voice")
+        assert progress['audio_files'] == audio_files
+        assert progress['character_voices'] == {'A': 'nova'}
+
+        # Resume rows carry only what the resume index needs, without fields the row lacks
+        rows = {row['global_index']: row for row in store.resume_rows(1, "multi_voice")}
+        assert rows[1]['block_hash'] == 'aaaa' and 'is_split' not in rows[1]
+        assert rows[3]['total_chunks'] == 2 and rows[3]['is_split']
+        from_rows = ResumeIndex(output_dir, 1).build(list(rows.values()))
+        from_results = ResumeIndex(output_dir, 1).build(audio_files)
+        assert from_rows.blocks == from_results.blocks
+
+        # A read-only store sees the data but cannot change it
+        reader = MetadataStore(db_path, read_only=True)
+        assert reader.count_audio_files(1, "multi_voice") == 2
+        try:
+            reader.add_audio_files(1, "multi_voice", audio_files)
+            assert False, "read-only store accepted a write"
+        except sqlite3.OperationalError:
+            pass
+
+    print("✓ Metadata store test passed")
+
+def test_concurrent_writers():
+    """A snapshot replaces only its own blocks' results and those it drops, never another writer's."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        writer_a = ProgressManager(output_dir=output_dir, backend="sqlite")
+        writer_b = ProgressManager(output_dir=output_dir, backend="sqlite")
+
+        def result(global_index, block_hash):
+            return {'global_index': global_index, 'chapter_number': 1, 'character_id': 'NARRATOR',
+                    'filename': f"{global_index:04d}_NARRATOR_{block_hash}.mp3", 'text': f"Block {global_index}"}
+
+        writer_a.append_results(1, "multi_voice", [result(1, 'aaaa'), result(2, 'bbbb'), result(3, 'cccc')])
+        writer_b.append_results(1, "multi_voice", [result(10, 'dddd')])
+        # A regenerated block 2 (new file name) and dropped block 3 to regenerate it later
+        writer_a.save_progress(1, "multi_voice", {}, {}, {}, [result(1, 'aaaa'), result(2, 'eeee')], dropped={3})
+
+        progress = writer_b.load_existing_progress(1, "multi_voice")
+        assert [(audio_file['global_index'], audio_file['filename'][-8:-4]) for audio_file in progress['audio_files']] == [
+            (1, 'aaaa'), (2, 'eeee'), (10, 'dddd')
+        ]
+        with open(writer_a.metadata_path(1, "multi_voice")) as f:
+            assert len(json.load(f)['audio_files']) == 3
+    print("✓ Concurrent writers test passed")
+
+if __name__ == "__main__":
+    test_metadata_store()
+    test_concurrent_writers()
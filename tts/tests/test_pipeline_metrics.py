@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline_metrics import PipelineMetrics
+
+def test_pipeline_metrics():
+    """Stage timers fill histogram buckets, counters add up, and both export formats carry them."""
+    metrics = PipelineMetrics()
+    metrics.increment("blocks_synthesized")
+    metrics.increment("blocks_synthesized", 2)
+    metrics.increment("blocks_failed")
+
+    with metrics.time_stage("tts_request"):
+        pass
+    metrics.observe("tts_request", 0.3)
+    metrics.observe("checkpoint", 120.0)
+    # A failing stage is still timed
+    try:
+        with metrics.time_stage("file_write"):
+            raise OSError("disk full")
+    except OSError:
+        pass
+    metrics.record_audio_written()
+    first_audio = metrics.first_audio_seconds
+    metrics.record_audio_written()
+    assert metrics.first_audio_seconds == first_audio
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'blocks_synthesized': 3, 'blocks_failed': 1}
+    tts_request = snapshot['stages']['tts_request']
+    assert tts_request['count'] == 2
+    assert tts_request['buckets']['0.005'] == 1 and tts_request['buckets']['0.25'] == 1
+    assert tts_request['buckets']['0.5'] == 2 and tts_request['buckets']['60.0'] == 2
+    # Slower than the largest bucket: only counted by +Inf
+    assert snapshot['stages']['checkpoint']['buckets']['60.0'] == 0
+    assert snapshot['stages']['file_write']['count'] == 1
+
+    prometheus = metrics.to_prometheus()
+    assert "tts_pipeline_blocks_synthesized_total 3" in prometheus
+    assert "# TYPE tts_pipeline_stage_seconds histogram" in prometheus
+    assert 'tts_pipeline_stage_seconds_bucket{stage="tts_request",le="0.25"} 1' in prometheus
+    assert 'tts_pipeline_stage_seconds_bucket{stage="checkpoint",le="+Inf"} 1' in prometheus
+    assert 'tts_pipeline_stage_seconds_count{stage="tts_request"} 2' in prometheus
+    assert "tts_pipeline_time_to_first_audio_seconds" in prometheus
+    assert metrics.summary().splitlines()[0].startswith("  checkpoint: 1 calls, 120.0s total")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        json_path = os.path.join(output_dir, "metrics.json")
+        prom_path = os.path.join(output_dir, "metrics.prom")
+        metrics.export(json_path)
+        metrics.export(prom_path)
+        with open(json_path) as f:
+            exported = json.load(f)
+        assert exported['counters'] == snapshot['counters']
+        assert exported['stages']['checkpoint']['sum_seconds'] == 120.0
+        with open(prom_path) as f:
+            assert "tts_pipeline_blocks_failed_total 1" in f.read()
+        assert sorted(os.listdir(output_dir)) == ["metrics.json", "metrics.prom"]
+    print("Pipeline metrics test passed")
+
+if __name__ == "__main__":
+    test_pipeline_metrics()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import subprocess
+import tempfile
+import wave
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import playback_engine
+from playback_engine import PlaybackEngine, NullSink, WaveFileSink, PipeSink
+from audio_player import AudioBookPlayer
+
+def test_playback_engine():
+    """Clips stream back to back through a small ring buffer into one sink."""
+    pcm = {f"clip{i}.mp3": bytes([i]) * (1000 + 38 * i) for i in range(1, 8)}
+
+    def decode(file_path, sample_rate):
+        if file_path == "broken.mp3":
+            raise ValueError("not audio")
+        return pcm[file_path]
+
+    clips = [{'file_path': name} for name in pcm]
+    clips.insert(3, {'file_path': "broken.mp3"})
+
+    class RecordingSink(NullSink):
+        def __init__(self):
+            super().__init__()
+            self.data = bytearray()
+
+        def write(self, data):
+            super().write(data)
+            self.data += data
+
+    sink = RecordingSink()
+    # A ring of 0.01s (480 bytes) is smaller than any clip, so it wraps many times
+    engine = PlaybackEngine(sink, decode=decode, buffer_seconds=0.01, chunk_ms=5)
+    started = []
+    played = engine.play(clips, on_clip=lambda clip: started.append(clip['file_path']))
+
+    expected = b"".join(pcm.values())
+    assert played == len(expected) == sink.bytes_written
+    assert bytes(sink.data) == expected
+    assert started == list(pcm)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        wav_path = os.path.join(output_dir, "chapter.wav")
+        engine = PlaybackEngine(WaveFileSink(wav_path), decode=decode)
+        engine.play(clips)
+        engine.close()
+        with wave.open(wav_path, 'rb') as f:
+            assert f.getnframes() == len(expected) // 2
+    print("Playback engine test passed")
+
+def test_player_exit():
+    """A player process that exits stops playback cleanly, and a missing player is reported once."""
+    sink = PipeSink.__new__(PipeSink)
+    sink.process = subprocess.Popen([sys.executable, "-c", "import sys; sys.stdin.buffer.read(1000)"],
+                                    stdin=subprocess.PIPE)
+    clips = [{'file_path': f"clip{i}.mp3"} for i in range(20)]
+    engine = PlaybackEngine(sink, decode=lambda file_path, sample_rate: bytes(48000), chunk_ms=50)
+    started = []
+    played = engine.play(clips, on_clip=lambda clip: started.append(clip))
+    assert engine.sink_closed and played < 20 * 48000 and len(started) < 20
+    engine.close()
+
+    attempts = []
+    def unavailable_sink():
+        attempts.append(1)
+        raise RuntimeError("No audio output found")
+    original_sink = playback_engine.PipeSink
+    playback_engine.PipeSink = unavailable_sink
+    try:
+        player = AudioBookPlayer()
+        assert player.get_engine() is None and player.get_engine() is None
+        assert len(attempts) == 1
+    finally:
+        playback_engine.PipeSink = original_sink
+    print("Player exit test passed")
+
+if __name__ == "__main__":
+    test_playback_engine()
+    test_player_exit()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import gzip
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from player_publisher import PlayerPublisher
+
+def test_player_publisher():
+    """Books are published as a table of contents plus compressed chapter shards, and the manifest points at them."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_dir = os.path.join(temp_dir, "audio_output")
+        os.makedirs(output_dir)
+        audio_files = [
+            {'global_index': 2, 'chapter_number': 1, 'book_number': 1, 'filename': '0002_C_b.mp3',
+             'character_id': 'C', 'character_name': 'Celia', 'content_type': 'dialogue',
+             'text': 'Dorothea, dear, suppose we looked at mamma’s jewels to-day? ' * 2,
+             'instructions': 'Speak gently', 'duration_ms': 3000, 'offset_ms': 1000},
+            {'global_index': 1, 'chapter_number': 1, 'book_number': 1, 'filename': '0001_NARRATOR_a.mp3',
+             'character_id': 'NARRATOR', 'character_name': 'Narrator', 'content_type': 'narration',
+             'text': 'Miss Brooke had that kind of beauty.', 'duration_ms': 1000, 'offset_ms': 0},
+            {'global_index': 3, 'chapter_number': 2, 'book_number': 1, 'filename': '0003_NARRATOR_c.mp3',
+             'character_id': 'NARRATOR', 'character_name': 'Narrator', 'content_type': 'chapter_title',
+             'text': 'Chapter II', 'duration_ms': 500, 'offset_ms': 4000},
+        ]
+        with open(os.path.join(output_dir, "book_1_multi_voice_metadata.json"), 'w') as f:
+            json.dump({'book': 1, 'mode': 'multi_voice', 'audio_files': audio_files}, f)
+
+        publisher = PlayerPublisher(output_dir=output_dir)
+        assert publisher.publish_book(2) is None
+        index_path = publisher.publish_book(1)
+        assert index_path == publisher.publish_dir / "book_1" / "index.json"
+
+        index = json.loads(index_path.read_text())
+        assert index['total_tracks'] == 3 and index['total_duration_ms'] == 4500
+        assert index['chapters'] == [
+            {'chapter': 1, 'tracks': 2, 'shard': 'chapter_01.json', 'offset_ms': 0, 'duration_ms': 4000},
+            {'chapter': 2, 'tracks': 1, 'shard': 'chapter_02.json', 'offset_ms': 4000, 'duration_ms': 500},
+        ]
+
+        # Shards are in playback order and hold only what the player shows
+        shard_path = index_path.parent / "chapter_01.json"
+        shard = json.loads(shard_path.read_text())
+        assert [track['file'] for track in shard['tracks']] == [
+            'audio_output/book_01/chapter_01/0001_NARRATOR_a.mp3', 'audio_output/book_01/chapter_01/0002_C_b.mp3'
+        ]
+        assert shard['tracks'][1]['title'].endswith('...') and len(shard['tracks'][1]['title']) == 63
+        assert 'instructions' not in shard['tracks'][1]
+        assert gzip.decompress((index_path.parent / "chapter_01.json.gz").read_bytes()) == shard_path.read_bytes()
+
+        # Only the published books' manifest entries gain an index URL
+        manifest_file = os.path.join(temp_dir, "manifest.json")
+        base_url = "https://cdn.example.com/audio_output/"
+        with open(manifest_file, 'w') as f:
+            json.dump({'stories': {'middlemarch': {'books': [
+                {'id': 'book1', 'path': base_url + "book_1_multi_voice_metadata.json"},
+                {'id': 'book2', 'path': base_url + "book_2_multi_voice_metadata.json"},
+            ]}}}, f)
+        publisher.update_manifest(manifest_file, [1])
+        with open(manifest_file) as f:
+            books = json.load(f)['stories']['middlemarch']['books']
+        assert books[0]['index'] == base_url + "player/book_1/index.json"
+        assert 'index' not in books[1]
+
+    print("Player publisher test passed")
+
+if __name__ == "__main__":
+    test_player_publisher()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import audio_postprocessor
+from audio_postprocessor import AudioPostProcessor, find_speech_bounds, measure_loudness, apply_gain
+
+def test_silence_trimming():
+    """Speech surrounded by silence should be trimmed down to the speech plus padding."""
+    sample_rate = 24000
+    silence = np.zeros(sample_rate // 2, dtype=np.int16)  # 500ms
+    t = np.arange(sample_rate) / sample_rate
+    tone = (0.3 * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)  # 1s
+    samples = np.concatenate([silence, tone, silence])
+
+    start, end = find_speech_bounds(samples, sample_rate, threshold_db=-45.0, padding_ms=40)
+    padding = int(sample_rate * 0.04)
+
+    print(f"Speech bounds: {start}-{end} of {len(samples)} samples")
+    assert abs(start - (len(silence) - padding)) <= 240
+    assert abs(end - (len(silence) + len(tone) + padding)) <= 240
+
+    # A clip that is entirely silent is left untouched
+    assert find_speech_bounds(silence, sample_rate) == (0, len(silence))
+
+def test_loudness_normalization():
+    """Quiet and loud clips should both be brought to the target level."""
+    processor = AudioPostProcessor(target_dbfs=-20.0, max_gain_db=12.0, workers=1)
+    t = np.arange(24000) / 24000
+    quiet = (0.05 * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+    loud = (0.5 * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+
+    for clip in (quiet, loud):
+        gain = processor.compute_gain(measure_loudness(clip))
+        leveled = apply_gain(clip, gain)
+        print(f"Level {measure_loudness(clip):.1f} dBFS -> {measure_loudness(leveled):.1f} dBFS (gain {gain:.1f} dB)")
+        assert abs(measure_loudness(leveled) - (-20.0)) < 0.5
+
+    # Gain is capped so near-silent clips are not boosted into noise
+    assert processor.compute_gain(-80.0) == 12.0
+
+def test_partial_chapter_failure():
+    """Clips are marked as they finish, so a failed clip doesn't leave its chapter's rewritten clips unmarked."""
+    processor = AudioPostProcessor(workers=1)
+    analyze_clip, render_clip = audio_postprocessor.analyze_clip, audio_postprocessor.render_clip
+
+    def fake_analyze(file_path, sample_rate, threshold_db, padding_ms):
+        return {'file_path': file_path, 'start': 2400, 'end': 26400, 'total_samples': 28800, 'loudness_dbfs': -26.0}
+
+    def fake_render(file_path, start, end, gain_db, sample_rate, bitrate):
+        if file_path.endswith("2.mp3"):
+            raise RuntimeError("ffmpeg failed")
+        return file_path
+
+    audio_postprocessor.analyze_clip, audio_postprocessor.render_clip = fake_analyze, fake_render
+    try:
+        with tempfile.TemporaryDirectory() as output_dir, ThreadPoolExecutor(max_workers=2) as executor:
+            audio_files = []
+            for i in range(1, 4):
+                file_path = os.path.join(output_dir, f"{i}.mp3")
+                open(file_path, 'wb').close()
+                audio_files.append({'file_path': file_path, 'chapter_number': 1})
+
+            saved = []
+            processed = processor.process_chapter(audio_files, executor, on_clip=saved.append)
+            assert sorted(audio_file['file_path'] for audio_file in saved) == [audio_files[0]['file_path'], audio_files[2]['file_path']]
+            assert len(processed) == 2
+            assert audio_files[0]['postprocessed'] and audio_files[0]['trimmed_leading_ms'] == 100
+            assert audio_files[0]['gain_db'] == 6.0
+            assert 'postprocessed' not in audio_files[1]
+
+            # The next run only retries the clip that failed
+            saved.clear()
+            processor.process_chapter(audio_files, executor, on_clip=saved.append)
+            assert saved == []
+            audio_postprocessor.render_clip = lambda *args: args[0]
+            processor.process_chapter(audio_files, executor, on_clip=saved.append)
+            assert saved == [audio_files[1]]
+    finally:
+        audio_postprocessor.analyze_clip, audio_postprocessor.render_clip = analyze_clip, render_clip
+
+if __name__ == "__main__":
+    test_silence_trimming()
+    test_loudness_normalization()
+    test_partial_chapter_failure()
+    print("\nPost-processing tests completed!")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress_manager import ProgressManager
+
+def make_result(global_index):
+    return {
+        'global_index': global_index,
+        'chapter_number': 1,
+        'character_id': 'NARRATOR',
+        'content_type': 'narrative',
+        'filename': f"{global_index:04d}_B01C01_NARRATOR_narrative_abcd1234.mp3",
+        'text': f"Block {global_index}"
+    }
+
+def test_journal_replay():
+    """Journaled results are replayed on top of the snapshot and survive a torn write."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        manager = ProgressManager(output_dir=output_dir)
+
+        manager.save_progress(1, "multi_voice", {'D': 'nova'}, {}, {'D': 'female'}, [make_result(1), make_result(2)])
+        manager.append_results(1, "multi_voice", [make_result(4), make_result(3)])
+
+        # Simulate a crash in the middle of writing the next batch
+        with open(manager.journal_path(1, "multi_voice"), 'a') as f:
+            f.write('{"type": "audio_file", "da')
+
+        # Resuming after the crash: the writer repairs the journal
+        progress = manager.load_existing_progress(1, "multi_voice", repair=True)
+        indices = [result['global_index'] for result in progress['audio_files']]
+        print(f"Replayed indices: {indices}")
+        assert indices == [1, 2, 3, 4]
+        assert progress['character_voices'] == {'D': 'nova'}
+
+        # The torn entry is dropped so new appends are readable
+        manager.append_results(1, "multi_voice", [make_result(5)])
+        progress = manager.load_existing_progress(1, "multi_voice")
+        assert [result['global_index'] for result in progress['audio_files']] == [1, 2, 3, 4, 5]
+
+        # Compaction folds the journal into the snapshot
+        manager.save_progress(1, "multi_voice", {'D': 'nova'}, {}, {'D': 'female'}, progress['audio_files'])
+        assert not manager.journal_path(1, "multi_voice").exists()
+        assert len(manager.load_existing_progress(1, "multi_voice")['audio_files']) == 5
+
+def test_reader_during_append():
+    """A reader that sees a half-written line skips it and leaves it for the writer to finish."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        writer = ProgressManager(output_dir=output_dir)
+        reader = ProgressManager(output_dir=output_dir)
+        writer.append_results(1, "multi_voice", [make_result(1)])
+
+        line = '{"type": "audio_file", "data": %s}\n' % json.dumps(make_result(2))
+        journal_file = writer.journal_path(1, "multi_voice")
+        with open(journal_file, 'a') as f:
+            f.write(line[:20])
+            f.flush()
+            size = journal_file.stat().st_size
+
+            progress = reader.load_existing_progress(1, "multi_voice")
+            assert [result['global_index'] for result in progress['audio_files']] == [1]
+            assert journal_file.stat().st_size == size
+
+            f.write(line[20:])
+        writer.append_results(1, "multi_voice", [make_result(3), make_result(4)])
+
+        progress = reader.load_existing_progress(1, "multi_voice")
+        assert [result['global_index'] for result in progress['audio_files']] == [1, 2, 3, 4]
+
+if __name__ == "__main__":
+    test_journal_replay()
+    test_reader_during_append()
+    print("\nProgress journal test completed!")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_pipeline import TTSPipeline
+
+def test_pronunciation_invalidation():
+    """Only blocks containing a changed override entry are selected for re-synthesis."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline = TTSPipeline(api_key="test", output_dir=output_dir)
+        generator = pipeline.audio_generator
+        generator.pronunciation_overrides = {
+            'pronunciations': {'Casaubon': 'ka-SAW-bon'},
+            'replacements': {'Mr.': 'Mister'}
+        }
+        assert generator.overrides_for("Mr. Casaubon's letter") == {
+            'replacements': {'Mr.': 'Mister'}, 'pronunciations': {'Casaubon': 'ka-SAW-bon'}
+        }
+
+        results = []
+        for global_index, text in enumerate(["Mr. Casaubon's letter came.", "Dorothea read it.",
+                                             "Tito smiled.", "Casaubon sighed."], start=1):
+            result = {'global_index': global_index, 'chapter_number': 1, 'character_id': 'NARRATOR',
+                      'character_name': 'Narrator', 'text': text, 'file_path': f"{global_index}.mp3"}
+            overrides = generator.overrides_for(text)
+            if overrides:
+                result['overrides'] = overrides
+            results.append(result)
+        with open(os.path.join(output_dir, "book_1_multi_voice_metadata.json"), 'w') as f:
+            json.dump({'book': 1, 'mode': 'multi_voice', 'audio_files': results}, f)
+
+        # An entry that matches no clip is not a change, and clips without recorded
+        # overrides (made before they were tracked) are taken as current without a baseline
+        generator.pronunciation_overrides['pronunciations']['Tito'] = 'tee-toh'
+        assert pipeline.changed_override_keys(results, None) == set()
+        legacy = [dict(result) for result in results]
+        for result in legacy:
+            result.pop('overrides', None)
+        assert pipeline.stale_pronunciation_blocks(1, 'multi_voice', legacy) == set()
+        pipeline.progress_manager.save_override_baseline(1, 'multi_voice', json.loads(json.dumps(generator.pronunciation_overrides)))
+        assert pipeline.stale_pronunciation_blocks(1, 'multi_voice', results) == set()
+
+        generator.pronunciation_overrides['pronunciations']['Casaubon'] = 'kuh-ZAW-bun'
+        assert pipeline.stale_pronunciation_blocks(1, 'multi_voice', results) == {1, 4}
+        # Against the baseline, legacy clips saying the word are stale too
+        assert pipeline.stale_pronunciation_blocks(1, 'multi_voice', legacy) == {1, 4}
+
+        # Entries added since the baseline count; removed ones too
+        generator.pronunciation_overrides['pronunciations'] = {'Tito': 'tee-toh', 'Dorothea': 'DOR-o-thee-a'}
+        assert pipeline.changed_override_keys(results, pipeline.progress_manager.load_override_baseline(1, 'multi_voice')) == {'Casaubon', 'Dorothea'}
+        assert pipeline.stale_pronunciation_blocks(1, 'multi_voice', results) == {1, 2, 4}
+        assert pipeline.stale_pronunciation_blocks(2, 'multi_voice', results) == set()
+
+        # Replacements match inside words too, where the word index can't see them
+        generator.pronunciation_overrides = {'pronunciations': {}, 'replacements': {'Mr.': 'Mister', 'eau': 'oh'}}
+        results = [{'global_index': global_index, 'chapter_number': 1, 'character_id': 'NARRATOR', 'character_name': 'Narrator',
+                    'text': text, 'file_path': f"{global_index}.mp3", 'overrides': generator.overrides_for(text)}
+                   for global_index, text in enumerate(["Mr. Beaumont bowed.", "Mr. Brooke left."], start=1)]
+        pipeline.progress_manager.save_override_baseline(1, 'multi_voice', json.loads(json.dumps(generator.pronunciation_overrides)))
+        generator.pronunciation_overrides['replacements']['eau'] = 'oe'
+        assert pipeline.stale_pronunciation_blocks(1, 'multi_voice', results) == {1}
+        print("Pronunciation invalidation test passed")
+
+if __name__ == "__main__":
+    test_pronunciation_invalidation()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resume_index import ResumeIndex
+
+def test_resume_index():
+    """Blocks are complete only when every part is on disk; split blocks count once."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        chapter_dir = Path(output_dir) / "book_01" / "chapter_01"
+        chapter_dir.mkdir(parents=True)
+
+        short_block = {'global_index': 1, 'chapter_number': 1, 'text': "A short block."}
+        long_block = {'global_index': 2, 'chapter_number': 1, 'text': "A long block. " * 400}
+        short_hash = ResumeIndex.text_hash(short_block['text'])
+        long_hash = ResumeIndex.text_hash(long_block['text'])
+
+        results = [
+            {'global_index': 1, 'chapter_number': 1, 'block_hash': short_hash, 'is_split': False,
+             'filename': f"0001_B01C01_NARRATOR_narrative_{short_hash}.mp3"},
+            {'global_index': 2, 'chapter_number': 1, 'block_hash': long_hash, 'is_split': True, 'total_chunks': 2,
+             'filename': "0002_B01C01_NARRATOR_narrative_part01_aaaaaaaa.mp3"},
+            {'global_index': 2, 'chapter_number': 1, 'block_hash': long_hash, 'is_split': True, 'total_chunks': 2,
+             'filename': "0002_B01C01_NARRATOR_narrative_part02_bbbbbbbb.mp3"},
+        ]
+        for result in results:
+            (chapter_dir / result['filename']).write_bytes(b"audio")
+
+        index = ResumeIndex(output_dir, 1).build(results)
+        assert index.is_complete(short_block)
+        assert index.is_complete(long_block)
+
+        # Text changed since the audio was generated
+        assert not index.is_complete(dict(short_block, text="Different text."))
+
+        # One part of the split block is missing
+        (chapter_dir / results[2]['filename']).unlink()
+        index = ResumeIndex(output_dir, 1).build(results)
+        assert index.is_complete(short_block)
+        assert not index.is_complete(long_block)
+        print("Resume index test passed")
+
+if __name__ == "__main__":
+    test_resume_index()
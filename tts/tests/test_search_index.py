@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex, encode_postings, decode_postings, tokenize
+from metadata_store import MetadataStore
+
+def test_search_index():
+    """Phrases resolve to the clips containing them, filtered by speaker and book, and the index follows each book's changes."""
+    postings = {1: [0, 5, 300], 7: [2], 4000: [1, 100000]}
+    assert decode_postings(encode_postings(postings)) == postings
+    assert tokenize("Niccolò’s DEAR  uncle—") == ["niccolò", "s", "dear", "uncle"]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        def write_book(book_number, audio_files):
+            with open(os.path.join(output_dir, f"book_{book_number}_multi_voice_metadata.json"), 'w') as f:
+                json.dump({'book': book_number, 'mode': 'multi_voice', 'audio_files': audio_files}, f)
+
+        write_book(1, [
+            {'global_index': 1, 'chapter_number': 1, 'character_id': 'NARRATOR', 'character_name': 'Narrator',
+             'text': 'Miss Brooke had that kind of beauty.', 'offset_ms': 0},
+            {'global_index': 2, 'chapter_number': 1, 'character_id': 'C', 'character_name': 'Celia',
+             'text': 'Dorothea, dear, suppose we looked at mamma’s jewels to-day?', 'offset_ms': 4000},
+            {'global_index': 3, 'chapter_number': 2, 'character_id': 'D', 'character_name': 'Dorothea',
+             'text': "The jewels, mamma's, you may keep them.", 'offset_ms': 9000},
+        ])
+        index = SearchIndex(output_dir)
+        assert not index.is_current()
+        index.ensure_current()
+        assert index.is_current()
+
+        hits = index.search("mamma's jewels")
+        assert [(hit['book'], hit['global_index'], hit['offset_ms']) for hit in hits] == [(1, 2, 4000)]
+        assert [hit['global_index'] for hit in index.search("jewels")] == [2, 3]
+        assert [hit['global_index'] for hit in index.search("jewels", character="dorothea")] == [3]
+        assert index.search("dear jewels") == []
+        assert index.search("jewels", book=2) == []
+
+        write_book(2, [{'global_index': 1, 'chapter_number': 1, 'character_id': 'NARRATOR',
+                        'character_name': 'Narrator', 'text': 'The jewels were gone.'}])
+        assert not index.is_current()
+        index.ensure_current()
+        assert [(hit['book'], hit['global_index']) for hit in index.search("jewels")] == [(1, 2), (1, 3), (2, 1)]
+        assert index.search("jewels", book=2, limit=5)[0]['text'] == 'The jewels were gone.'
+        index.close()
+
+        # Processes sharing the index rebuild it one at a time; the one that waited finds it current
+        write_book(3, [{'global_index': 1, 'chapter_number': 1, 'character_id': 'NARRATOR',
+                        'character_name': 'Narrator', 'text': 'Romola waited.'}])
+        builds = []
+        threads = [threading.Thread(target=lambda: builds.append(SearchIndex(output_dir).build(if_stale=True)))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(builds, key=str) == [5, None]
+
+        # Only the changed book is re-indexed
+        index = SearchIndex(output_dir)
+        loaded = []
+        load_progress = index.load_progress
+        index.load_progress = lambda book_number: loaded.append(book_number) or load_progress(book_number)
+        write_book(2, [{'global_index': 1, 'chapter_number': 1, 'character_id': 'NARRATOR',
+                        'character_name': 'Narrator', 'text': 'The jewels were found.'}])
+        assert index.ensure_current() == [2] and loaded == [2]
+        assert [(hit['book'], hit['global_index']) for hit in index.search("jewels")] == [(1, 2), (1, 3), (2, 1)]
+        assert index.search("jewels", limit=1)[0]['book'] == 1
+        assert index.search("were found", book=2)[0]['text'] == 'The jewels were found.'
+        os.remove(os.path.join(output_dir, "book_3_multi_voice_metadata.json"))
+        assert index.ensure_current() == [3] and index.search("romola") == []
+
+        # Books only in the SQLite store are indexed, and rows appended to its WAL are noticed
+        store = MetadataStore(os.path.join(output_dir, "progress.db"))
+        store.add_audio_files(4, "multi_voice", [{'global_index': 1, 'chapter_number': 1, 'character_id': 'NARRATOR',
+                                                  'filename': '0001_NARRATOR_aaaa.mp3', 'text': 'Tito smiled.'}])
+        loaded.clear()
+        assert index.ensure_current() == [4] and loaded == [4]
+        store.add_audio_files(4, "multi_voice", [{'global_index': 2, 'chapter_number': 1, 'character_id': 'NARRATOR',
+                                                  'filename': '0002_NARRATOR_bbbb.mp3', 'text': 'Tito left Florence.'}])
+        assert os.path.getsize(os.path.join(output_dir, "progress.db-wal")) > 0
+        assert not index.is_current()
+        index.ensure_current()
+        assert [(hit['book'], hit['global_index']) for hit in index.search("tito")] == [(4, 1), (4, 2)]
+        index.close()
+    print("Search index test passed")
+
+if __name__ == "__main__":
+    test_search_index()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_player import SeekIndex, parse_timestamp
+
+def test_seek_index():
+    """Seeks by chapter, block, speaker and time resolve to clip positions."""
+    audio_files = []
+    for global_index in range(1, 201):
+        audio_files.append({
+            'global_index': global_index,
+            'chapter_number': (global_index - 1) // 50 + 1,
+            'character_id': 'D' if global_index % 7 == 0 else 'NARRATOR',
+            'duration_ms': 3000
+        })
+    # Block 120 was split into two clips, block 121 has none
+    audio_files.insert(120, dict(audio_files[119], chunk_index=2))
+    del audio_files[121]
+    index = SeekIndex(audio_files)
+
+    assert index.total_ms == 200 * 3000
+    assert index.resolve("chapter 3") == (100, 0)
+    assert index.resolve("chapter 9") is None
+    assert index.resolve("block 120") == (119, 0)
+    assert audio_files[index.resolve("block 121")[0]]['global_index'] == 122
+    assert index.resolve("character D") == (6, 0)
+    assert index.resolve("character D", current=6) == (13, 0)
+    assert index.resolve("0:05:01.5") == (100, 1500)
+    assert index.resolve("10:00:00") is None
+    assert parse_timestamp("1:02:03") == 3723000
+    assert parse_timestamp("chapter") is None
+
+    del audio_files[5]['duration_ms']
+    assert SeekIndex(audio_files).resolve("0:01:00") is None
+    print("Seek index test passed")
+
+if __name__ == "__main__":
+    test_seek_index()
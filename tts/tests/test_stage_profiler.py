@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tracemalloc
+from stage_profiler import StageProfiler
+
+class FakeExtractor:
+    def extract_all_content_blocks(self, count):
+        return self.group_continuous_blocks([str(i) * 100 for i in range(count)])
+
+    def group_continuous_blocks(self, blocks):
+        return list(blocks)
+
+def test_stage_profiler():
+    """Nested stages are recorded separately and a report is written per book."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        profiler = StageProfiler(output_dir=output_dir)
+        extractor = FakeExtractor()
+        profiler.wrap(extractor, 'extract_all_content_blocks')
+        profiler.wrap(extractor, 'group_continuous_blocks')
+
+        assert len(extractor.extract_all_content_blocks(1000)) == 1000
+        assert set(profiler.stats) == {'extract_all_content_blocks', 'group_continuous_blocks'}
+        assert profiler.stats['group_continuous_blocks']['calls'] == 1
+        assert profiler.stats['extract_all_content_blocks']['peak_bytes'] > 0
+
+        report_file = profiler.write_report(1)
+        report = report_file.read_text()
+        assert "Hotspots in extract_all_content_blocks" in report
+        assert "Hotspots in group_continuous_blocks" in report
+        assert profiler.stats == {}
+        tracemalloc.stop()
+        print("Stage profiler test passed")
+
+if __name__ == "__main__":
+    test_stage_profiler()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trace_recorder import TraceRecorder
+
+def test_trace_recorder():
+    """Nested spans are exported as complete ("X") trace events; a disabled recorder records nothing."""
+    disabled = TraceRecorder()
+    with disabled.span("block", "block", global_index=1):
+        pass
+    assert disabled.events == []
+
+    tracer = TraceRecorder(enabled=True)
+    tracer.name_thread("pipeline")
+    with tracer.span("block", "block", global_index=7):
+        with tracer.span("tts_request", "synthesis"):
+            pass
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        trace_file = os.path.join(output_dir, "trace.json")
+        tracer.export(trace_file)
+        with open(trace_file) as f:
+            events = json.load(f)['traceEvents']
+
+    spans = {event['name']: event for event in events if event['ph'] == 'X'}
+    assert set(spans) == {'block', 'tts_request'}
+    assert spans['block']['args'] == {'global_index': 7}
+    assert spans['block']['ts'] <= spans['tts_request']['ts']
+    assert spans['tts_request']['ts'] + spans['tts_request']['dur'] <= spans['block']['ts'] + spans['block']['dur'] + 1
+    assert any(event['ph'] == 'M' and event['args']['name'] == 'pipeline' for event in events)
+    print("Trace recorder test passed")
+
+if __name__ == "__main__":
+    test_trace_recorder()
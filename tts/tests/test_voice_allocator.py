@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+from collections import Counter
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice_allocator import VoiceAllocator
+
+MALE = ["echo", "fable", "onyx"]
+FEMALE = ["alloy", "nova", "shimmer", "coral"]
+
+def test_voice_allocator():
+    """Assignments are balanced, independent of discovery order and never move."""
+    genders = {f"M{i}": "male" for i in range(9)}
+    genders.update({f"F{i}": "female" for i in range(8)})
+    genders["X"] = "unknown"
+
+    first = VoiceAllocator(MALE, FEMALE)
+    first.allocate_all(genders)
+    reordered = VoiceAllocator(MALE, FEMALE)
+    reordered.allocate_all(dict(reversed(list(genders.items()))))
+    assert first.assignments == reordered.assignments
+
+    loads = Counter(first.assignments.values())
+    for pool in (MALE, FEMALE):
+        # No voice gets more than slack + 1 characters ahead of another
+        assert max(loads[voice] for voice in pool) - min(loads[voice] for voice in pool) <= 2
+    assert sum(loads[voice] for voice in MALE) == 9
+    assert first.assignments["X"] in FEMALE
+
+    # New characters leave existing assignments alone
+    before = dict(first.assignments)
+    assigned = first.allocate_all(dict(genders, NEW="male"))
+    assert list(assigned) == ["NEW"]
+    assert {char_id: voice for char_id, voice in first.assignments.items() if char_id != "NEW"} == before
+
+    # Pinned voices win over earlier assignments
+    first.pin("M0", "onyx")
+    assert first.allocate("M0", "male") == "onyx"
+    print("Voice allocator test passed")
+
+if __name__ == "__main__":
+    test_voice_allocator()
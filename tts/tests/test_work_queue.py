@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from work_queue import WorkQueue
+
+def test_work_queue():
+    """Leases expire, expired jobs go to other workers, and completion is idempotent."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        queue = WorkQueue(os.path.join(output_dir, "work_queue.db"), lease_seconds=0.2, max_attempts=2)
+        blocks = [{'global_index': i, 'chapter_number': 1, 'text': f"Block {i}."} for i in range(3)]
+        assert queue.enqueue("Middlemarch", 1, "multi_voice", blocks) == 3
+        assert queue.enqueue("Middlemarch", 1, "multi_voice", blocks) == 0
+
+        first = queue.lease("worker-a", limit=2)
+        assert [job['global_index'] for job in first] == [0, 1]
+        assert [job['global_index'] for job in queue.lease("worker-b", limit=2)] == [2]
+        assert queue.lease("worker-b") == []
+
+        # worker-a dies; its leases expire and worker-b picks them up
+        time.sleep(0.3)
+        queue.heartbeat("worker-b")
+        retried = queue.lease("worker-b", limit=5)
+        assert [job['global_index'] for job in retried] == [0, 1]
+
+        assert queue.complete(retried[0], "worker-b", [{'filename': "b.mp3"}])
+        assert not queue.complete(first[0], "worker-a", [{'filename': "a.mp3"}])
+        assert queue.completed_results(1, "multi_voice") == {0: [{'filename': "b.mp3"}]}
+
+        # Changed text puts a finished job back in the queue
+        blocks[0]['text'] = "Block 0, revised."
+        assert queue.enqueue("Middlemarch", 1, "multi_voice", blocks) == 1
+        assert queue.counts(1, "multi_voice").get('pending') == 1
+        assert not queue.is_drained(1, "multi_voice")
+        print("Work queue test passed")
+
+def test_collection_claim():
+    """Exactly one worker collects a drained book, and new work makes it collectable again."""
+    with tempfile.TemporaryDirectory() as output_dir:
+        db_path = os.path.join(output_dir, "work_queue.db")
+        queue = WorkQueue(db_path)
+        blocks = [{'global_index': i, 'chapter_number': 1, 'text': f"Block {i}."} for i in range(2)]
+        queue.enqueue("Middlemarch", 1, "multi_voice", blocks)
+        jobs = queue.lease("worker-a", limit=2)
+        assert not queue.claim_collection(1, "multi_voice", "worker-a")
+        for job in jobs:
+            queue.complete(job, "worker-a", [{'filename': f"{job['global_index']}.mp3"}])
+
+        # Workers finishing at the same moment, each with its own connection
+        claims = []
+        threads = [threading.Thread(target=lambda worker: claims.append(WorkQueue(db_path).claim_collection(1, "multi_voice", worker)),
+                                    args=(f"worker-{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(claims) == [False, False, False, True]
+
+        # A failed collection is released; changed text re-opens the book for collection
+        winner = queue.connection().execute("SELECT worker FROM collections").fetchone()[0]
+        assert queue.release_collection(1, "multi_voice", winner) == 1
+        assert queue.claim_collection(1, "multi_voice", "worker-a")
+        blocks[1]['text'] = "Block 1, revised."
+        queue.enqueue("Middlemarch", 1, "multi_voice", blocks)
+        job = queue.lease("worker-b")[0]
+        queue.complete(job, "worker-b", [{'filename': "1.mp3"}])
+        assert queue.claim_collection(1, "multi_voice", "worker-b")
+        print("Collection claim test passed")
+
+if __name__ == "__main__":
+    test_work_queue()
+    test_collection_claim()
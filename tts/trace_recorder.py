@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class TraceRecorder:
+    """
+    Records the lifecycle of each block as spans in the Chrome trace-event format.
+
+    The exported file can be opened in chrome://tracing or https://ui.perfetto.dev, where
+    every thread gets its own track. Spans are only kept as tuples while the run is going
+    and turned into trace events on export; a disabled recorder does nothing at all.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.events = []
+        self.thread_names = {}
+
+    @contextmanager
+    def span(self, name, category="pipeline", **args):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            # list.append is atomic, so worker threads can record without a lock
+            self.events.append((name, category, start, end, threading.get_ident(), args))
+
+    def name_thread(self, name):
+        """Label the calling thread's track in the trace viewer"""
+        if self.enabled:
+            self.thread_names[threading.get_ident()] = name
+
+    def trace_events(self):
+        events = []
+        for tid, name in self.thread_names.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}})
+
+        for name, category, start, end, tid, args in list(self.events):
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': round((start - self.origin) * 1e6, 1),
+                'dur': round((end - start) * 1e6, 1),
+                'pid': self.pid,
+                'tid': tid
+            }
+            if args:
+                event['args'] = args
+            events.append(event)
+        return events
+
+    def export(self, path):
+        """Write every span recorded so far as a trace-event JSON file"""
+        if not self.enabled:
+            return
+        path = Path(path)
+        # Books of a library export from their own threads, so every writer gets its own temp file
+        temp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error exporting trace: {e}")
@@ -1,14 +1,25 @@
-import os
 import hashlib
-from pathlib import Path
+import itertools
+import os
 import re
+import threading
 
-from content_extractor import ContentExtractor
-from audio_generator import AudioGenerator
+from config_loader import load_config
 from progress_manager import ProgressManager
+from block_scheduler import BlockScheduler
+from pipeline_metrics import PipelineMetrics
+from trace_recorder import TraceRecorder
+from completion_ledger import CompletionLedger
 
 
 class TTSPipeline:
+    # Results are journaled every CHECKPOINT_INTERVAL results and the journal is
+    # compacted into the metadata snapshot every COMPACTION_INTERVAL results
+    CHECKPOINT_INTERVAL = 10
+    COMPACTION_INTERVAL = 500
+    # Characters profiled (gender + description requests) at the same time
+    PROFILE_WORKERS = 2
+    
     def __init__(self, data_dir=None, output_dir="audio_output", api_key=None, book_name=None):
         # Load config to get the default data directory and book info
         config = self.load_config()
@@ -33,32 +44,101 @@ class TTSPipeline:
         self.data_dir = data_dir
         self.output_dir = output_dir
         
-        self.content_extractor = ContentExtractor()
-        self.audio_generator = AudioGenerator(api_key=api_key, output_dir=output_dir)
-        self.progress_manager = ProgressManager(output_dir=output_dir)
+        self._content_extractor = None
+        self.metrics = PipelineMetrics()
+        metrics_file = config.get("metrics", {}).get("file")
+        self.metrics_file = os.path.join(output_dir, metrics_file) if metrics_file else None
+        trace_file = config.get("tracing", {}).get("file")
+        self.trace_file = os.path.join(output_dir, trace_file) if trace_file else None
+        self.tracer = TraceRecorder(enabled=self.trace_file is not None)
+        self.tracer.name_thread("pipeline")
+        # Created on first use, so read-only commands (status, plan) need no API key or OpenAI SDK
+        self.api_key = api_key
+        self._audio_generator = None
+        self.progress_manager = ProgressManager(
+            output_dir=output_dir,
+            backend=config.get("progress", {}).get("backend", "json")
+        )
+        self.verify_audio = config.get("progress", {}).get("verify_audio", True)
+        self.block_scheduler = BlockScheduler.from_config(config)
         
         # Keep track of all characters across all books
         self.all_characters = {}
         
+        # Set by enable_profiling()
+        self.profiler = None
+        
+        # Set by use_shared_executor() when several books are synthesized at once (see library_scheduler.py)
+        self.executor = None
+        self.max_in_flight = 1
+        # Books of the same library share character voices, so their setup runs one at a time
+        self.setup_lock = threading.Lock()
+        # Set by use_work_queue(): pending blocks are queued for worker processes instead of synthesized
+        self.work_queue = None
+        
+        # Characters are profiled when they first speak in a scheduled block (see start_character_profiling)
+        self.profile_executor = None
+        self.profile_futures = {}
+        self.profile_lock = threading.Lock()
+        self.new_characters = set()
+        
         os.makedirs(output_dir, exist_ok=True)
     
     def load_config(self):
-        """Load the config file to get settings like books path"""
-        import json  # Ensure json is imported locally
-        config_file = os.path.join(os.path.dirname(__file__), "config.json")
-        
-        if not os.path.exists(config_file):
-            print(f"Config file {config_file} not found. Using default values.")
-            return {}
-        
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            print(f"Loaded config from {config_file}")
-            return data
-        except Exception as e:
-            print(f"Error loading config file: {e}. Using default values.")
-            return {}
+        """The settings in config.json (parsed once and shared, see config_loader.py)"""
+        return load_config()
+    
+    @property
+    def content_extractor(self):
+        if self._content_extractor is None:
+            from content_extractor import ContentExtractor
+            self._content_extractor = ContentExtractor()
+        return self._content_extractor
+    
+    @property
+    def audio_generator(self):
+        if self._audio_generator is None:
+            from audio_generator import AudioGenerator
+            self._audio_generator = AudioGenerator(api_key=self.api_key, output_dir=self.output_dir,
+                                                   metrics=self.metrics, tracer=self.tracer, series=self.book_name,
+                                                   book_numbers=self.get_book_identifiers())
+        return self._audio_generator
+    
+    def enable_tracing(self, trace_file):
+        """Record block spans and write them to trace_file (Chrome trace-event JSON)"""
+        self.trace_file = trace_file
+        self.tracer.enabled = True
+        self.tracer.name_thread("pipeline")
+    
+    def use_shared_executor(self, executor, request_budget, max_in_flight):
+        """
+        Synthesize blocks on a shared thread pool, keeping at most max_in_flight blocks of
+        each book queued. All API requests wait for a slot in request_budget.
+        """
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.audio_generator.request_budget = request_budget
+    
+    def share_characters(self, pipeline):
+        """
+        Use the audio generator, and with it the character voices, of pipeline, another
+        book of the same series, so both books can run at once (see library_scheduler.py).
+        Each pipeline still journals the characters it assigns and keeps its own metrics
+        and trace.
+        """
+        self._audio_generator = pipeline.audio_generator
+        self.setup_lock = pipeline.setup_lock
+        self.profile_lock = pipeline.profile_lock
+        self.profile_futures = pipeline.profile_futures
+    
+    def use_work_queue(self, work_queue):
+        self.work_queue = work_queue
+    
+    def enable_profiling(self):
+        """Profile the extraction and synthesis hot paths and write a report per book"""
+        from stage_profiler import StageProfiler
+        self.profiler = StageProfiler(output_dir=self.output_dir)
+        self.profiler.instrument(self)
     
     @property
     def character_voices(self):
@@ -72,22 +152,109 @@ class TTSPipeline:
     def character_genders(self):
         return self.audio_generator.character_genders
     
-    def process_book(self, book_identifier, mode="multi_voice", resume=True):
+    def process_book(self, book_identifier, mode="multi_voice", resume=True, priority_only=False,
+                     block_filter=None, regenerate=False):
         """
         Process a book, supporting both:
         - Multi-file books (like Middlemarch with book1.xml, book2.xml, etc.)
         - Single-file books (like Romola as a single XML file)
+        
+        With priority_only=True only the opening blocks of each chapter are synthesized
+        (see BlockScheduler); a later normal run backfills the rest.
+        
+        A BlockFilter limits the run to some chapters, characters or block ranges. With
+        regenerate=True the selected blocks are synthesized again even if they are complete;
+        their new results replace the old ones in the book's metadata.
         """
         print(f"\nStarting processing for book: {book_identifier} in {mode} mode...")
         
         book_format = self.detect_book_format()
         
-        if book_format == "single_file":
-            # Process a single XML file as one book
-            return self.process_single_file_book(book_identifier, mode, resume)
-        else:
-            # Process multi-file book (original behavior)
-            return self.process_multi_file_book(book_identifier, mode, resume)
+        try:
+            if book_format == "single_file":
+                # Process a single XML file as one book
+                return self.process_single_file_book(book_identifier, mode, resume, priority_only, block_filter, regenerate)
+            else:
+                # Process multi-file book (original behavior)
+                return self.process_multi_file_book(book_identifier, mode, resume, priority_only, block_filter, regenerate)
+        finally:
+            if self.profiler:
+                self.profiler.write_report(book_identifier, mode)
+    
+    def start_character_profiling(self, blocks):
+        """
+        Profile (gender, description) every character who speaks in blocks and has no voice
+        yet, in the background and in the order of their first line, so that the requests
+        overlap with the synthesis of the narrator blocks before it.
+        """
+        with self.profile_lock:
+            for block in blocks:
+                char_id = block['character_id']
+                if (char_id == 'NARRATOR' or char_id in self.audio_generator.character_voices
+                        or char_id in self.profile_futures):
+                    continue
+                if self.profile_executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self.profile_executor = ThreadPoolExecutor(max_workers=self.PROFILE_WORKERS,
+                                                               thread_name_prefix="profile")
+                self.profile_futures[char_id] = self.profile_executor.submit(
+                    self.profile_character, char_id, block['character_name']
+                )
+    
+    def profile_character(self, char_id, char_name):
+        with self.audio_generator.reporting_to(self.metrics, self.tracer):
+            gender = self.audio_generator.determine_character_gender(char_name, char_id)
+            description = self.audio_generator.generate_character_description(char_name, char_id)
+        return gender, description
+    
+    def ensure_character_voice(self, block):
+        """Before a character's first line is synthesized, wait for their profile and give them a voice"""
+        char_id = block['character_id']
+        if char_id == 'NARRATOR' or char_id in self.audio_generator.character_voices:
+            return
+        if char_id not in self.profile_futures:
+            self.start_character_profiling([block])
+        gender, description = self.profile_futures[char_id].result()
+        
+        with self.profile_lock:
+            if char_id in self.audio_generator.character_voices:
+                return
+            self.audio_generator.character_genders[char_id] = gender
+            self.audio_generator.character_descriptions[char_id] = description
+            self.audio_generator.allocate_voices({char_id: gender}, {char_id: block['character_name']})
+            self.new_characters.add(char_id)
+    
+    def resolve_characters(self, blocks):
+        """Profile and assign voices to every character speaking in blocks now"""
+        self.start_character_profiling(blocks)
+        for block in blocks:
+            self.ensure_character_voice(block)
+    
+    def take_new_characters(self):
+        """Characters assigned since the last call, in the layout of a journal 'characters' entry"""
+        with self.profile_lock:
+            char_ids, self.new_characters = self.new_characters, set()
+            if not char_ids:
+                return None
+            return {
+                key: {char_id: getattr(self.audio_generator, key)[char_id] for char_id in char_ids}
+                for key in ('character_voices', 'character_descriptions', 'character_genders')
+            }
+    
+    def load_character_assignments(self, book_identifier, mode="multi_voice", repair=False):
+        """
+        Load a book's saved progress and reuse its character voices, descriptions and genders.
+        repair=True is for the writer resuming the book (see ProgressManager.read_journal).
+        """
+        existing_data = self.progress_manager.load_existing_progress(book_identifier, mode, repair)
+        if existing_data:
+            if existing_data.get('character_voices'):
+                self.audio_generator.character_voices.update(existing_data['character_voices'])
+            if existing_data.get('character_descriptions'):
+                self.audio_generator.character_descriptions.update(existing_data['character_descriptions'])
+            if existing_data.get('character_genders'):
+                self.audio_generator.character_genders.update(existing_data['character_genders'])
+        return existing_data
     
     def detect_book_format(self):
         """Detect if the book path points to a single file or a directory of files"""
@@ -109,7 +276,8 @@ class TTSPipeline:
         else:
             return "multi_file"
     
-    def process_single_file_book(self, book_identifier, mode="multi_voice", resume=True):
+    def process_single_file_book(self, book_identifier, mode="multi_voice", resume=True, priority_only=False,
+                                 block_filter=None, regenerate=False):
         """Process a single XML file book like Romola"""
         # Resolve the file path properly
         import os
@@ -128,74 +296,36 @@ class TTSPipeline:
             print(f"Book file not found: {book_file_path}")
             return None
         
-        existing_data = None
-        completed_files = set()
-        if resume:
-            # Use book_identifier as a unique identifier for the single file
-            existing_data = self.progress_manager.load_existing_progress(book_identifier, mode)
-            if existing_data:
-                completed_files = {result['filename'] for result in existing_data.get('audio_files', [])}
-                if existing_data.get('character_voices'):
-                    self.audio_generator.character_voices.update(existing_data['character_voices'])
-                if existing_data.get('character_descriptions'):
-                    self.audio_generator.character_descriptions.update(existing_data['character_descriptions'])
-                if existing_data.get('character_genders'):
-                    self.audio_generator.character_genders.update(existing_data['character_genders'])
-        
-        # Extract characters from the single file
-        print("Loading character definitions from the book...")
-        book_characters = self.content_extractor.extract_characters_from_xml(book_file_path)
-        print(f"Found {len(book_characters)} characters in the book")
-        
-        # Add characters to our global collection
-        for char_id, char_name in book_characters.items():
-            if char_id not in self.all_characters:
-                self.all_characters[char_id] = char_name
-        
-        # Only assign voices to characters that don't already have them
-        unassigned_characters = {}
-        for char_id, char_name in self.all_characters.items():
-            if char_id not in self.audio_generator.character_voices:
-                unassigned_characters[char_id] = char_name
-        
-        if unassigned_characters:
-            print(f"Assigning voices to {len(unassigned_characters)} new characters")
-            for char_id, char_name in unassigned_characters.items():
-                gender = self.audio_generator.determine_character_gender(char_name, char_id)
-                self.audio_generator.character_genders[char_id] = gender
-                
-                description = self.audio_generator.generate_character_description(char_name, char_id)
-                self.audio_generator.character_descriptions[char_id] = description
-                
-                # Use the same voice assignment logic as original
-                if gender == "male":
-                    available_voices = self.audio_generator.male_voices
-                    voice_index = sum(1 for v in self.audio_generator.character_voices.values() if v in self.audio_generator.male_voices)
-                    voice = available_voices[voice_index % len(available_voices)]
-                elif gender == "female":
-                    available_voices = self.audio_generator.female_voices
-                    voice_index = sum(1 for v in self.audio_generator.character_voices.values() if v in self.audio_generator.female_voices)
-                    voice = available_voices[voice_index % len(available_voices)]
-                else:
-                    # Default to female voice
-                    available_voices = self.audio_generator.female_voices
-                    voice_index = sum(1 for v in self.audio_generator.character_voices.values() if v in self.audio_generator.female_voices)
-                    voice = available_voices[voice_index % len(available_voices)]
-                
-                self.audio_generator.character_voices[char_id] = voice
-                print(f"Assigned {voice} voice to {char_name} ({gender})")
-        else:
-            print("All characters already have assigned voices")
+        with self.setup_lock:
+            existing_data = None
+            if resume:
+                # Use book_identifier as a unique identifier for the single file
+                existing_data = self.load_character_assignments(book_identifier, mode, repair=True)
+            
+            # Extract characters from the single file
+            print("Loading character definitions from the book...")
+            book_characters = self.content_extractor.extract_characters_from_xml(book_file_path)
+            print(f"Found {len(book_characters)} characters in the book")
+            
+            # Add characters to our global collection
+            for char_id, char_name in book_characters.items():
+                if char_id not in self.all_characters:
+                    self.all_characters[char_id] = char_name
+            
+            # Characters without a voice are profiled once their first scheduled line comes up
+            unassigned_count = sum(1 for char_id in self.all_characters if char_id not in self.audio_generator.character_voices)
+            print(f"{unassigned_count} characters have no voice yet")
         
         print(f"\nLoading book from: {book_file_path}")
         print("Extracting all content blocks (narrative + dialogue)...")
         
         # Use book_identifier as a book number for the single file
-        content_blocks = self.content_extractor.extract_all_content_blocks(
-            book_file_path, 
-            self.all_characters, 
-            book_identifier
-        )
+        with self.metrics.time_stage("extraction"), self.tracer.span("extraction", "extraction", book=book_identifier):
+            content_blocks = self.content_extractor.extract_all_content_blocks(
+                book_file_path, 
+                self.all_characters, 
+                book_identifier
+            )
         print(f"Found {len(content_blocks)} total content blocks")
         
         if len(content_blocks) == 0:
@@ -203,57 +333,22 @@ class TTSPipeline:
             return None
         
         self.progress_manager.display_content_statistics(content_blocks)
+        self.progress_manager.record_blocks(book_identifier, mode, content_blocks)
         
         results = existing_data.get('audio_files', []) if existing_data else []
-        skipped_count = len(results)
-        
-        if skipped_count > 0:
-            print(f"Resuming from block {skipped_count + 1}. Skipping {skipped_count} already processed blocks.")
-        
-        print(f"\nGenerating audio for {len(content_blocks) - skipped_count} remaining content blocks...")
-        
-        for i, block in enumerate(content_blocks):
-            text_hash = hashlib.md5(block['text'].encode()).hexdigest()[:8]
-            content_suffix = "narrative" if block['character_id'] == 'NARRATOR' else "dialogue"
-            chapter_number = block.get('chapter_number', 1)
-            
-            if block.get('content_type') == 'narrative_combined':
-                content_suffix = "narrative_combined"
-            elif block.get('content_type') == 'title_combined':
-                content_suffix = "title_combined"
-            
-            expected_filename = f"{block['global_index']:04d}_B{book_identifier:02d}C{chapter_number:02d}_{block['character_id']}_{content_suffix}_{text_hash}.mp3"
-            
-            if expected_filename in completed_files:
-                chapter_dir = Path(self.output_dir) / f"book_{book_identifier:02d}" / f"chapter_{chapter_number:02d}"
-                expected_path = chapter_dir / expected_filename
-                if expected_path.exists():
-                    continue
-            
-            current_progress = i + 1
-            if current_progress % 5 == 0 or current_progress <= 10:
-                progress_msg = self.progress_manager.format_progress_update(current_progress, len(content_blocks), block)
-                print(progress_msg)
-            
-            result = self.audio_generator.generate_speech_for_block(block, mode)
-            if result:
-                # Handle both single result and list of results (for split text)
-                if isinstance(result, list):
-                    results.extend(result)
-                    print(f"  Generated {len(result)} audio chunks for this block")
-                else:
-                    results.append(result)
-                
-                if len(results) % 10 == 0 or block.get('content_type') == 'chapter_title':
-                    print(f"Saving progress... ({len(results)} blocks completed)")
-                    self.progress_manager.save_progress(
-                        book_identifier, mode, 
-                        self.audio_generator.character_voices,
-                        self.audio_generator.character_descriptions,
-                        self.audio_generator.character_genders,
-                        results
-                    )
+        if block_filter:
+            # Only the selected blocks are looked at; the ledger is kept up to date by the checkpoints
+            resume_index = None
+            content_blocks = block_filter.apply(content_blocks)
+            print(f"Limited to {len(content_blocks)} blocks ({block_filter.describe()})")
+        else:
+            resume_index = self.start_completion_ledger(book_identifier, mode, content_blocks, results, book_file_path)
+        if priority_only:
+            content_blocks, _ = self.block_scheduler.split_blocks(content_blocks)
+            print(f"Synthesizing only the opening blocks of each chapter ({len(content_blocks)} blocks)")
+        results = self.synthesize_blocks(book_identifier, mode, content_blocks, results, resume_index, regenerate)
         
+        BlockScheduler.sort_audio_files(results)
         metadata = {
             'book': book_identifier,
             'mode': mode,
@@ -264,89 +359,48 @@ class TTSPipeline:
             'audio_files': results
         }
         
-        metadata_file = Path(self.output_dir) / f"book_{book_identifier:02d}_{mode}_metadata.json"
-        import json
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        self.save_snapshot(book_identifier, mode, results)
+        metadata_file = self.progress_manager.metadata_path(book_identifier, mode)
         
         print(f"Generated {len(results)} total audio files for book {book_identifier}")
         print(f"Final metadata saved to: {metadata_file}")
         return metadata
     
-    def process_multi_file_book(self, book_number, mode="multi_voice", resume=True):
+    def process_multi_file_book(self, book_number, mode="multi_voice", resume=True, priority_only=False,
+                                block_filter=None, regenerate=False):
         """Process multi-file book (original behavior)"""
         print(f"\nStarting processing for book {book_number} in {mode} mode...")
         
-        existing_data = None
-        completed_files = set()
-        if resume:
-            existing_data = self.progress_manager.load_existing_progress(book_number, mode)
-            if existing_data:
-                completed_files = {result['filename'] for result in existing_data.get('audio_files', [])}
-                if existing_data.get('character_voices'):
-                    self.audio_generator.character_voices.update(existing_data['character_voices'])
-                if existing_data.get('character_descriptions'):
-                    self.audio_generator.character_descriptions.update(existing_data['character_descriptions'])
-                if existing_data.get('character_genders'):
-                    self.audio_generator.character_genders.update(existing_data['character_genders'])
-        
-        # Load character definitions from ALL books to ensure we have all characters
-        # This is important when resuming from a book that is not the first book
-        print("Loading character definitions from ALL books...")
-        for book_num in self.get_available_books():
-            book_file = os.path.join(self.data_dir, f'book{book_num}.xml')
-            if os.path.exists(book_file):
-                book_characters = self.content_extractor.extract_characters_from_xml(book_file)
-                print(f"Found {len(book_characters)} characters in book{book_num}.xml")
-                
-                # Add characters from this book to our global collection
-                for char_id, char_name in book_characters.items():
-                    if char_id not in self.all_characters:
-                        self.all_characters[char_id] = char_name
-        
-        print(f"Total characters across all books: {len(self.all_characters)}")
-        
-        # Extract character definitions specifically for the current book
-        print(f"Loading current book {book_number} character definitions...")
-        book_file = os.path.join(self.data_dir, f'book{book_number}.xml')
-        current_book_characters = self.content_extractor.extract_characters_from_xml(book_file)
-        print(f"Found {len(current_book_characters)} characters in current book definition list")
-        
-        # Only assign voices to characters that don't already have them
-        unassigned_characters = {}
-        for char_id, char_name in self.all_characters.items():
-            if char_id not in self.audio_generator.character_voices:
-                unassigned_characters[char_id] = char_name
-        
-        if unassigned_characters:
-            print(f"Assigning voices to {len(unassigned_characters)} new characters")
-            # Create a temporary AudioGenerator instance to assign voices without affecting existing ones
-            for char_id, char_name in unassigned_characters.items():
-                gender = self.audio_generator.determine_character_gender(char_name, char_id)
-                self.audio_generator.character_genders[char_id] = gender
-                
-                description = self.audio_generator.generate_character_description(char_name, char_id)
-                self.audio_generator.character_descriptions[char_id] = description
-                
-                # Use the same voice assignment logic as original
-                if gender == "male":
-                    available_voices = self.audio_generator.male_voices
-                    voice_index = sum(1 for v in self.audio_generator.character_voices.values() if v in self.audio_generator.male_voices)
-                    voice = available_voices[voice_index % len(available_voices)]
-                elif gender == "female":
-                    available_voices = self.audio_generator.female_voices
-                    voice_index = sum(1 for v in self.audio_generator.character_voices.values() if v in self.audio_generator.female_voices)
-                    voice = available_voices[voice_index % len(available_voices)]
-                else:
-                    # Default to female voice
-                    available_voices = self.audio_generator.female_voices
-                    voice_index = sum(1 for v in self.audio_generator.character_voices.values() if v in self.audio_generator.female_voices)
-                    voice = available_voices[voice_index % len(available_voices)]
-                
-                self.audio_generator.character_voices[char_id] = voice
-                print(f"Assigned {voice} voice to {char_name} ({gender})")
-        else:
-            print("All characters already have assigned voices")
+        with self.setup_lock:
+            existing_data = None
+            if resume:
+                existing_data = self.load_character_assignments(book_number, mode, repair=True)
+            
+            # Load character definitions from ALL books to ensure we have all characters
+            # This is important when resuming from a book that is not the first book
+            print("Loading character definitions from ALL books...")
+            for book_num in self.get_available_books():
+                book_file = os.path.join(self.data_dir, f'book{book_num}.xml')
+                if os.path.exists(book_file):
+                    book_characters = self.content_extractor.extract_characters_from_xml(book_file)
+                    print(f"Found {len(book_characters)} characters in book{book_num}.xml")
+                    
+                    # Add characters from this book to our global collection
+                    for char_id, char_name in book_characters.items():
+                        if char_id not in self.all_characters:
+                            self.all_characters[char_id] = char_name
+            
+            print(f"Total characters across all books: {len(self.all_characters)}")
+            
+            # Extract character definitions specifically for the current book
+            print(f"Loading current book {book_number} character definitions...")
+            book_file = os.path.join(self.data_dir, f'book{book_number}.xml')
+            current_book_characters = self.content_extractor.extract_characters_from_xml(book_file)
+            print(f"Found {len(current_book_characters)} characters in current book definition list")
+            
+            # Characters without a voice are profiled once their first scheduled line comes up
+            unassigned_count = sum(1 for char_id in self.all_characters if char_id not in self.audio_generator.character_voices)
+            print(f"{unassigned_count} characters have no voice yet")
         
         print(f"\nLoading book {book_number}...")
         book_file = os.path.join(self.data_dir, f'book{book_number}.xml')
@@ -355,7 +409,8 @@ class TTSPipeline:
             return None
         
         print("Extracting all content blocks (narrative + dialogue)...")
-        content_blocks = self.content_extractor.extract_all_content_blocks(book_file, self.all_characters, book_number)
+        with self.metrics.time_stage("extraction"), self.tracer.span("extraction", "extraction", book=book_number):
+            content_blocks = self.content_extractor.extract_all_content_blocks(book_file, self.all_characters, book_number)
         print(f"Found {len(content_blocks)} total content blocks")
         
         if len(content_blocks) == 0:
@@ -363,79 +418,412 @@ class TTSPipeline:
             return None
         
         self.progress_manager.display_content_statistics(content_blocks)
+        self.progress_manager.record_blocks(book_number, mode, content_blocks)
         
         results = existing_data.get('audio_files', []) if existing_data else []
-        skipped_count = len(results)
+        if block_filter:
+            # Only the selected blocks are looked at; the ledger is kept up to date by the checkpoints
+            resume_index = None
+            content_blocks = block_filter.apply(content_blocks)
+            print(f"Limited to {len(content_blocks)} blocks ({block_filter.describe()})")
+        else:
+            resume_index = self.start_completion_ledger(book_number, mode, content_blocks, results, book_file)
+        if priority_only:
+            content_blocks, _ = self.block_scheduler.split_blocks(content_blocks)
+            print(f"Synthesizing only the opening blocks of each chapter ({len(content_blocks)} blocks)")
+        results = self.synthesize_blocks(book_number, mode, content_blocks, results, resume_index, regenerate)
+        
+        BlockScheduler.sort_audio_files(results)
+        metadata = {
+            'book': book_number,
+            'mode': mode,
+            'character_voices': self.audio_generator.character_voices,
+            'character_descriptions': self.audio_generator.character_descriptions,
+            'character_genders': self.audio_generator.character_genders,
+            'total_blocks_processed': len(results),
+            'audio_files': results
+        }
+        
+        self.save_snapshot(book_number, mode, results)
+        metadata_file = self.progress_manager.metadata_path(book_number, mode)
+        
+        print(f"Generated {len(results)} total audio files for book {book_number}")
+        print(f"Final metadata saved to: {metadata_file}")
+        return metadata
+    
+    def build_resume_index(self, book_identifier, mode, results, wanted=None):
+        """
+        ResumeIndex of the existing results (only those of the blocks in wanted, if given).
+        With the SQLite backend it is built from the store's indexed columns rather than the
+        decoded results. Unless progress.verify_audio is false in the config, every existing
+        clip is checked for truncation or corruption first (frame headers only, on all CPU
+        cores), so damaged clips are generated again instead of being trusted.
+        """
+        from resume_index import ResumeIndex
+        
+        store = self.progress_manager.store
+        if store and store.has_book(book_identifier, mode):
+            results = store.resume_rows(book_identifier, mode)
+        if wanted is not None:
+            results = [result for result in results if result['global_index'] in wanted]
+        resume_index = ResumeIndex(self.output_dir, book_identifier).build(results)
+        if self.verify_audio and results:
+            with self.metrics.time_stage("verification"), self.tracer.span("verification", "persistence"):
+                damaged = resume_index.verify(results)
+            for filename, problem in sorted(damaged.items()):
+                print(f"Damaged audio file {filename}: {problem}")
+            if damaged:
+                print(f"{len(damaged)} damaged audio files will be generated again")
+                self.metrics.increment("files_damaged", len(damaged))
+        return resume_index
+    
+    def start_completion_ledger(self, book_identifier, mode, content_blocks, results, source_file):
+        """
+        Record the blocks a book is expected to produce and which of them are already
+        complete (see completion_ledger.py). Returns the resume index built on the way.
+        """
+        resume_index = self.build_resume_index(book_identifier, mode, results)
+        split_chunks = {}
+        for block in content_blocks:
+            # Only texts over the TTS input limit are split into several files
+            if len(block['text']) > 4096:
+                split_chunks[block['global_index']] = len(self.audio_generator.split_text_at_sentences(block['text']))
+        complete = [block['global_index'] for block in content_blocks if resume_index.is_complete(block)]
+        self.progress_manager.start_ledger(book_identifier, mode, content_blocks, split_chunks, source_file, complete)
+        return resume_index
+    
+    def changed_override_keys(self, results, baseline):
+        """
+        Override entries (words or phrases) whose current value differs from the one some
+        clip was synthesized with or from the book's baseline (the overrides in effect when
+        its clips were last checked), including entries removed from the config and, once
+        there is a baseline, entries added to it. Without a baseline (books synthesized
+        before overrides were tracked) an entry no clip recorded is taken as already heard.
+        """
+        current = self.audio_generator.pronunciation_overrides
+        recorded = {}
+        for result in results:
+            for section, entries in result.get('overrides', {}).items():
+                for original, override in entries.items():
+                    recorded.setdefault((section, original), set()).add(override)
+        
+        changed = set()
+        for section, entries in current.items():
+            for original, override in entries.items():
+                values = recorded.get((section, original), set())
+                if values - {override}:
+                    changed.add(original)
+                elif baseline is not None and baseline.get(section, {}).get(original) != override:
+                    changed.add(original)
+        previous = set(recorded)
+        if baseline is not None:
+            previous.update((section, original) for section, entries in baseline.items() for original in entries)
+        for section, original in previous:
+            if original not in current.get(section, {}):
+                changed.add(original)
+        return changed
+    
+    def stale_pronunciation_blocks(self, book_identifier, mode, results):
+        """
+        global_indices of completed blocks synthesized with other pronunciation overrides than
+        config.json now gives them. Only clips containing a changed entry are looked at.
+        Changed pronunciations (whole words) are found through the word index of
+        search_index.py, so a one-word fix costs milliseconds and re-synthesizes just the
+        blocks that say the word. Replacements match anywhere in the text, also inside a
+        word the index can't find, so clips are scanned for them instead. A clip without
+        recorded overrides is taken to have been synthesized with the baseline, or with the
+        current overrides when the book has no baseline yet: it is never re-synthesized
+        just for predating override tracking.
+        """
+        baseline = self.progress_manager.load_override_baseline(book_identifier, mode)
+        changed = self.changed_override_keys(results, baseline)
+        if not results or not changed:
+            return set()
+        
+        current = self.audio_generator.pronunciation_overrides
+        # Sections each entry is (or was) in: the config, the baseline or a clip's recorded overrides
+        sections = {}
+        for overrides in [current, baseline or {}] + [result.get('overrides', {}) for result in results]:
+            for section, entries in overrides.items():
+                sections.setdefault(section, set()).update(entries)
+        changed_replacements = changed & sections.get('replacements', set())
+        changed_words = changed & sections.get('pronunciations', set())
+        
+        candidates = {result['global_index'] for result in results
+                      if any(original in result['text'] for original in changed_replacements)}
+        if changed_words:
+            from search_index import SearchIndex
+            try:
+                index = SearchIndex(self.output_dir, mode)
+                try:
+                    index.ensure_current(book=book_identifier)
+                    for original in changed_words:
+                        candidates.update(hit['global_index'] for hit in index.search(original, book=book_identifier, limit=None))
+                finally:
+                    index.close()
+            except Exception as e:
+                print(f"Error using the search index: {e}. Checking every clip for changed overrides.")
+                candidates = {result['global_index'] for result in results}
+        
+        stale = set()
+        for result in results:
+            if result['global_index'] not in candidates:
+                continue
+            if 'overrides' in result:
+                synthesized_with = result['overrides']
+            else:
+                synthesized_with = self.audio_generator.overrides_for(result['text'], baseline or current)
+            if synthesized_with != self.audio_generator.overrides_for(result['text']):
+                stale.add(result['global_index'])
+        if stale:
+            print(f"Pronunciation overrides changed for {', '.join(sorted(changed))}: "
+                  f"{len(stale)} blocks will be synthesized again")
+        return stale
+    
+    def synthesize_blocks(self, book_identifier, mode, content_blocks, results, resume_index=None, regenerate=False):
+        """
+        Generate audio for every block not already completed (every block with
+        regenerate=True), in the order chosen by the block scheduler. New results are
+        appended to results, which is returned.
+        """
+        if resume_index is None:
+            # Only the results (and chapter directories) of these blocks need to be checked
+            wanted = {block['global_index'] for block in content_blocks}
+            resume_index = self.build_resume_index(book_identifier, mode, results, wanted)
+        if regenerate:
+            pending_blocks = list(content_blocks)
+        else:
+            stale_blocks = self.stale_pronunciation_blocks(book_identifier, mode, results)
+            pending_blocks = [block for block in content_blocks
+                              if block['global_index'] in stale_blocks or not resume_index.is_complete(block)]
+        skipped_count = len(content_blocks) - len(pending_blocks)
         
         if skipped_count > 0:
-            print(f"Resuming from block {skipped_count + 1}. Skipping {skipped_count} already processed blocks.")
+            print(f"Resuming: {skipped_count} of {len(content_blocks)} blocks already complete.")
         
-        print(f"\nGenerating audio for {len(content_blocks) - skipped_count} remaining content blocks...")
+        # Drop partial or stale results of blocks that are about to be regenerated
+        stale_indices = {block['global_index'] for block in pending_blocks} & resume_index.global_indices
+        if stale_indices:
+            results[:] = [result for result in results if result['global_index'] not in stale_indices]
+        self.metrics.increment("blocks_resumed", skipped_count)
+        self.metrics.increment("blocks_retried", len(stale_indices))
         
-        for i, block in enumerate(content_blocks):
-            text_hash = hashlib.md5(block['text'].encode()).hexdigest()[:8]
-            content_suffix = "narrative" if block['character_id'] == 'NARRATOR' else "dialogue"
-            chapter_number = block.get('chapter_number', 1)
-            
-            if block.get('content_type') == 'narrative_combined':
-                content_suffix = "narrative_combined"
-            elif block.get('content_type') == 'title_combined':
-                content_suffix = "title_combined"
-            
-            expected_filename = f"{block['global_index']:04d}_B{book_number:02d}C{chapter_number:02d}_{block['character_id']}_{content_suffix}_{text_hash}.mp3"
-            
-            if expected_filename in completed_files:
-                chapter_dir = Path(self.output_dir) / f"book_{book_number:02d}" / f"chapter_{chapter_number:02d}"
-                expected_path = chapter_dir / expected_filename
-                if expected_path.exists():
-                    continue
-            
-            current_progress = i + 1
-            if current_progress % 5 == 0 or current_progress <= 10:
+        print(f"\nGenerating audio for {len(pending_blocks)} remaining content blocks...")
+        
+        # Snapshot once up front so character assignments are on disk before the journal grows
+        self.save_snapshot(book_identifier, mode, results, dropped=stale_indices)
+        # The stale results are gone from the snapshot, so the current overrides are now the baseline
+        overrides = self.audio_generator.pronunciation_overrides
+        if self.progress_manager.load_override_baseline(book_identifier, mode) != overrides:
+            self.progress_manager.save_override_baseline(book_identifier, mode, overrides)
+        pending_results = []
+        journaled_count = 0
+        
+        scheduled_blocks = self.block_scheduler.order_blocks(pending_blocks)
+        if self.block_scheduler.strategy != "sequential":
+            print(f"Using {self.block_scheduler.strategy} scheduling")
+        
+        if mode != "single_narrator":
+            if self.work_queue is not None:
+                # Workers only read voices, so every speaker is assigned one before queuing
+                self.resolve_characters(scheduled_blocks)
+                self.take_new_characters()
+                self.save_snapshot(book_identifier, mode, results)
+            else:
+                self.start_character_profiling(scheduled_blocks)
+        
+        if self.work_queue is not None:
+            queued = self.work_queue.enqueue(self.book_name, book_identifier, mode, scheduled_blocks)
+            print(f"Queued {queued} blocks for workers ({len(scheduled_blocks) - queued} were already queued)")
+            return results
+        
+        for i, (block, result) in enumerate(self.generate_blocks(scheduled_blocks, mode)):
+            current_progress = skipped_count + i + 1
+            if current_progress % 5 == 0 or i < 10:
                 progress_msg = self.progress_manager.format_progress_update(current_progress, len(content_blocks), block)
                 print(progress_msg)
             
-            result = self.audio_generator.generate_speech_for_block(block, mode)
             if result:
                 # Handle both single result and list of results (for split text)
                 if isinstance(result, list):
-                    results.extend(result)
+                    new_results = result
                     print(f"  Generated {len(result)} audio chunks for this block")
                 else:
-                    results.append(result)
+                    new_results = [result]
+                results.extend(new_results)
+                pending_results.extend(new_results)
+                self.metrics.increment("blocks_synthesized")
                 
-                if len(results) % 10 == 0 or block.get('content_type') == 'chapter_title':
-                    print(f"Saving progress... ({len(results)} blocks completed)")
-                    self.progress_manager.save_progress(
-                        book_number, mode, 
-                        self.audio_generator.character_voices,
-                        self.audio_generator.character_descriptions,
-                        self.audio_generator.character_genders,
-                        results
-                    )
+                if len(pending_results) >= self.CHECKPOINT_INTERVAL or block.get('content_type') == 'chapter_title':
+                    journaled_count += len(pending_results)
+                    with self.metrics.time_stage("checkpoint"), self.tracer.span("checkpoint", "persistence"):
+                        self.checkpoint(book_identifier, mode, pending_results)
+                    pending_results = []
+                    
+                    if journaled_count >= self.COMPACTION_INTERVAL:
+                        print(f"Saving progress... ({len(results)} blocks completed)")
+                        self.save_snapshot(book_identifier, mode, results)
+                        journaled_count = 0
+                    self.export_metrics()
+            else:
+                self.metrics.increment("blocks_failed")
         
-        metadata = {
-            'book': book_number,
-            'mode': mode,
-            'character_voices': self.audio_generator.character_voices,
-            'character_descriptions': self.audio_generator.character_descriptions,
-            'character_genders': self.audio_generator.character_genders,
-            'total_blocks_processed': len(results),
-            'audio_files': results
-        }
+        self.checkpoint(book_identifier, mode, pending_results)
+        self.export_metrics()
+        if self.trace_file:
+            self.tracer.export(self.trace_file)
+            print(f"Trace written to: {self.trace_file}")
+        print("\nTime per stage:")
+        print(self.metrics.summary())
+        return results
+    
+    def generate_block(self, block, mode):
+        if mode != "single_narrator":
+            self.ensure_character_voice(block)
+        with self.tracer.span("block", "block", global_index=block['global_index'],
+                              chapter=block.get('chapter_number', 1), content_type=block.get('content_type')):
+            with self.audio_generator.reporting_to(self.metrics, self.tracer):
+                return self.audio_generator.generate_speech_for_block(block, mode)
+    
+    def generate_blocks(self, blocks, mode):
+        """
+        Yield (block, result) pairs. Without a shared executor blocks are generated one after
+        another; with one, up to max_in_flight blocks run at once and are yielded as they finish.
+        """
+        if self.executor is None:
+            for block in blocks:
+                yield block, self.generate_block(block, mode)
+            return
         
-        metadata_file = Path(self.output_dir) / f"book_{book_number}_{mode}_metadata.json"
-        import json
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        from concurrent.futures import wait, FIRST_COMPLETED
         
-        print(f"Generated {len(results)} total audio files for book {book_number}")
-        print(f"Final metadata saved to: {metadata_file}")
-        return metadata
+        blocks = iter(blocks)
+        in_flight = {self.executor.submit(self.generate_block, block, mode): block
+                     for block in itertools.islice(blocks, self.max_in_flight)}
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                block = in_flight.pop(future)
+                next_block = next(blocks, None)
+                if next_block is not None:
+                    in_flight[self.executor.submit(self.generate_block, next_block, mode)] = next_block
+                yield block, future.result()
+    
+    def collect_queue_results(self, book_identifier, mode, work_queue):
+        """
+        Merge the results workers recorded in the work queue into the book's progress. The
+        caller must hold the book's collection claim (WorkQueue.claim_collection).
+        """
+        completed = work_queue.completed_results(book_identifier, mode)
+        if not completed:
+            return None
+        
+        existing_data = self.load_character_assignments(book_identifier, mode, repair=True) or {}
+        results = [result for result in existing_data.get('audio_files', []) if result['global_index'] not in completed]
+        for block_results in completed.values():
+            results.extend(block_results)
+        BlockScheduler.sort_audio_files(results)
+        
+        self.save_snapshot(book_identifier, mode, results)
+        print(f"Collected {len(completed)} queued blocks into the progress of book {book_identifier}")
+        return results
+    
+    def checkpoint(self, book_identifier, mode, new_results):
+        """Journal new results, together with the characters assigned since the last checkpoint"""
+        characters = self.take_new_characters()
+        self.progress_manager.append_results(book_identifier, mode, new_results, characters)
+        if characters:
+            self.audio_generator.save_character_profiles()
+    
+    def export_metrics(self):
+        if self.metrics_file:
+            self.metrics.export(self.metrics_file)
+    
+    def save_snapshot(self, book_identifier, mode, results, dropped=()):
+        """
+        Write the full metadata file for a book and compact its progress journal. dropped
+        lists the blocks whose earlier results were discarded from results.
+        """
+        with self.metrics.time_stage("snapshot"), self.tracer.span("snapshot", "persistence"):
+            self.audio_generator.save_character_profiles()
+            self.progress_manager.save_progress(
+                book_identifier, mode,
+                self.audio_generator.character_voices,
+                self.audio_generator.character_descriptions,
+                self.audio_generator.character_genders,
+                results,
+                dropped
+            )
     
     def show_progress(self, book_number, mode="multi_voice"):
         return self.progress_manager.show_progress(book_number, mode)
     
+    def postprocess_book(self, book_identifier, mode="multi_voice"):
+        """Trim silence and normalize loudness of a book's generated clips (see audio_postprocessor.py)"""
+        from audio_postprocessor import AudioPostProcessor
+        
+        # Post-processing appends to the journal, so it repairs a torn line like a resuming run
+        existing_data = self.progress_manager.load_existing_progress(book_identifier, mode, repair=True)
+        if not existing_data:
+            print(f"No generated audio found for book {book_identifier}, nothing to post-process")
+            return None
+        
+        if self.load_config().get("storage", {}).get("backend", "files") == "archive":
+            # Post-processing rewrites clips in place, which packed clips can't be
+            print("Post-processing needs loose clip files, skipped with the archive storage backend")
+            return None
+        
+        settings = self.load_config().get("postprocessing", {})
+        postprocessor = AudioPostProcessor(
+            target_dbfs=settings.get("target_dbfs", -20.0),
+            silence_threshold_db=settings.get("silence_threshold_db", -45.0),
+            padding_ms=settings.get("padding_ms", 40),
+            workers=settings.get("workers")
+        )
+        
+        print(f"\nPost-processing audio for book {book_identifier}...")
+        audio_files = existing_data.get('audio_files', [])
+        # Each rewritten clip is journaled right away, so an interrupted run never processes it again
+        postprocessor.process_book(
+            audio_files,
+            on_clip=lambda audio_file: self.progress_manager.append_results(book_identifier, mode, [audio_file])
+        )
+        
+        self.progress_manager.save_progress(
+            book_identifier, mode,
+            existing_data.get('character_voices', {}),
+            existing_data.get('character_descriptions', {}),
+            existing_data.get('character_genders', {}),
+            audio_files
+        )
+        return existing_data
+    
+    def index_durations(self, book_identifier, mode="multi_voice"):
+        """
+        Record every clip's duration and start offset in the book's metadata, read from the
+        audio files' frame headers (see audio_scanner.py)
+        """
+        from audio_scanner import index_durations
+        
+        existing_data = self.progress_manager.load_existing_progress(book_identifier, mode)
+        if not existing_data or not existing_data.get('audio_files'):
+            print(f"No generated audio found for book {book_identifier}, no durations to index")
+            return None
+        
+        audio_files = existing_data['audio_files']
+        total_ms = index_durations(audio_files, self.load_config().get("postprocessing", {}).get("workers"))
+        self.progress_manager.save_progress(
+            book_identifier, mode,
+            existing_data.get('character_voices', {}),
+            existing_data.get('character_descriptions', {}),
+            existing_data.get('character_genders', {}),
+            audio_files
+        )
+        if total_ms is not None:
+            hours, rest = divmod(total_ms // 1000, 3600)
+            print(f"Book {book_identifier}: {len(audio_files)} clips, total duration {hours}:{rest // 60:02d}:{rest % 60:02d}")
+        return total_ms
+    
     def get_available_books(self):
         """Get all available book numbers from the data directory"""
         book_files = []
@@ -454,80 +842,125 @@ class TTSPipeline:
         
         return sorted(book_files)
     
+    def get_book_identifiers(self):
+        """
+        Identifiers of the books in data_dir: the book numbers of a multi-file book, or a
+        single identifier derived from the path of a single-file book
+        """
+        if self.detect_book_format() == "single_file":
+            return [int(hashlib.md5(self.data_dir.encode()).hexdigest(), 16) % 10000]
+        return self.get_available_books()
+    
+    def book_source_file(self, book_identifier):
+        """Path of the XML file a book is extracted from"""
+        if self.detect_book_format() == "single_file":
+            if os.path.isabs(self.data_dir):
+                return self.data_dir
+            # If relative path, resolve from project root
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            return os.path.join(project_root, self.data_dir)
+        return os.path.join(self.data_dir, f'book{book_identifier}.xml')
+    
     def is_book_fully_processed(self, book_identifier, mode="multi_voice"):
         """
-        Check if a book has been fully processed by comparing the number of 
-        completed blocks with the total possible blocks in the book.
+        Check the book's completion ledger: every expected block (including every part of
+        split blocks) must be done, and the XML must not have changed since the ledger
+        was written. Neither the metadata nor the XML is loaded.
         """
-        # Load existing progress
-        existing_data = self.progress_manager.load_existing_progress(book_identifier, mode)
-        
-        if existing_data is None:
-            # No progress file exists, so book is not processed at all
+        ledger = self.progress_manager.load_ledger(book_identifier, mode)
+        if ledger is None:
+            print(f"Book {book_identifier}: no completion ledger yet")
             return False
         
-        completed_blocks = existing_data.get('audio_files', [])
-        completed_count = len(completed_blocks)
+        source_file = self.book_source_file(book_identifier)
+        if not os.path.exists(source_file):
+            print(f"Book {book_identifier} not found at {source_file}")
+            return False
+        if not ledger.matches_source(CompletionLedger.fingerprint(source_file)):
+            print(f"Book {book_identifier}: source changed since it was last processed")
+            return False
         
-        # Load the book to get total possible blocks
-        book_format = self.detect_book_format()
+        print(f"Book {book_identifier}: {ledger.done_blocks} blocks completed out of {ledger.total_blocks} total")
+        return ledger.is_complete()
+    
+    def plan_book(self, book_identifier, mode="multi_voice"):
+        """
+        Print what a run would synthesize for a book, from its completion ledger alone.
+        Returns the number of pending blocks, or None if the book has to be extracted first.
+        """
+        ledger = self.progress_manager.load_ledger(book_identifier, mode)
+        source_file = self.book_source_file(book_identifier)
+        if ledger is None:
+            print(f"Book {book_identifier}: not extracted yet, every block will be synthesized")
+            return None
+        if os.path.exists(source_file) and not ledger.matches_source(CompletionLedger.fingerprint(source_file)):
+            print(f"Book {book_identifier}: source changed, every block will be checked again")
+            return None
         
-        if book_format == "single_file":
-            # Resolve the file path properly
-            import os
-            if os.path.isabs(self.data_dir):
-                book_file_path = self.data_dir
-            else:
-                # If relative path, resolve from project root
-                script_dir = os.path.dirname(os.path.abspath(__file__))  # tts directory
-                project_root = os.path.dirname(script_dir)  # project root
-                book_file_path = os.path.join(project_root, self.data_dir)
-                
-            # For single file book
-            if not os.path.exists(book_file_path):
-                print(f"Book file not found: {book_file_path}")
-                return False
-                
-            # Extract characters from the single file
-            current_book_characters = self.content_extractor.extract_characters_from_xml(book_file_path)
-            
-            # Add these characters to our global collection temporarily (for content extraction)
-            temp_all_characters = self.all_characters.copy()
-            for char_id, char_name in current_book_characters.items():
-                if char_id not in temp_all_characters:
-                    temp_all_characters[char_id] = char_name
-            
-            # Get all content blocks for the book
-            total_content_blocks = self.content_extractor.extract_all_content_blocks(book_file_path, temp_all_characters, book_identifier)
-            total_count = len(total_content_blocks)
-            
+        pending = ledger.total_blocks - ledger.done_blocks
+        chapters = [chapter for chapter, done, total in ledger.chapter_progress() if done < total]
+        if not pending:
+            print(f"Book {book_identifier}: complete, nothing to synthesize")
         else:
-            # For multi-file book
-            book_file = os.path.join(self.data_dir, f'book{book_identifier}.xml')
-            if not os.path.exists(book_file):
-                print(f"Book {book_identifier} not found at {book_file}")
-                return False
-                
-            # Extract characters from the current book
-            current_book_characters = self.content_extractor.extract_characters_from_xml(book_file)
-            
-            # Add these characters to our global collection temporarily (for content extraction)
-            temp_all_characters = self.all_characters.copy()
-            for char_id, char_name in current_book_characters.items():
-                if char_id not in temp_all_characters:
-                    temp_all_characters[char_id] = char_name
-            
-            # Get all content blocks for the book
-            total_content_blocks = self.content_extractor.extract_all_content_blocks(book_file, temp_all_characters, book_identifier)
-            total_count = len(total_content_blocks)
-        
-        print(f"Book {book_identifier}: {completed_count} blocks completed out of {total_count} total")
-        
-        # Return True if all blocks have been processed
-        return completed_count >= total_count
+            chapter_list = ",".join(f"{start}-{end}" if start != end else str(start)
+                                    for start, end in CompletionLedger.to_ranges(chapters))
+            print(f"Book {book_identifier}: {pending} of {ledger.total_blocks} blocks to synthesize "
+                  f"(chapters {chapter_list})")
+        return pending
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate audiobook audio for the configured book")
+    parser.add_argument("--profile", action="store_true",
+                        help="capture cProfile and tracemalloc data per stage and write a report per book to <output_dir>/profiles")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="record every block's spans and write them to FILE as Chrome trace-event JSON")
+    parser.add_argument("--library", nargs="*", metavar="BOOK",
+                        help="process several books of config.json's books map concurrently (all of them if none are named)")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="set up characters and queue the pending blocks in <output_dir>/work_queue.db for --worker processes")
+    parser.add_argument("--worker", nargs="?", const="", metavar="ID",
+                        help="lease and synthesize queued blocks until the work queue is drained")
+    parser.add_argument("--book", type=int,
+                        help="only process this book number (multi-file books)")
+    parser.add_argument("--chapters", metavar="RANGES",
+                        help="only process these chapters, e.g. 3-5,7")
+    parser.add_argument("--characters", metavar="IDS",
+                        help="only process blocks spoken by these character ids, e.g. D,C")
+    parser.add_argument("--blocks", metavar="RANGES",
+                        help="only process blocks with these global indices, e.g. 120-180,200-")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="synthesize the selected blocks again even if their audio exists")
+    parser.add_argument("--max-concurrent-requests", type=int,
+                        help="shared API request budget for --library (default: library.max_concurrent_requests in config.json)")
+    parser.add_argument("--status", action="store_true",
+                        help="show the progress of each book and exit (no API key needed)")
+    parser.add_argument("--plan", action="store_true",
+                        help="show what a run would synthesize for each book and exit (no API key needed)")
+    parser.add_argument("--output-dir", default="audio_output",
+                        help="directory for audio, progress and the work queue (default: audio_output)")
+    parser.add_argument("--index-durations", action="store_true",
+                        help="record clip durations and offsets in each book's metadata and exit (no API key needed)")
+    args = parser.parse_args()
+    
+    if args.index_durations:
+        pipeline = TTSPipeline(output_dir=args.output_dir)
+        for book_identifier in [args.book] if args.book else pipeline.get_book_identifiers():
+            pipeline.index_durations(book_identifier, mode="multi_voice")
+        exit(0)
+    
+    if args.status or args.plan:
+        # Read-only: answered from the ledgers and progress files, without the OpenAI SDK
+        pipeline = TTSPipeline(output_dir=args.output_dir)
+        for book_identifier in [args.book] if args.book else pipeline.get_book_identifiers():
+            if args.status:
+                pipeline.show_progress(book_identifier, mode="multi_voice")
+            else:
+                pipeline.plan_book(book_identifier, mode="multi_voice")
+        exit(0)
+    
     print("Starting TTS Pipeline...")
     print("Checking for API key...")
     
@@ -541,11 +974,55 @@ if __name__ == "__main__":
         exit(1)
     
     print("API key found")
+    
+    work_queue = None
+    if args.enqueue or args.worker is not None:
+        from work_queue import QueueWorker, open_work_queue
+        queue_config = load_config().get("queue", {})
+        work_queue = open_work_queue(args.output_dir, queue_config)
+        
+        if args.worker is not None:
+            worker = QueueWorker(work_queue, api_key=api_key, output_dir=args.output_dir, worker_id=args.worker or None,
+                                 batch_size=queue_config.get("batch_size", 4))
+            worker.run()
+            exit(0)
+    
+    if args.library is not None:
+        from library_scheduler import LibraryScheduler
+        scheduler = LibraryScheduler(api_key=api_key, output_dir=args.output_dir, book_names=args.library,
+                                     max_concurrent_requests=args.max_concurrent_requests,
+                                     work_queue=work_queue)
+        scheduler.run()
+        exit(0)
+    
     print("Initializing pipeline...")
     
-    pipeline = TTSPipeline(api_key=api_key)
+    pipeline = TTSPipeline(api_key=api_key, output_dir=args.output_dir)
+    if args.profile:
+        pipeline.enable_profiling()
+        print("Profiling enabled")
+    if args.trace:
+        pipeline.enable_tracing(args.trace)
+        print(f"Tracing enabled, writing to {args.trace}")
+    if work_queue is not None:
+        pipeline.use_work_queue(work_queue)
+        print("Queueing pending blocks for worker processes")
     print("Pipeline initialized")
     
+    # Scoped runs only touch the selected blocks of the selected books
+    from block_filter import BlockFilter
+    block_filter = BlockFilter.from_options(args.chapters, args.characters, args.blocks)
+    if block_filter or args.regenerate:
+        book_identifiers = [args.book] if args.book else pipeline.get_book_identifiers()
+        for book_identifier in book_identifiers:
+            result = pipeline.process_book(book_identifier, mode="multi_voice", resume=True,
+                                           block_filter=block_filter, regenerate=args.regenerate)
+            if result:
+                pipeline.show_progress(book_identifier, mode="multi_voice")
+            else:
+                print(f"\nFailed to process book {book_identifier}")
+        exit(0)
+    
     # Get the book format to determine processing approach
     book_format = pipeline.detect_book_format()
     print(f"DEBUG: Detected book format is {book_format}, data_dir: {pipeline.data_dir}, abs path exists: {os.path.exists(os.path.abspath(pipeline.data_dir))}")
@@ -559,8 +1036,7 @@ if __name__ == "__main__":
         active_book = config.get("active_book", "Romola")
         
         # Use the path hash or a simple identifier for the single file
-        import hashlib
-        book_identifier = int(hashlib.md5(pipeline.data_dir.encode()).hexdigest(), 16) % 10000
+        book_identifier = pipeline.get_book_identifiers()[0]
         
         print(f"\n{'='*50}")
         print(f"Processing single book: {active_book} (identifier: {book_identifier})")
@@ -574,9 +1050,17 @@ if __name__ == "__main__":
             print(f"\nChecking existing progress...")
             pipeline.show_progress(book_identifier, mode="multi_voice")
             
+            if pipeline.block_scheduler.strategy == "chapter_priority":
+                print(f"\nSynthesizing chapter openings first...")
+                pipeline.process_book(book_identifier, mode="multi_voice", resume=True, priority_only=True)
+            
             result = pipeline.process_book(book_identifier, mode="multi_voice", resume=True)
             
             if result:
+                if config.get("postprocessing", {}).get("enabled") and work_queue is None:
+                    pipeline.postprocess_book(book_identifier, mode="multi_voice")
+                if work_queue is None:
+                    pipeline.index_durations(book_identifier, mode="multi_voice")
                 print(f"\nCompleted processing for book {active_book}")
                 print(f"Final progress summary:")
                 pipeline.show_progress(book_identifier, mode="multi_voice")
@@ -588,6 +1072,17 @@ if __name__ == "__main__":
         # Get all available books
         available_books = pipeline.get_available_books()
         print(f"\nFound available books: {available_books}")
+        if args.book:
+            available_books = [book_num for book_num in available_books if book_num == args.book]
+        
+        # With chapter-priority scheduling, make the opening of every chapter in every
+        # book listenable before backfilling the books one at a time
+        if pipeline.block_scheduler.strategy == "chapter_priority":
+            for book_num in available_books:
+                if pipeline.is_book_fully_processed(book_num, mode="multi_voice"):
+                    continue
+                print(f"\nSynthesizing chapter openings for Book {book_num}...")
+                pipeline.process_book(book_num, mode="multi_voice", resume=True, priority_only=True)
         
         # Process only unprocessed or partially processed books
         for book_num in available_books:
@@ -607,6 +1102,10 @@ if __name__ == "__main__":
             result = pipeline.process_book(book_num, mode="multi_voice", resume=True)
             
             if result:
+                if pipeline.load_config().get("postprocessing", {}).get("enabled") and work_queue is None:
+                    pipeline.postprocess_book(book_num, mode="multi_voice")
+                if work_queue is None:
+                    pipeline.index_durations(book_num, mode="multi_voice")
                 print(f"\nCompleted processing for book {book_num}")
                 print(f"Final progress summary for book {book_num}:")
                 pipeline.show_progress(book_num, mode="multi_voice")
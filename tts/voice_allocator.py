@@ -0,0 +1,67 @@
+import hashlib
+from collections import Counter
+
+
+class VoiceAllocator:
+    """
+    Assigns voices to characters, balanced per gender and stable across runs.
+
+    Assignments are kept in the dict passed in (AudioGenerator.character_voices), and a
+    character that already has a voice keeps it, so adding characters never moves anyone
+    else to a different voice and invalidates their audio. A new character gets one of the
+    least used voices of its gender's pool (within `slack` uses of the least used one);
+    among those it takes the voice that ranks highest for its character id by rendezvous
+    hashing, so the choice does not depend on the order characters are discovered in.
+    Pinned voices (e.g. suggested_voice in character_data.json) always win.
+    """
+
+    def __init__(self, male_voices, female_voices, assignments=None, slack=1):
+        self.pools = {'male': list(male_voices), 'female': list(female_voices)}
+        self.assignments = assignments if assignments is not None else {}
+        self.slack = slack
+        self.pinned = {}
+
+    def pool_for(self, gender):
+        # Characters of unknown gender get a female voice, as before
+        return self.pools['male'] if gender == "male" else self.pools['female']
+
+    def pin(self, char_id, voice):
+        self.pinned[char_id] = voice
+
+    @staticmethod
+    def score(char_id, voice):
+        return hashlib.md5(f"{char_id}:{voice}".encode()).hexdigest()
+
+    def choose(self, char_id, pool, loads):
+        least_used = min(loads[voice] for voice in pool)
+        candidates = [voice for voice in pool if loads[voice] <= least_used + self.slack]
+        return max(candidates, key=lambda voice: self.score(char_id, voice))
+
+    def allocate_all(self, genders):
+        """
+        Give every character in genders ({char_id: gender}) a voice, keeping existing ones.
+        Returns {char_id: voice} for the characters that got a new voice.
+        """
+        # Counted once per batch instead of once per character
+        loads = Counter(self.assignments.values())
+        assigned = {}
+        for char_id in sorted(genders):
+            voice = self.pinned.get(char_id)
+            if voice is None:
+                if char_id in self.assignments:
+                    continue
+                voice = self.choose(char_id, self.pool_for(genders[char_id]), loads)
+            elif self.assignments.get(char_id) == voice:
+                continue
+
+            previous = self.assignments.get(char_id)
+            if previous is not None:
+                loads[previous] -= 1
+            self.assignments[char_id] = voice
+            loads[voice] += 1
+            assigned[char_id] = voice
+        return assigned
+
+    def allocate(self, char_id, gender):
+        self.allocate_all({char_id: gender})
+        return self.assignments[char_id]
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+class WorkQueue:
+    """
+    Durable queue of synthesis jobs (one per content block) shared by worker processes.
+
+    Workers lease a few jobs at a time; a lease expires after lease_seconds unless the
+    worker keeps renewing it with heartbeat(), so the jobs of a crashed worker go back to
+    other workers automatically. complete() is idempotent: the first result recorded for
+    a job wins and later ones are ignored. Every state change runs in a BEGIN IMMEDIATE
+    transaction, so only one process leases at a time.
+
+    The database uses SQLite's default rollback journal rather than WAL, because WAL
+    needs shared memory and does not work when the output directory is on a network
+    filesystem shared by several machines.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            book INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            global_index INTEGER NOT NULL,
+            book_name TEXT,
+            priority INTEGER NOT NULL,
+            block_hash TEXT NOT NULL,
+            block TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            result TEXT,
+            PRIMARY KEY (book, mode, global_index)
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (state, priority);
+        CREATE INDEX IF NOT EXISTS idx_jobs_worker ON jobs (worker, state);
+        CREATE TABLE IF NOT EXISTS collections (
+            book INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            worker TEXT NOT NULL,
+            collected_at REAL NOT NULL,
+            PRIMARY KEY (book, mode)
+        );
+    """
+
+    def __init__(self, db_path, lease_seconds=120, max_attempts=3):
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None so transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def run(self, statements):
+        """Run a function taking a connection inside one write transaction"""
+        conn = self.transaction()
+        try:
+            value = statements(conn)
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def block_hash(block):
+        return hashlib.md5(block['text'].encode()).hexdigest()
+
+    def enqueue(self, book_name, book_number, mode, blocks):
+        """
+        Add jobs for blocks in the given order. Blocks that are already queued are left
+        alone unless their text changed, in which case the job starts over.
+        """
+        def insert(conn):
+            # Queue after everything enqueued earlier, so books are worked on in the order they were queued
+            base = conn.execute("SELECT COALESCE(MAX(priority), -1) + 1 FROM jobs").fetchone()[0]
+            rows = [
+                (book_number, mode, block['global_index'], book_name, base + position,
+                 self.block_hash(block), json.dumps(block))
+                for position, block in enumerate(blocks)
+            ]
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT INTO jobs (book, mode, global_index, book_name, priority, block_hash, block)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (book, mode, global_index) DO UPDATE SET
+                    block_hash = excluded.block_hash, block = excluded.block, priority = excluded.priority,
+                    state = 'pending', worker = NULL, lease_expires = NULL, attempts = 0, error = NULL, result = NULL
+                WHERE jobs.block_hash != excluded.block_hash
+            """, rows)
+            changed = conn.total_changes - before
+            if changed:
+                # New work for the book: it has to be collected again once drained
+                conn.execute("DELETE FROM collections WHERE book = ? AND mode = ?", (book_number, mode))
+            return changed
+
+        return self.run(insert)
+
+    def lease(self, worker_id, limit=1):
+        """Lease up to limit pending (or expired) jobs, in priority order"""
+        now = time.time()
+
+        def take(conn):
+            # Jobs whose workers keep dying are given up on instead of being handed out forever
+            conn.execute("""
+                UPDATE jobs SET state = 'failed', worker = NULL, lease_expires = NULL, error = 'lease expired'
+                WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, self.max_attempts))
+            rows = conn.execute("""
+                SELECT book, mode, global_index, book_name, block FROM jobs
+                WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?))
+                ORDER BY priority, book, global_index LIMIT ?
+            """, (now, limit)).fetchall()
+            conn.executemany("""
+                UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE book = ? AND mode = ? AND global_index = ?
+            """, [(worker_id, now + self.lease_seconds, book, mode, global_index)
+                  for book, mode, global_index, _, _ in rows])
+            return [
+                {'book': book, 'mode': mode, 'global_index': global_index,
+                 'book_name': book_name, 'block': json.loads(block)}
+                for book, mode, global_index, book_name, block in rows
+            ]
+
+        return self.run(take)
+
+    def heartbeat(self, worker_id):
+        """Extend every lease held by worker_id; returns the number of leases renewed"""
+        return self.run(lambda conn: conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE worker = ? AND state = 'leased'",
+            (time.time() + self.lease_seconds, worker_id)
+        ).rowcount)
+
+    def complete(self, job, worker_id, results):
+        """Record a job's results. Returns False if another worker already completed it."""
+        return self.run(lambda conn: conn.execute("""
+            UPDATE jobs SET state = 'done', worker = ?, lease_expires = NULL, result = ?
+            WHERE book = ? AND mode = ? AND global_index = ? AND state != 'done'
+        """, (worker_id, json.dumps(results), job['book'], job['mode'], job['global_index'])).rowcount == 1)
+
+    def fail(self, job, worker_id, error):
+        """Give a job back, or mark it failed once it has used up its attempts"""
+        return self.run(lambda conn: conn.execute("""
+            UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                worker = NULL, lease_expires = NULL, error = ?
+            WHERE book = ? AND mode = ? AND global_index = ? AND state = 'leased' AND worker = ?
+        """, (self.max_attempts, str(error), job['book'], job['mode'], job['global_index'], worker_id)).rowcount)
+
+    def release(self, worker_id):
+        """Return all leases of a worker that is shutting down"""
+        return self.run(lambda conn: conn.execute(
+            "UPDATE jobs SET state = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1 "
+            "WHERE worker = ? AND state = 'leased'", (worker_id,)
+        ).rowcount)
+
+    def counts(self, book_number=None, mode=None):
+        query = "SELECT state, COUNT(*) FROM jobs"
+        params = []
+        if book_number is not None:
+            query += " WHERE book = ? AND mode = ?"
+            params = [book_number, mode]
+        return dict(self.connection().execute(query + " GROUP BY state", params).fetchall())
+
+    def is_drained(self, book_number, mode):
+        """True once no job of the book is pending or leased"""
+        counts = self.counts(book_number, mode)
+        return not counts.get('pending') and not counts.get('leased')
+
+    def claim_collection(self, book_number, mode, worker_id):
+        """
+        Let exactly one worker merge a drained book's results into its progress: True for
+        the first caller once no job of the book is pending or leased, False for the others
+        """
+        def claim(conn):
+            active = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE book = ? AND mode = ? AND state IN ('pending', 'leased')",
+                (book_number, mode)
+            ).fetchone()[0]
+            if active:
+                return False
+            return conn.execute(
+                "INSERT OR IGNORE INTO collections (book, mode, worker, collected_at) VALUES (?, ?, ?, ?)",
+                (book_number, mode, worker_id, time.time())
+            ).rowcount == 1
+
+        return self.run(claim)
+
+    def release_collection(self, book_number, mode, worker_id):
+        """Give up a claim whose collection failed, so another worker can collect the book"""
+        return self.run(lambda conn: conn.execute(
+            "DELETE FROM collections WHERE book = ? AND mode = ? AND worker = ?", (book_number, mode, worker_id)
+        ).rowcount)
+
+    def completed_results(self, book_number, mode):
+        """Results of the book's completed jobs, by global_index"""
+        rows = self.connection().execute(
+            "SELECT global_index, result FROM jobs WHERE book = ? AND mode = ? AND state = 'done' ORDER BY global_index",
+            (book_number, mode)
+        ).fetchall()
+        return {global_index: json.loads(result) for global_index, result in rows}
+
+
+class QueueWorker:
+    """
+    Leases jobs from a WorkQueue and synthesizes them until the queue is drained.
+
+    Character voices and descriptions come from the metadata written by the process that
+    enqueued the book, so every worker uses the same voices. When a book has no pending
+    or leased jobs left, its results are merged into the book's progress.
+    """
+
+    def __init__(self, work_queue, api_key=None, output_dir="audio_output", worker_id=None, batch_size=4):
+        self.work_queue = work_queue
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.batch_size = batch_size
+        self.pipelines = {}
+        self.loaded_books = set()
+        self.stop_event = threading.Event()
+
+    def pipeline_for(self, job):
+        from tts_pipeline import TTSPipeline
+
+        pipeline = self.pipelines.get(job['book_name'])
+        if pipeline is None:
+            pipeline = self.pipelines[job['book_name']] = TTSPipeline(
+                api_key=self.api_key, output_dir=self.output_dir, book_name=job['book_name']
+            )
+
+        book_key = (job['book_name'], job['book'], job['mode'])
+        if book_key not in self.loaded_books:
+            pipeline.load_character_assignments(job['book'], job['mode'])
+            self.loaded_books.add(book_key)
+        return pipeline
+
+    def send_heartbeats(self):
+        while not self.stop_event.wait(self.work_queue.lease_seconds / 3):
+            try:
+                self.work_queue.heartbeat(self.worker_id)
+            except Exception as e:
+                print(f"Error renewing leases: {e}")
+
+    def run(self):
+        print(f"Worker {self.worker_id} started")
+        heartbeat_thread = threading.Thread(target=self.send_heartbeats, daemon=True)
+        heartbeat_thread.start()
+
+        completed = 0
+        try:
+            while True:
+                jobs = self.work_queue.lease(self.worker_id, self.batch_size)
+                if not jobs:
+                    # Jobs leased by other workers come back if those workers die, so wait for them
+                    if not self.work_queue.counts().get('leased'):
+                        break
+                    time.sleep(min(self.work_queue.lease_seconds / 3, 5))
+                    continue
+                for job in jobs:
+                    pipeline = self.pipeline_for(job)
+                    block = job['block']
+                    try:
+                        result = pipeline.generate_block(block, job['mode'])
+                    except Exception as e:
+                        result = None
+                        print(f"Error generating block {block['global_index']}: {e}")
+
+                    if result:
+                        results = result if isinstance(result, list) else [result]
+                        if self.work_queue.complete(job, self.worker_id, results):
+                            completed += 1
+                    else:
+                        self.work_queue.fail(job, self.worker_id, "generation failed")
+        except KeyboardInterrupt:
+            print("Worker interrupted, releasing leases...")
+            self.work_queue.release(self.worker_id)
+            raise
+        finally:
+            self.stop_event.set()
+            heartbeat_thread.join()
+
+        print(f"Worker {self.worker_id} finished: {completed} blocks completed")
+        self.collect()
+        return completed
+
+    def collect(self):
+        """
+        Merge the results of every drained book this worker touched into its progress. Only
+        the worker that claims a book in the queue collects it, so workers finishing at the
+        same moment never write the same progress files.
+        """
+        for book_name, book_number, mode in sorted(self.loaded_books):
+            if not self.work_queue.is_drained(book_number, mode):
+                print(f"Book {book_number} still has jobs in flight; another worker will collect it")
+            elif not self.work_queue.claim_collection(book_number, mode, self.worker_id):
+                print(f"Book {book_number} is collected by another worker")
+            else:
+                try:
+                    self.pipelines[book_name].collect_queue_results(book_number, mode, self.work_queue)
+                except Exception:
+                    self.work_queue.release_collection(book_number, mode, self.worker_id)
+                    raise
+
+
+def open_work_queue(output_dir, queue_config=None):
+    queue_config = queue_config or {}
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    return WorkQueue(
+        Path(output_dir) / "work_queue.db",
+        lease_seconds=queue_config.get("lease_seconds", 120),
+        max_attempts=queue_config.get("max_attempts", 3)
+    )